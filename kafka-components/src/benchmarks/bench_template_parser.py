@@ -0,0 +1,74 @@
+# Throughput of the TemplateParserProcessor on synthetic orchestrator-logs
+# records, without Kafka: the validated templates are counted, not sent.
+# Run from kafka-components/src:
+#   python -m benchmarks.bench_template_parser [parse workers]
+
+import json
+import logging
+import sys
+from time import perf_counter
+from modules.templateparser.processor import TemplateParserProcessor
+from modules.templateparser.settings import TemplateParserConfig
+
+N_DEPLOYMENTS = 2_000
+N_THREADS = 8
+N_NODES = 20 # template size
+LOG_SEP = "paas-orchestrator orchestrator/"
+
+class CountingKafkaClient:
+    input_topics = []
+
+    def __init__(self):
+        self.n_sent = 0
+
+    def send(self, value, key=None, partition_key=None):
+        self.n_sent += 1
+
+    def get_mon_data(self) -> dict:
+        return {}
+
+def record(line: str, ts: int) -> str:
+    return json.dumps({"@timestamp": f"2025-03-30T08:{ts // 60 % 60:02d}:{ts % 60:02d}.000Z",
+                       "message": f"Mar 30 10:{ts // 60 % 60:02d}:{ts % 60:02d} host {LOG_SEP}abc[42]: {line}"})
+
+def template_lines(i: int) -> list[str]:
+    lines = ["tosca_definitions_version: tosca_simple_yaml_1_0",
+             "topology_template:",
+             "  inputs:",
+             "    num_cpus: {type: integer, default: 1}",
+             "  node_templates:"]
+    for n in range(N_NODES):
+        lines += [f"    node_{i}_{n}:",
+                  "      type: tosca.nodes.indigo.Compute",
+                  "      capabilities:",
+                  "        host: {properties: {num_cpus: {get_input: num_cpus}}}"]
+    return lines
+
+def synthetic_records() -> list[str]:
+    records = []
+    for i in range(N_DEPLOYMENTS):
+        ts = i
+        header = (f"2025-03-30 10:{ts // 60 % 60:02d}:{ts % 60:02d}.000  INFO 1 --- [exec-{i % N_THREADS}] "
+                  "i.r.o.service.DeploymentServiceImpl      : ")
+        records.append(record(header + "Creating deployment with template", ts))
+        records += [record(line, ts) for line in template_lines(i)]
+        user_parameters = {"uuid": f"uuid-{i}", "user_group": "g", "user_parameters": {"num_cpus": 2}}
+        records.append(record(header + json.dumps(user_parameters), ts))
+    return records
+
+if __name__ == "__main__":
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    logger = logging.getLogger("bench-template-parser")
+    logger.setLevel(logging.WARNING)
+    settings = TemplateParserConfig(TEMPLATE_PARSE_WORKERS=n_workers)
+    records = synthetic_records()
+
+    kafka_client = CountingKafkaClient()
+    processor = TemplateParserProcessor(settings, logger, kafka_client=kafka_client)
+    start = perf_counter()
+    processor.process_batch(records)
+    processor.flush_parse_pool(wait=True)
+    interval_s = perf_counter() - start
+    assert kafka_client.n_sent == N_DEPLOYMENTS, kafka_client.n_sent
+    print(f"workers {n_workers}: {len(records)} records, {N_DEPLOYMENTS} templates in {interval_s:.2f} s, "
+          f"{len(records) / interval_s:,.0f} records/s, {N_DEPLOYMENTS / interval_s:,.0f} templates/s")
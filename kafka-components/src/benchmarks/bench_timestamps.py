@@ -0,0 +1,50 @@
+# Micro-benchmark of the orchestrator-logs timestamp parsing, per line.
+# Run from kafka-components/src:
+#   python -m benchmarks.bench_timestamps
+
+from datetime import datetime
+from timeit import repeat
+import pytz
+from modules.utilities import timestamps
+
+N_LINES = 100_000
+LINES_PER_SECOND = 50 # log bursts share the same second
+
+FILEBEAT_TS = [f"2025-03-30T00:{i // LINES_PER_SECOND // 60 % 60:02d}:{i // LINES_PER_SECOND % 60:02d}.{i % 1000:03d}Z"
+               for i in range(N_LINES)]
+SYSLOG_TS = [f"Mar 30 00:{i // LINES_PER_SECOND // 60 % 60:02d}:{i // LINES_PER_SECOND % 60:02d}"
+             for i in range(N_LINES)]
+ORC_TS = [f"2025-03-30 00:{i // LINES_PER_SECOND // 60 % 60:02d}:{i // LINES_PER_SECOND % 60:02d}.{i % 1000:03d}"
+          for i in range(N_LINES)]
+
+# Previous implementations, LogAnalyzer.timestamp and LogOrchestratorCollector.convert_message
+def old_filebeat(ts_str):
+    dt_utc = datetime.strptime(ts_str, "%Y-%m-%dT%H:%M:%S.%fZ")
+    dt_utc = dt_utc.replace(tzinfo=pytz.utc)
+    italy_tz = pytz.timezone("Europe/Rome")
+    return dt_utc.astimezone(italy_tz)
+
+def old_syslog(ts_str):
+    current_year = datetime.now().year
+    dt_object = datetime.strptime(f"{ts_str} {current_year}", "%b %d %H:%M:%S %Y")
+    localized_dt_object = pytz.timezone("Europe/Rome").localize(dt_object, is_dst=None)
+    iso_format = localized_dt_object.astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S%z")
+    return f"{iso_format[:-2]}:{iso_format[-2:]}"
+
+def old_orc(ts_str):
+    return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S.%f")
+
+CASES = [("filebeat", FILEBEAT_TS, old_filebeat, timestamps.parse_filebeat_ts),
+         ("syslog", SYSLOG_TS, old_syslog, timestamps.syslog_to_iso),
+         ("orc", ORC_TS, old_orc, timestamps.parse_orc_ts)]
+
+def per_line_us(func, values) -> float:
+    best = min(repeat(lambda: [func(v) for v in values], number=1, repeat=3))
+    return best / len(values) * 1e6
+
+if __name__ == "__main__":
+    for name, values, old_func, new_func in CASES:
+        assert all(old_func(v) == new_func(v) for v in values[:5000]), name
+        old_us = per_line_us(old_func, values)
+        new_us = per_line_us(new_func, values)
+        print(f"{name:>10}: before {old_us:6.2f} us/line, after {new_us:6.2f} us/line, x{old_us / new_us:.1f}")
@@ -12,6 +12,7 @@
 from modules.consumerfile.processor import ConsumerFileProcessor as Processor
 from modules.consumerfile.settings import ConsumerFile as Config
 from modules.utilities.logger import create_logger
+from modules.utilities.shutdown import exit_on_sigterm
 
 if __name__ == "__main__": 
     settings = Config()
@@ -22,4 +23,9 @@ if __name__ == "__main__":
     processor = Processor(settings, logger)
     
     # Start Restore History
-    processor.store_messages()
\ No newline at end of file
+    exit_on_sigterm()
+    try:
+        processor.store_messages()
+    finally:
+        # The queued log records are sent before the producer cleanup at exit
+        processor.kafka_client.close()
@@ -24,19 +24,30 @@ class ConsumerFileProcessor:
         self.logger.info("Collecting all messages from input topics")
         start_time = time()
         self.logger.debug(f"Topics to collect messages: {self.settings.KAFKA_INPUT_TOPICS}")
-        collected_msgs = self.kafka_client.collect_all_msgs_from_topics(self.settings.KAFKA_INPUT_TOPICS)
+        self.files = {}
+        for topic in self.settings.KAFKA_INPUT_TOPICS:
+            filename = f"{self.settings.LOG_DIR}/{self.settings.OUTPUT_FILENAME_BASE}_{topic.replace('-', '_')}_msgs.txt"
+            self.logger.info(f"Filename where store messages from topic {topic}: {filename}")   
+            self.files[topic] = open(filename, 'w')
+        try:
+            collected_msgs = self.kafka_client.stream_msgs_from_topics(self.settings.KAFKA_INPUT_TOPICS,
+                                                                       self.write_messages)
+        finally:
+            for fout in self.files.values():
+                fout.close()
         interval_s = round(time()-start_time,2)
-        tot_msg_num = sum([len(v) for v in collected_msgs.values()])
+        tot_msg_num = sum(collected_msgs.values())
         self.logger.debug(f"Collected {tot_msg_num} tot messages in {interval_s} s")
-        for topic, messages in collected_msgs.items():
-            self.logger.debug(f"Collected {len(messages)} from topic {topic}")   
-            
-            filename = f"{self.settings.LOG_DIR}/{self.settings.OUTPUT_FILENAME_BASE}_{topic.replace('-', '_')}_msgs.txt"
-            self.logger.info(f"Filename where store messages from topic {topic}")   
-            self.logger.info(f"Collected messages: {len(messages)}")   
-            with open(filename, 'w') as fout:
-                for message in messages:
-                    fout.write(f"{json.dumps(message.value)}\n")
-            self.logger.debug(f"Saved messages from topic {topic} into file {filename}")
+        for topic, n_messages in collected_msgs.items():
+            self.logger.info(f"Saved {n_messages} messages from topic {topic}")   
         self.logger.info("Message collection completed")
-        
\ No newline at end of file
+    
+    def write_messages(self, topic: str, messages: list):
+        self.msg_received += len(messages)
+        fout = self.files[topic]
+        if self.settings.OUTPUT_TIMESTAMPS:
+            for message in messages:
+                fout.write(f"{message.timestamp}\t{json.dumps(message.value)}\n")
+        else:
+            for message in messages:
+                fout.write(f"{json.dumps(message.value)}\n")
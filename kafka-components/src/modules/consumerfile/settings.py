@@ -11,6 +11,12 @@ class ConsumerFile(BaseSettings):
     LOG_DIR: str = Field(default = "./logs",
                          env="APP_LOG_DIR",
                          description="Directory for application logs")
+    LOG_LEVEL: str = Field(default = "DEBUG",
+                           env="LOG_LEVEL",
+                           description="Logging level (DEBUG, INFO, WARNING, ERROR)")
+    LOG_DEBUG_SAMPLING: int = Field(default = 1,
+                                    env="LOG_DEBUG_SAMPLING",
+                                    description="Keep the DEBUG output of one consumed message every N")
     KAFKA_AUTO_OFFSET_RESET: str = Field(default = 'earliest',
                                           env="KAFKA_AUTO_OFFSET_RESET",
                                           description="Auto offset reset policy for Kafka consumer")
@@ -62,6 +68,10 @@ class ConsumerFile(BaseSettings):
     OUTPUT_FILENAME_BASE: str = Field(default = 'output',
                                       env="OUTPUT_FILENAME",
                                       description="Filename of the output file containing the extracted messages")
+    OUTPUT_TIMESTAMPS: bool = Field(default = True,
+                                    env="OUTPUT_TIMESTAMPS",
+                                    description="Prefix each message with its record timestamp in ms and a tab, "
+                                                "used by the dataset backfill to replay the dumps in time order")
     value_serializer: Callable = None
     value_deserializer: Callable = None
     
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from time import time
+from zlib import crc32
+from modules.datasetcollector.loganalyzer import LogAnalyzer
+from modules.datasetcollector.parquetsink import ParquetSink
+from modules.datasetcollector.processor import DatasetCollectorProcessor
+from modules.datasetcollector.providers import Providers
+from modules.datasetcollector.settings import DatasetCollectorConfig
+from modules.utilities.orc_events import UUID_REGEX
+from modules.utilities.timestamps import parse_filebeat_ts
+
+TIMESTAMP_SEP = '\t'
+
+def read_dump(filename: str):
+    """
+    Read a dump written by ConsumerFileProcessor, one JSON value per line,
+    prefixed by the record timestamp in ms and a tab with OUTPUT_TIMESTAMPS.
+    Values consumed with the 'string' deserializer were dumped as JSON strings:
+    they are decoded back to the raw record.
+    Yields:
+        tuple: (record timestamp in seconds, None if not dumped, value)
+    """
+    with open(filename, 'r') as fin:
+        for line in fin:
+            line = line.strip()
+            if not line:
+                continue
+            event_ts = None
+            # JSON values never contain a raw tab
+            prefix, sep, value = line.partition(TIMESTAMP_SEP)
+            if sep and prefix.isdigit():
+                event_ts = int(prefix) / 1000
+                line = value
+            if line.startswith('"'):
+                line = json.loads(line)
+            yield event_ts, line
+
+class ReplayClient:
+    """
+    Kafka client of the backfill workers: the sent messages are collected
+    with the timestamp of the record being replayed, current_ts.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.current_ts = None
+
+    def send(self, value, key=None, partition_key=None, timestamp_ms=None) -> None:
+        self.sent.append((self.current_ts, key, value))
+
+    def get_mon_data(self) -> dict:
+        return {}
+
+def replay_shard(settings_values: dict, records: list[tuple]) -> list[tuple[float, str, dict]]:
+    """
+    Replay the records of a shard through a DatasetCollectorProcessor.
+    Args:
+        settings_values (dict): The DatasetCollectorConfig fields of the worker.
+        records (list[tuple]): (timestamp, topic, value) in timestamp order.
+    Returns:
+        list[tuple]: (timestamp of the record triggering the send, key, message) sent, in order.
+    """
+    logger = logging.getLogger("dataset-backfill.worker")
+    logger.setLevel(logging.WARNING)
+    client = ReplayClient()
+    processor = DatasetCollectorProcessor(DatasetCollectorConfig(**settings_values), logger,
+                                          kafka_client=client)
+    for event_ts, topic, value in records:
+        client.current_ts = event_ts
+        processor.process_record(topic, value, event_ts)
+        if processor.join_window.is_eviction_due():
+            processor.evict_expired()
+    return client.sent
+
+class DatasetBackfill:
+    """
+    Offline regeneration of the dataset from the orchestrator-logs and
+    providers-to-rank dumps. Both dumps are replayed in timestamp order through
+    the join of DatasetCollectorProcessor, sharded by deployment uuid across a
+    process pool. The join ignores the entries expired at the watermark, evicted
+    or not: the messages are the ones of the streaming collector consuming the
+    same records in timestamp order, whatever its batches and eviction period.
+    The orchestrator lines dumped without timestamp take their filebeat one,
+    the providers-to-rank messages need the dumped timestamp.
+    """
+
+    # The workers keep the state in memory, the messages are written by the parent
+    WORKER_SETTINGS = {"STATE_STORE": "memory",
+                       "SNAPSHOT_ENABLED": False,
+                       "PARQUET_SINK_ENABLED": False,
+                       "KAFKA_SCALE_OUT": False,
+                       "ORC_EVENTS_ENABLED": False}
+
+    def __init__(self, settings: DatasetCollectorConfig, logger = None):
+        self.settings = settings
+        self.logger = logger
+        self.n_workers = self.settings.BACKFILL_WORKERS or os.cpu_count()
+        self.settings_values = settings.model_dump(exclude={"value_serializer", "value_deserializer"}) \
+                               | self.WORKER_SETTINGS
+        self.parquet_sink = ParquetSink(settings, logger) if settings.PARQUET_SINK_ENABLED else None
+        # Lines are prefiltered in the parent, only the events are sent to the workers
+        self.prefilter = LogAnalyzer(settings.get_values(), logger).prefilter
+        self.shards = [[] for _ in range(self.n_workers)]
+
+    def add_record(self, uuid: str, event_ts: float, topic: str, value) -> None:
+        self.shards[crc32(uuid.encode('utf-8')) % self.n_workers].append((event_ts, topic, value))
+
+    def shard_orc_logs(self) -> int:
+        n_lines = 0
+        for event_ts, line in read_dump(self.settings.BACKFILL_ORC_LOG_FILE):
+            if not self.prefilter.accept(line):
+                continue
+            if event_ts is None:
+                # Filebeat produces the records with their @timestamp
+                try:
+                    event_ts = parse_filebeat_ts(json.loads(line)['@timestamp']).timestamp()
+                except (ValueError, KeyError, TypeError) as e:
+                    self.logger.error(f"[backfill][shard_orc_logs] No timestamp in line: {line}. Error: {e}")
+                    continue
+            match = UUID_REGEX.search(line)
+            uuid = match.group(1) if match else ""
+            self.add_record(uuid, event_ts, self.settings.KAFKA_INPUT_ORC_LOG_TOPIC, line)
+            n_lines += 1
+        return n_lines
+
+    def shard_providers(self) -> int:
+        n_messages = 0
+        for event_ts, line in read_dump(self.settings.BACKFILL_PROVIDERS_FILE):
+            if event_ts is None:
+                raise ValueError(f"No record timestamps in {self.settings.BACKFILL_PROVIDERS_FILE}: "
+                                 "the dump must be written with OUTPUT_TIMESTAMPS")
+            uuid = json.loads(line)[Providers.UUID_KEY]
+            self.add_record(uuid, event_ts, self.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC, line)
+            n_messages += 1
+        return n_messages
+
+    def run(self) -> int:
+        start_time = time()
+        self.logger.info(f"Backfill with {self.n_workers} workers")
+        n_lines = self.shard_orc_logs()
+        self.logger.info(f"Sharded {n_lines} event lines from {self.settings.BACKFILL_ORC_LOG_FILE}")
+        n_providers = self.shard_providers()
+        self.logger.info(f"Sharded {n_providers} provider messages from {self.settings.BACKFILL_PROVIDERS_FILE}")
+        # Stable sort: on equal timestamps the orchestrator lines come first
+        for shard in self.shards:
+            shard.sort(key=itemgetter(0))
+
+        sent = []
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            futures = [executor.submit(replay_shard, self.settings_values, shard) for shard in self.shards]
+            for future in futures:
+                sent += future.result()
+        # Merged in the order of the streaming collector, by the time they were sent.
+        # Stable sort: the messages of a key stay in the order they were sent
+        sent.sort(key=itemgetter(0, 1))
+
+        with open(self.settings.BACKFILL_OUTPUT_FILE, 'w') as fout:
+            for _, _, msg in sent:
+                fout.write(f"{json.dumps(msg)}\n")
+                if self.parquet_sink is not None:
+                    self.parquet_sink.append(msg)
+        if self.parquet_sink is not None:
+            self.parquet_sink.close()
+        interval_s = round(time()-start_time, 2)
+        self.logger.info(f"Written {len(sent)} messages to {self.settings.BACKFILL_OUTPUT_FILE} in {interval_s} s")
+        return len(sent)
@@ -15,7 +15,7 @@ class DatasetMessage:
     ]
     
     def __init__(self, prov, depl_status):
-        self.msg = prov | depl_status
+        self.msg = prov.to_dict() | depl_status.to_dict()
         self.msg[self.MESSAGE_CREATION_DATE] = self.msg[LogAnalyzer.LAST_SUBMITTION_DATE].strftime(self.DATETIME_FORMAT)
         for key in self.KEY_TO_REMOVE:
             del self.msg[key]
@@ -0,0 +1,76 @@
+from time import time
+from modules.utilities.metrics import REGISTRY
+
+LATE_RECORDS = REGISTRY.counter("join_late_records_total", "Records behind the join watermark")
+EVICTED_ENTRIES = REGISTRY.counter("join_evicted_total", "Entries evicted from the join state", ["state"])
+ORPHAN_ENTRIES = REGISTRY.counter("join_orphans_total", "Entries evicted without being joined", ["state"])
+
+class JoinWindow:
+    """
+    Event-time window of the join between providers-to-rank and deployment events.
+    The watermark follows the largest record timestamp seen, minus the allowed
+    lateness. Entries older than the watermark minus the join window are expired.
+    All the timestamps are in seconds since the epoch.
+    """
+
+    def __init__(self, settings, logger):
+        self.logger = logger
+        self.window_s = settings.JOIN_WINDOW_S
+        self.lateness_s = settings.JOIN_ALLOWED_LATENESS_S
+        self.eviction_period_s = settings.JOIN_EVICTION_PERIOD_S
+        self.max_event_ts = float("-inf")
+        self.last_eviction_ts = time()
+
+        # Monitoring metrics
+        self.late_records = 0
+        self.evicted = 0
+        self.orphans = 0
+        self.logger.info(f"Join window: {self.window_s} s, allowed lateness: {self.lateness_s} s")
+
+    def get_mon_data(self) -> dict:
+        return {"join_watermark": self.watermark(),
+                "join_late_records": self.late_records,
+                "join_evicted": self.evicted,
+                "join_orphans": self.orphans}
+
+    def get_state(self) -> dict:
+        return {"max_event_ts": self.max_event_ts}
+
+    def set_state(self, state: dict) -> None:
+        self.max_event_ts = state["max_event_ts"]
+
+    def watermark(self) -> float:
+        return self.max_event_ts - self.lateness_s
+
+    def observe(self, event_ts: float) -> bool:
+        # Advance the watermark, returns True if the record is late
+        if event_ts > self.max_event_ts:
+            self.max_event_ts = event_ts
+            return False
+        if event_ts < self.max_event_ts - self.lateness_s:
+            self.late_records += 1
+            LATE_RECORDS.inc()
+            return True
+        return False
+
+    def is_eviction_due(self) -> bool:
+        return time() - self.last_eviction_ts >= self.eviction_period_s
+
+    def expiration_ts(self) -> float:
+        return self.watermark() - self.window_s
+
+    def is_expired(self, event_ts: float) -> bool:
+        # Expired entries are ignored by the join before being evicted:
+        # the joined records do not depend on the eviction period
+        return event_ts < self.expiration_ts()
+
+    def start_eviction(self) -> float:
+        # Expiration timestamp of the eviction due
+        self.last_eviction_ts = time()
+        return self.expiration_ts()
+
+    def count_evicted(self, state: str, n_evicted: int, n_orphans: int) -> None:
+        self.evicted += n_evicted
+        self.orphans += n_orphans
+        EVICTED_ENTRIES.labels(state).inc(n_evicted)
+        ORPHAN_ENTRIES.labels(state).inc(n_orphans)
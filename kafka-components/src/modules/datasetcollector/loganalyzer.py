@@ -1,11 +1,13 @@
 import json
-from datetime import datetime
-import pytz
+from modules.datasetcollector.records import DeploymentStatus
+from modules.utilities.orc_events import OrcEvent, OrcEventParser
+from modules.utilities.prefilter import RawLinePrefilter
+from modules.utilities.state_store import InMemoryStateStore, StateStore
 
 class LogAnalyzer:
-    ORCLOG_SUBMISSION_LINE    = "Submission of deployment request to the IM. "
-    ORCLOG_COMPLETED_LINE     = "Deployment completed successfully. "
-    ORCLOG_ERROR_LINE         = "Deployment in error. "
+    ORCLOG_SUBMISSION_LINE    = OrcEventParser.SUBMISSION_LINE
+    ORCLOG_COMPLETED_LINE     = OrcEventParser.COMPLETED_LINE
+    ORCLOG_ERROR_LINE         = OrcEventParser.ERROR_LINE
     # ORCLOG_ORCHESTARTOR_TAG   = " paas-orchestrator-pre orchestrator/"
     LOG_SEP_DEFAULT = 'paas-orchestrator orchestrator/'
     LOG_SEP_KEY = "log_sep"
@@ -18,12 +20,10 @@ class LogAnalyzer:
     ORCLOG_STATUS             = 'status'
     ORCLOG_STATUS_REASON      = 'status_reason'
     
-    LINE_MESSAGE = "message"
+    LINE_PAYLOAD = "payload"
     LINE_TIMESTAMP = "timestamp"
     
-    LINES_TO_REJECT = [
-        'it.reply.orchestrator.exception.service.DeploymentException: Error executing request to IM'
-    ]
+    LINES_TO_REJECT = OrcEventParser.LINES_TO_REJECT
 
     # Internal variables
     TIMESTAMP   = 'timestamp'
@@ -46,10 +46,19 @@ class LogAnalyzer:
     STATUS_COMPLETED = 'CREATE_COMPLETE'
     STATUS_FAILED    = 'CREATE_FAILED'
 
-    def __init__(self, settings, logger = None):
+    def __init__(self, settings, logger = None, 
+                 depl_status: StateStore = None, data: StateStore = None):
         self.logger = logger
-        self.depl_status = {}
-        self.data = {}
+        self.depl_status = depl_status if depl_status is not None else InMemoryStateStore()
+        self.data = data if data is not None else InMemoryStateStore()
+        self.depl_status.ts_of = self.get_event_ts
+        self.data.ts_of = self.get_event_ts
+        # Called with the key of each stored deployment status
+        self.on_store = None
+        # is_expired(event_ts) of the join window: expired deployments are
+        # dropped when their next event arrives, even if not evicted yet
+        self.is_expired = None
+        self.n_expired = 0
         
         # Init Monitoring metrics:
         self.detected_events = 0
@@ -61,25 +70,73 @@ class LogAnalyzer:
             self.ORCLOG_ORCHESTARTOR_TAG = self.LOG_SEP_DEFAULT
         self.logger.info(f"Using log separator: {self.ORCLOG_ORCHESTARTOR_TAG}")
         
-    def is_line_to_reject(self, line):
-        msg = line[self.LINE_MESSAGE]
-        return self.ORCLOG_ORCHESTARTOR_TAG not in msg or \
-            any(item in msg for item in self.LINES_TO_REJECT)
-
-    def is_submission_event(self, line):
-        msg = line[self.LINE_MESSAGE]
-        return self.ORCLOG_SUBMISSION_LINE in msg
-
-    def is_completed_event(self, line):
-        msg = line[self.LINE_MESSAGE]
-        return self.ORCLOG_COMPLETED_LINE in msg
-
-    def is_error_event(self, line):
-        msg = line[self.LINE_MESSAGE]
-        return self.ORCLOG_ERROR_LINE in msg
+        # Most orchestrator-logs records carry none of the events: 
+        # discard them before decoding the filebeat envelope
+        self.prefilter = RawLinePrefilter("log_analyzer",
+                                          required=[self.ORCLOG_ORCHESTARTOR_TAG],
+                                          any_of=[self.ORCLOG_SUBMISSION_LINE,
+                                                  self.ORCLOG_COMPLETED_LINE,
+                                                  self.ORCLOG_ERROR_LINE],
+                                          none_of=self.LINES_TO_REJECT)
+        self.parser = OrcEventParser({OrcEventParser.LOG_SEP_KEY: self.ORCLOG_ORCHESTARTOR_TAG}, 
+                                     logger, prefilter=self.prefilter)
+        self.event_handlers = {OrcEventParser.KIND_SUBMISSION: self.update_sub_event,
+                               OrcEventParser.KIND_COMPLETED: self.update_completed_event,
+                               OrcEventParser.KIND_ERROR: self.update_error_event}
+        # Records of the events topic carrying none of the deployment events
+        self.event_prefilter = RawLinePrefilter("log_analyzer_events",
+                                                any_of=[OrcEvent.kind_marker(kind) 
+                                                        for kind in OrcEventParser.DEPLOYMENT_KINDS])
     
     def get_mon_data(self):
-        return {"detected_events": self.detected_events}
+        return {"detected_events": self.detected_events,
+                "rejected_lines": self.prefilter.rejected.value + self.event_prefilter.rejected.value,
+                "depl_status_size": len(self.depl_status),
+                "depl_data_size": len(self.data)}
+    
+    @classmethod
+    def get_event_ts(cls, data: DeploymentStatus) -> float:
+        # Deployments expire with their last submission
+        return data[cls.LAST_SUBMITTION_DATE].timestamp()
+    
+    def get_state(self) -> dict:
+        return {"depl_status": self.depl_status.get_state(),
+                "data": self.data.get_state()}
+    
+    def set_state(self, state: dict) -> None:
+        self.depl_status.set_state(state["depl_status"])
+        self.data.set_state(state["data"])
+    
+    def select_state(self, uuid_filter, remove: bool = False) -> dict:
+        """
+        State of the deployments whose uuid satisfies uuid_filter(uuid), 
+        in the get_state() format. With remove, the entries are deleted.
+        """
+        depl_status = {uuid: status for uuid, status in self.depl_status.items() if uuid_filter(uuid)}
+        data = {key: status for key, status in self.data.items() if uuid_filter(status.uuid)}
+        if remove:
+            for uuid in depl_status:
+                del self.depl_status[uuid]
+            for key in data:
+                del self.data[key]
+        return {"depl_status": depl_status, "data": data}
+    
+    def merge_state(self, state: dict) -> None:
+        self.depl_status.update(state["depl_status"])
+        self.data.update(state["data"])
+    
+    def evict(self, expiration_ts: float) -> tuple[list[str], int]:
+        """
+        Remove the deployments whose last submission is older than expiration_ts.
+        Returns the keys removed from data and the number of in-flight deployments
+        removed from depl_status.
+        """
+        expired_keys = self.data.evict(expiration_ts)
+        expired_uuids = self.depl_status.evict(expiration_ts)
+        # In-flight deployments already dropped as expired
+        n_in_flight = len(expired_uuids) + self.n_expired
+        self.n_expired = 0
+        return expired_keys, n_in_flight
     
     def generate_key(self, obj):
         if  self.ORCLOG_PROVIDER_NAME in obj and \
@@ -92,34 +149,23 @@ class LogAnalyzer:
             ]
             return "_".join(k_list).lower()
         else:
-            self.logger.debug(f"[log-analyzer][generate_key] It is not possible create key from obj: {obj}")
-            self.logger.debug(f"[log-analyzer][generate_key] Missed {self.ORCLOG_PROVIDER_NAME} and/or {self.ORCLOG_PROVIDER_REGION} and/or {self.ORCLOG_UUID} keys")
+            self.logger.debug("[log-analyzer][generate_key] It is not possible create key from obj: %s", obj)
+            self.logger.debug("[log-analyzer][generate_key] Missed %s and/or %s and/or %s keys",
+                              self.ORCLOG_PROVIDER_NAME, self.ORCLOG_PROVIDER_REGION, self.ORCLOG_UUID)
     
     def print_special_chars(self, my_string):
         for char in my_string:
             print(f"    {char}     |      {hex(ord(char))}")
     
     # Controllare se ci sono ancora problemi di lunghezza del messaggio
-    def get_info_from_line(self, line: dict, split_str: str)-> dict:
-        
-        msg = line[self.LINE_MESSAGE]
-        
-        output_msg = ""
-        msg = msg.strip()
-        if len(msg) < 8100:
-            output_msg = msg
-        elif msg.endswith('\\'):
-            output_msg = msg[:-1] + ' "}'
-        else:
-            output_msg = msg + ' "}'
-        
-        msg = output_msg
+    def get_info_from_line(self, line: dict)-> dict:
         
+        payload = line[self.LINE_PAYLOAD]
         try:
-            msg_data = json.loads(msg.split(split_str)[1].strip())
+            msg_data = json.loads(payload)
         except Exception as e:
-            self.logger.error(f"[log-analyzer][get_info_from_line] Error parsing JSON from log message: {msg}")
-            self.logger.error(f"[log-analyzer][get_info_from_line] Error parsing JSON from log message: {self.print_special_chars(msg[-10:])}")
+            self.logger.error(f"[log-analyzer][get_info_from_line] Error parsing JSON from log message: {payload}")
+            self.logger.error(f"[log-analyzer][get_info_from_line] Error parsing JSON from log message: {self.print_special_chars(payload[-10:])}")
             self.logger.error(f"[log-analyzer][get_info_from_line] Exception: {e}")
             raise Exception("Error parsing JSON from log message")
         
@@ -138,39 +184,41 @@ class LogAnalyzer:
             ]).lower()
             return str_key
         else:
-            self.logger.debug(f"[log-analyzer][get_provider_id] It is not possible create key from obj: {data}")
-            self.logger.debug(f"[log-analyzer][get_provider_id] Missed {self.ORCLOG_PROVIDER_NAME} and/or {self.ORCLOG_PROVIDER_REGION} keys")
+            self.logger.debug("[log-analyzer][get_provider_id] It is not possible create key from obj: %s", data)
+            self.logger.debug("[log-analyzer][get_provider_id] Missed %s and/or %s keys",
+                              self.ORCLOG_PROVIDER_NAME, self.ORCLOG_PROVIDER_REGION)
             return None
 
-    def init_state_dep(self, msg_data: dict):
-        return {self.UUID: msg_data[self.ORCLOG_UUID],
-                self.CREATION_DATE: msg_data[self.TIMESTAMP],
-                self.STATUS: self.STATUS_SUBMITTED,
-                self.STATUS_REASON: None,
-                self.N_FAILURES: 0,
-                self.TOT_FAILURE_TIME: 0,
-                self.COMPL_TIME: 0,
-                self.LAST_SUBMITTION_DATE: msg_data[self.TIMESTAMP],
-                self.PROVIDER_ID: self.get_provider_id(msg_data)
-            }
+    def init_state_dep(self, msg_data: dict) -> DeploymentStatus:
+        return DeploymentStatus(uuid=msg_data[self.ORCLOG_UUID],
+                                creation_date=msg_data[self.TIMESTAMP],
+                                status=self.STATUS_SUBMITTED,
+                                status_reason=None,
+                                n_failures=0,
+                                tot_failure_time_s=0,
+                                completion_time_s=0,
+                                last_sub_date=msg_data[self.TIMESTAMP],
+                                provider_id=self.get_provider_id(msg_data))
 
     def store_depl_status(self, data: dict):
         key = '_'.join([
                 data[self.PROVIDER_ID],
                 data[self.UUID]
             ]).lower()
-        self.logger.debug(f"[log-analyzer][store_dep_status] Generated key: {key}")
+        self.logger.debug("[log-analyzer][store_dep_status] Generated key: %s", key)
         if key in self.data:
             self.logger.warn("[log-analyzer][store_dep_status] Deployment status already in the data. Overwrite")
         else:
             self.logger.info("[log-analyzer][store_dep_status] Added deployment in data")
         self.data[key] = data.copy()
+        if self.on_store is not None:
+            self.on_store(key)
 
     def update_sub_event(self, msg) -> bool:
         self.detected_events += 1
-        msg_data = self.get_info_from_line(msg, self.ORCLOG_SUBMISSION_LINE)
+        msg_data = self.get_info_from_line(msg)
         uuid = msg_data[self.UUID]
-        self.logger.info(f"[log-analysis][update_sub_event] Detected Submission event for uuid: {uuid}")
+        self.logger.info("[log-analysis][update_sub_event] Detected Submission event for uuid: %s", uuid)
         if uuid not in self.depl_status:
             self.depl_status[uuid] = self.init_state_dep(msg_data)
             self.logger.debug("[log-analysis][update_sub_event] Added to deployment status")
@@ -204,9 +252,9 @@ class LogAnalyzer:
 
     def update_completed_event(self, msg):
         self.detected_events += 1
-        msg_data = self.get_info_from_line(msg, self.ORCLOG_COMPLETED_LINE)
+        msg_data = self.get_info_from_line(msg)
         uuid = msg_data[self.UUID]
-        self.logger.info(f"[log-analysis][update_completed_event] Detected Completed event for uuid: {uuid}")
+        self.logger.info("[log-analysis][update_completed_event] Detected Completed event for uuid: %s", uuid)
         if uuid in self.depl_status: # and prov_id == self.depl_status[uuid][self.PROVIDER_ID]:
             # Evento di CREATE_COMPLETED dopo un CREATE_IN_PROGRESS sullo stesso provider
             # L'unico che dovrebbe accadere
@@ -237,9 +285,9 @@ class LogAnalyzer:
 
     def update_error_event(self, msg):
         self.detected_events += 1
-        msg_data = self.get_info_from_line(msg, self.ORCLOG_ERROR_LINE)
+        msg_data = self.get_info_from_line(msg)
         uuid = msg_data[self.UUID]
-        self.logger.info(f"[log-analysis][update_error_event] Detected Error event for uuid: {uuid}")
+        self.logger.info("[log-analysis][update_error_event] Detected Error event for uuid: %s", uuid)
         final_error = True if self.ORCLOG_ERROR_SUMMARY_LINE in msg_data[self.STATUS_REASON] else False
         if uuid in self.depl_status:
             if final_error:
@@ -318,47 +366,39 @@ class LogAnalyzer:
     def keys(self) -> set:
         return set(self.data.keys())
     
-    def get(self, key) -> dict:
+    def get(self, key) -> DeploymentStatus:
         return self.data.get(key, None)
     
-    def timestamp(self, ts_str):
-        dt_utc = datetime.strptime(ts_str, self.ORCLOG_FILEBEAT_TS_FORMAT )
-        dt_utc = dt_utc.replace(tzinfo=pytz.utc)
-
-        italy_tz = pytz.timezone("Europe/Rome")
-        dt_local = dt_utc.astimezone(italy_tz)
-        return dt_local
-    
     def import_line(self, line) -> bool:
-        try:
-            dec_line = json.loads(line)
-        except json.JSONDecodeError:
-            self.logger.error(f"[log-analyzer][import_line] Line is not a valid JSON message: {line}")
-            return False   
-        except KeyError:
-            self.logger.error(f"[log-analyzer][import_line] Line does not contain 'message' key: {line}")
+        """Import a raw orchestrator-logs record"""
+        event = self.parser.parse(line)
+        if event is None:
             return False
+        return self.import_event(event)
+    
+    def import_event_record(self, value) -> bool:
+        """Import a record of the orchestrator events topic"""
+        if not self.event_prefilter.accept(value):
+            return False
+        try:
+            event = OrcEvent.from_json(value)
         except Exception as e:
-            self.logger.error(f"[log-analyzer][import_line] Unexpected error while processing line: {line}")
-            self.logger.error(f"[log-analyzer][import_line] Error: {e}")
+            self.logger.error(f"[log-analyzer][import_event_record] Invalid event record: {value}")
+            self.logger.error(f"[log-analyzer][import_event_record] Error: {e}")
             return False
-        else:
-            line = {
-                self.LINE_MESSAGE: dec_line['message'],
-                self.LINE_TIMESTAMP: self.timestamp(dec_line['@timestamp'])
-            }
-            
-        if self.is_line_to_reject(line):
+        return self.import_event(event)
+    
+    def import_event(self, event: OrcEvent) -> bool:
+        handler = self.event_handlers.get(event.kind)
+        if handler is None:
             return False
-
-        # SUBMISSION EVENT
-        if self.is_submission_event(line):
-            return self.update_sub_event(line)
-            
-        elif self.is_completed_event(line): # COMPLETED EVENT
-            return self.update_completed_event(line)
-            
-        elif self.is_error_event(line): # ERROR EVENT
-            return self.update_error_event(line)
-            
-        return False
\ No newline at end of file
+        if self.is_expired is not None:
+            status = self.depl_status.get(event.uuid)
+            if status is not None and self.is_expired(self.get_event_ts(status)):
+                del self.depl_status[event.uuid]
+                self.n_expired += 1
+        line = {
+            self.LINE_PAYLOAD: event.payload,
+            self.LINE_TIMESTAMP: event.timestamp
+        }
+        return handler(line)
@@ -0,0 +1,206 @@
+import json
+import os
+import socket
+from glob import glob
+from time import time
+import pandas as pd
+
+# Needed only with PARQUET_SINK_ENABLED: checked by ParquetSink at startup
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+class ParquetSink:
+    """
+    Export of the dataset messages to day-partitioned Parquet files, under
+    <PARQUET_SINK_DIR>/date=YYYY-MM-DD/. The file of each day stays open and
+    every flush appends a row group to it; it is closed on day rollover and
+    by close(). While open the file is hidden, and its rows are also appended
+    to a journal: the files left open by a crash are rewritten from their
+    journal at the next startup on the same host. Rows that could not be
+    written stay buffered, flush() reports it.
+    The dataset columns have fixed types. The other provider columns take
+    the type of the first rows of the file, string when they are all null.
+    """
+
+    PARTITION_COLUMN = 'submission_time'
+    COLUMN_TYPES = {'uuid': 'string',
+                    'provider_name': 'string',
+                    'region_name': 'string',
+                    'template_name': 'string',
+                    'user_group': 'string',
+                    'msg_version': 'string',
+                    'status': 'string',
+                    'status_reason': 'string',
+                    'n_failures': 'int64',
+                    'tot_failure_time_s': 'double',
+                    'completion_time_s': 'double',
+                    'submission_time': 'timestamp[us]'}
+    DATETIME_COLUMNS = ['submission_time']
+    JOURNAL_SUFFIX = '.jsonl'
+
+    def __init__(self, settings, logger):
+        self.logger = logger
+        self.directory = settings.PARQUET_SINK_DIR
+        self.row_group_size = settings.PARQUET_SINK_ROW_GROUP_SIZE
+        self.flush_period = settings.PARQUET_SINK_FLUSH_PERIOD
+        self.hostname = socket.gethostname()
+        self.rows = []
+        self.last_flush_ts = time()
+        self.n_files = 0
+        # Open file of each day: (ParquetWriter, partition directory, file name)
+        self.files = {}
+
+        # Monitoring metrics
+        self.rows_written = 0
+        self.write_errors = 0
+
+        # Missing engine: fail at startup, not on every flush
+        if pa is None:
+            raise ImportError("PARQUET_SINK_ENABLED requires pyarrow")
+        os.makedirs(self.directory, exist_ok=True)
+        self.recover_files()
+        self.logger.info(f"Parquet dataset sink enabled. Directory: {self.directory}")
+
+    def get_mon_data(self) -> dict:
+        return {"parquet_rows_buffered": len(self.rows),
+                "parquet_rows_written": self.rows_written,
+                "parquet_files_open": len(self.files),
+                "parquet_write_errors": self.write_errors}
+
+    def append(self, msg: dict) -> None:
+        self.rows.append(msg)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def is_flush_due(self) -> bool:
+        return len(self.rows) > 0 and time() - self.last_flush_ts >= self.flush_period
+
+    def get_schema(self, df: pd.DataFrame) -> 'pa.Schema':
+        fields = [pa.field(column, pa.type_for_alias(type_name)) for column, type_name in self.COLUMN_TYPES.items()]
+        for field in pa.Schema.from_pandas(df, preserve_index=False):
+            if field.name not in self.COLUMN_TYPES:
+                fields.append(pa.field(field.name, pa.string() if pa.types.is_null(field.type) else field.type))
+        return pa.schema(fields)
+
+    def to_table(self, rows: list[dict], schema: 'pa.Schema' = None) -> 'pa.Table':
+        df = pd.DataFrame.from_records(rows)
+        for column in self.DATETIME_COLUMNS:
+            if column in df:
+                df[column] = pd.to_datetime(df[column])
+        if schema is None:
+            schema = self.get_schema(df)
+        dropped = set(df.columns) - set(schema.names)
+        if dropped:
+            self.logger.warning(f"[parquet-sink][to_table] Columns not in the file schema dropped: {sorted(dropped)}")
+        # The columns missing in these rows are null
+        return pa.Table.from_pandas(df.reindex(columns=schema.names), schema=schema, preserve_index=False)
+
+    def get_path(self, partition_dir: str, name: str, suffix: str = '.parquet', hidden: bool = True) -> str:
+        # Hidden files are not read with the dataset
+        return os.path.join(partition_dir, f"{'.' if hidden else ''}{name}{suffix}")
+
+    def open_file(self, day: str, schema: 'pa.Schema') -> None:
+        partition_dir = os.path.join(self.directory, f"date={day}")
+        os.makedirs(partition_dir, exist_ok=True)
+        name = f"part-{self.hostname}-{int(time() * 1000)}-{self.n_files:05d}"
+        self.n_files += 1
+        self.files[day] = (pq.ParquetWriter(self.get_path(partition_dir, name), schema), partition_dir, name)
+
+    def write_rows(self, day: str, rows: list[dict]) -> bool:
+        try:
+            if day in self.files:
+                table = self.to_table(rows, self.files[day][0].schema)
+            else:
+                table = self.to_table(rows)
+                self.open_file(day, table.schema)
+            writer, partition_dir, name = self.files[day]
+            # The journal keeps the rows until the file is closed
+            with open(self.get_path(partition_dir, name, self.JOURNAL_SUFFIX), 'a') as fout:
+                fout.writelines(f"{json.dumps(row)}\n" for row in rows)
+                fout.flush()
+                os.fsync(fout.fileno())
+        except Exception as e:
+            self.write_errors += 1
+            self.logger.error(f"[parquet-sink][write_rows] Error writing {len(rows)} rows of {day}: {e}")
+            return False
+        self.rows_written += len(rows)
+        try:
+            writer.write_table(table, row_group_size=self.row_group_size)
+        except Exception as e:
+            self.write_errors += 1
+            self.logger.error(f"[parquet-sink][write_rows] Error writing a row group of {name}: {e}")
+            # The rows are in the journal: the file is rewritten from it
+            self.close_file(day)
+        return True
+
+    def close_file(self, day: str) -> None:
+        writer, partition_dir, name = self.files.pop(day)
+        try:
+            writer.close()
+            os.replace(self.get_path(partition_dir, name), self.get_path(partition_dir, name, hidden=False))
+        except Exception as e:
+            self.write_errors += 1
+            self.logger.error(f"[parquet-sink][close_file] Error closing {name}: {e}")
+            self.recover_file(self.get_path(partition_dir, name, self.JOURNAL_SUFFIX))
+            return
+        os.remove(self.get_path(partition_dir, name, self.JOURNAL_SUFFIX))
+        self.logger.debug("[parquet-sink][close_file] Closed %s", name)
+
+    def recover_file(self, journal: str) -> None:
+        """Rewrite the file of a journal at once, e.g. a file left open by a crash"""
+        partition_dir, journal_name = os.path.split(journal)
+        name = journal_name[1:-len(self.JOURNAL_SUFFIX)]
+        try:
+            rows = []
+            with open(journal, 'r') as fin:
+                for line in fin:
+                    try:
+                        rows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        self.logger.warning(f"[parquet-sink][recover_file] Truncated line skipped in {journal}")
+            if rows:
+                pq.write_table(self.to_table(rows), self.get_path(partition_dir, name),
+                               row_group_size=self.row_group_size)
+                os.replace(self.get_path(partition_dir, name), self.get_path(partition_dir, name, hidden=False))
+            os.remove(journal)
+        except Exception as e:
+            self.write_errors += 1
+            self.logger.error(f"[parquet-sink][recover_file] Error rewriting {journal}, kept for the next startup: {e}")
+            return
+        self.logger.info(f"[parquet-sink][recover_file] Rewritten {len(rows)} rows of {name} from its journal")
+
+    def recover_files(self) -> None:
+        # The files of the other hosts may be open: left to the replica of the host
+        for journal in glob(os.path.join(self.directory, "date=*", f".part-{self.hostname}-*{self.JOURNAL_SUFFIX}")):
+            self.recover_file(journal)
+
+    def flush(self) -> bool:
+        """
+        Append the buffered rows to the file of their day, as a row group.
+        The files of the days before the newest one are closed.
+        Returns:
+            bool: True if all the rows were written, the others stay buffered.
+        """
+        self.last_flush_ts = time()
+        if not self.rows:
+            return True
+        rows, self.rows = self.rows, []
+        days = {}
+        for row in rows:
+            days.setdefault(row[self.PARTITION_COLUMN][:10], []).append(row)
+        for day, day_rows in sorted(days.items()):
+            if not self.write_rows(day, day_rows):
+                self.rows += day_rows
+        newest_day = max(days)
+        for day in [day for day in self.files if day < newest_day]:
+            self.close_file(day)
+        return not self.rows
+
+    def close(self) -> bool:
+        written = self.flush()
+        for day in list(self.files):
+            self.close_file(day)
+        return written
@@ -0,0 +1,95 @@
+from sys import intern
+
+def intern_str(value):
+    return intern(value) if isinstance(value, str) else value
+
+class DeploymentStatus:
+    """
+    Status of a deployment on a provider, with the keys of the former dict.
+    Item access is kept, so the LogAnalyzer state machine is unchanged.
+    """
+    __slots__ = ('uuid', 'creation_date', 'status', 'status_reason', 'n_failures',
+                 'tot_failure_time_s', 'completion_time_s', 'last_sub_date', 'provider_id')
+
+    def __init__(self, uuid, creation_date, status, status_reason, n_failures,
+                 tot_failure_time_s, completion_time_s, last_sub_date, provider_id):
+        self.uuid = uuid
+        self.creation_date = creation_date
+        self.status = status
+        self.status_reason = status_reason
+        self.n_failures = n_failures
+        self.tot_failure_time_s = tot_failure_time_s
+        self.completion_time_s = completion_time_s
+        self.last_sub_date = last_sub_date
+        self.provider_id = intern_str(provider_id)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def copy(self) -> 'DeploymentStatus':
+        return DeploymentStatus(*(getattr(self, key) for key in self.__slots__))
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"DeploymentStatus({self.to_dict()})"
+
+class ProviderRecord:
+    """
+    Ranking entry of a provider for a deployment, stored as a values tuple.
+    The tuple of field names is shared by all the records with the same fields.
+    event_ts is the timestamp of the providers-to-rank message, not a field.
+    """
+    __slots__ = ('fields', 'values', 'event_ts')
+
+    # Fields with few distinct values, interned to share a single copy
+    INTERNED_FIELDS = frozenset(['provider_name', 'region_name', 'msg_version',
+                                 'template_name', 'user_group'])
+    schemas = {}
+
+    def __init__(self, fields: tuple, values: tuple, event_ts: float = None):
+        self.fields = fields
+        self.values = values
+        self.event_ts = event_ts
+
+    @classmethod
+    def from_dict(cls, data: dict, event_ts: float = None) -> 'ProviderRecord':
+        fields = tuple(data)
+        fields = cls.schemas.setdefault(fields, fields)
+        values = tuple(intern_str(value) if field in cls.INTERNED_FIELDS else value
+                       for field, value in data.items())
+        return cls(fields, values, event_ts)
+
+    def __getitem__(self, key):
+        try:
+            return self.values[self.fields.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return self[key] if key in self.fields else default
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def to_dict(self) -> dict:
+        return dict(zip(self.fields, self.values))
+
+    def __getstate__(self):
+        return self.fields, self.values, self.event_ts
+
+    def __setstate__(self, state):
+        fields, values, event_ts = state
+        self.fields = self.schemas.setdefault(fields, fields)
+        self.values = values
+        self.event_ts = event_ts
+
+    def __repr__(self):
+        return f"ProviderRecord({self.to_dict()})"
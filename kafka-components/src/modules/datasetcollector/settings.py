@@ -11,6 +11,12 @@ class DatasetCollectorConfig(BaseSettings):
     LOG_DIR: str = Field(default = "./logs",
                          env="APP_LOG_DIR",
                          description="Directory for application logs")
+    LOG_LEVEL: str = Field(default = "DEBUG",
+                           env="LOG_LEVEL",
+                           description="Logging level (DEBUG, INFO, WARNING, ERROR)")
+    LOG_DEBUG_SAMPLING: int = Field(default = 1,
+                                    env="LOG_DEBUG_SAMPLING",
+                                    description="Keep the DEBUG output of one consumed message every N")
     KAFKA_ACKS: str = Field(default = 'all',
                             env="KAFKA_ACKS",
                             description="Acknowledgment setting for Kafka producer")    
@@ -20,6 +26,9 @@ class DatasetCollectorConfig(BaseSettings):
     KAFKA_AUTO_OFFSET_RESET: str = Field(default = 'earliest',
                                           env="KAFKA_AUTO_OFFSET_RESET",
                                           description="Auto offset reset policy for Kafka consumer")
+    KAFKA_BATCH_SIZE: int = Field(default = 16384,
+                                  env="KAFKA_BATCH_SIZE",
+                                  description="Maximum size, in bytes, of a batch of records for the Kafka producer")
     KAFKA_BOOTSTRAP_SERVERS: str = Field(default = 'kafka-1:9095,kafka-2:9095,kafka-3:9095',
                                           env="KAFKA_BOOTSTRAP_SERVERS",
                                           description="Bootstrap servers for Kafka cluster")
@@ -44,10 +53,16 @@ class DatasetCollectorConfig(BaseSettings):
     KAFKA_INPUT_ORC_LOG_TOPIC: str = Field(default = "orchestrator-logs",
                                            env="KAFKA_INPUT_ORC_LOG_TOPIC",
                                            description="Name of the input Kafka Orchestrator Log topic")
+    KAFKA_INPUT_ORC_EVENTS_TOPIC: str = Field(default = "orchestrator-events",
+                                              env="KAFKA_INPUT_ORC_EVENTS_TOPIC",
+                                              description="Topic of the parsed orchestrator events, read when ORC_EVENTS_ENABLED")
     KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC: str = Field(default = "providers-to-rank",
                                           env="KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC",
                                            description="Name of the input Kafka AI-Ranker inference topic")
-    KAFKA_MAX_POLL_RECORDS: int = Field(default = 1,
+    KAFKA_LINGER_MS: int = Field(default = 0,
+                                 env="KAFKA_LINGER_MS",
+                                 description="Time, in ms, the Kafka producer waits to fill a batch before sending it")
+    KAFKA_MAX_POLL_RECORDS: int = Field(default = 500,
                                          env="KAFKA_MAX_POLL_RECORDS",
                                          description="Maximum number of records to return in a single poll for Kafka consumer")
     KAFKA_MAX_REQUEST_SIZE: int = Field(default = 104857600,
@@ -59,6 +74,36 @@ class DatasetCollectorConfig(BaseSettings):
     KAFKA_LOG_TOPIC: str = Field(default = "logs-proc-dataset-collector",
                                  env="KAFKA_LOG_TOPIC",
                                  description="Kafka topic for logging messages")    
+    KAFKA_LOG_QUEUE_SIZE: int = Field(default = 10000,
+                                      env="KAFKA_LOG_QUEUE_SIZE",
+                                      description="Maximum number of log records waiting to be sent to the log topic")
+    KAFKA_LOG_BATCH_SIZE: int = Field(default = 100,
+                                      env="KAFKA_LOG_BATCH_SIZE",
+                                      description="Maximum number of log records sent to the log topic at once")
+    KAFKA_LOG_BATCH_TIMEOUT_S: float = Field(default = 0.5,
+                                             env="KAFKA_LOG_BATCH_TIMEOUT_S",
+                                             description="Maximum time, in seconds, a log record waits for its batch")
+    KAFKA_POLL_TIMEOUT_MS: int = Field(default = 1000,
+                                       env="KAFKA_POLL_TIMEOUT_MS",
+                                       description="Timeout, in ms, of a single poll of the Kafka consumer")
+    KAFKA_SCALE_OUT: bool = Field(default = False,
+                                  env="KAFKA_SCALE_OUT",
+                                  description="Split the input partitions among the replicas of a shared group, with the state handed off on rebalance")
+    KAFKA_SEND_MODE: str = Field(default = 'sync',
+                                 env="KAFKA_SEND_MODE",
+                                 description="Send mode: 'sync' flushes every message, 'batch' flushes on thresholds/checkpoints")
+    KAFKA_SEND_FLUSH_RECORDS: int = Field(default = 1000,
+                                          env="KAFKA_SEND_FLUSH_RECORDS",
+                                          description="In batch mode, number of pending records that triggers a flush")
+    KAFKA_SEND_FLUSH_INTERVAL_S: float = Field(default = 1.0,
+                                               env="KAFKA_SEND_FLUSH_INTERVAL_S",
+                                               description="In batch mode, maximum interval, in seconds, between two flushes")
+    KAFKA_SEND_MAX_RETRIES: int = Field(default = 3,
+                                        env="KAFKA_SEND_MAX_RETRIES",
+                                        description="In batch mode, maximum delivery attempts of a failed message")
+    KAFKA_STABLE_GROUP_ID: bool = Field(default = False,
+                                        env="KAFKA_STABLE_GROUP_ID",
+                                        description="Use the group ID as is, without random suffix, so committed offsets survive restarts")
     KAFKA_SSL_CAFILE: str = Field(default = "./certs/ca_cert.pem",
                                    env="KAFKA_SSL_CAFILE",
                                    description="Path to the CA certificate file")
@@ -77,15 +122,75 @@ class DatasetCollectorConfig(BaseSettings):
     KAFKA_VALUE_SERIALIZER_STR: str = Field(default = 'json',
                                            env="KAFKA_VALUE_SERIALIZER",
                                            description="Serializer for Kafka message values")
+    BACKFILL_ORC_LOG_FILE: str = Field(default = "./logs/output_orchestrator_logs_msgs.txt",
+                                       env="BACKFILL_ORC_LOG_FILE",
+                                       description="Dump of the orchestrator-logs topic read by the backfill")
+    BACKFILL_PROVIDERS_FILE: str = Field(default = "./logs/output_providers_to_rank_msgs.txt",
+                                         env="BACKFILL_PROVIDERS_FILE",
+                                         description="Dump of the providers-to-rank topic read by the backfill")
+    BACKFILL_OUTPUT_FILE: str = Field(default = "./logs/dataset.jsonl",
+                                      env="BACKFILL_OUTPUT_FILE",
+                                      description="Dataset file written by the backfill")
+    BACKFILL_WORKERS: int = Field(default = 0,
+                                  env="BACKFILL_WORKERS",
+                                  description="Backfill worker processes, 0 for one per CPU")
+    JOIN_WINDOW_S: int = Field(default = 259200, # 3 days
+                               env="JOIN_WINDOW_S",
+                               description="Maximum event-time distance between joined provider and deployment records, in seconds")
+    JOIN_ALLOWED_LATENESS_S: int = Field(default = 300,
+                                         env="JOIN_ALLOWED_LATENESS_S",
+                                         description="Delay of the join watermark behind the latest record timestamp, in seconds")
+    JOIN_EVICTION_PERIOD_S: int = Field(default = 60,
+                                        env="JOIN_EVICTION_PERIOD_S",
+                                        description="Period of the eviction of the expired join entries, in seconds")
     LOG_SEP: str = Field(default = "paas-orchestrator orchestrator/",
                                      env="LOG_SEP",
                                      description="Log separator used in the log parser")
+    ORC_EVENTS_ENABLED: bool = Field(default = False,
+                                     env="ORC_EVENTS_ENABLED",
+                                     description="Consume the events parsed by the orc-events stage instead of the raw orchestrator logs")
     MONITORING_ENABLED: bool = Field(default = True,
                                      env="MONITORING_ENABLED",
                                      description="Enable monitoring service")
     MONITORING_PERIOD: int = Field(default = 600, # 10 minutes
                                    env="MONITORING_PERIOD",
                                    description="Monitoring period, in seconds")
+    METRICS_ENABLED: bool = Field(default = True,
+                                  env="METRICS_ENABLED",
+                                  description="Expose the metrics on a local HTTP endpoint")
+    METRICS_PORT: int = Field(default = 8000,
+                              env="METRICS_PORT",
+                              description="Port of the metrics HTTP endpoint")
+    STATE_STORE: str = Field(default = "memory",
+                             env="STATE_STORE",
+                             description="Store of the processor state: 'memory' or 'sqlite'")
+    STATE_STORE_DIR: str = Field(default = "./state",
+                                 env="STATE_STORE_DIR",
+                                 description="Directory of the 'sqlite' state store files")
+    STATE_STORE_CACHE_SIZE: int = Field(default = 10000,
+                                        env="STATE_STORE_CACHE_SIZE",
+                                        description="Entries kept in memory for each 'sqlite' state store")
+    PARQUET_SINK_ENABLED: bool = Field(default = False,
+                                       env="PARQUET_SINK_ENABLED",
+                                       description="Also write the dataset messages to day-partitioned Parquet files")
+    PARQUET_SINK_DIR: str = Field(default = "./dataset",
+                                  env="PARQUET_SINK_DIR",
+                                  description="Root directory of the Parquet dataset")
+    PARQUET_SINK_ROW_GROUP_SIZE: int = Field(default = 10000,
+                                             env="PARQUET_SINK_ROW_GROUP_SIZE",
+                                             description="Rows buffered before writing a Parquet row group")
+    PARQUET_SINK_FLUSH_PERIOD: int = Field(default = 3600,
+                                           env="PARQUET_SINK_FLUSH_PERIOD",
+                                           description="Maximum time rows stay buffered, in seconds")
+    SNAPSHOT_ENABLED: bool = Field(default = False,
+                                   env="SNAPSHOT_ENABLED",
+                                   description="Enable periodic snapshots of the processor state")
+    SNAPSHOT_DIR: str = Field(default = "./snapshots",
+                              env="SNAPSHOT_DIR",
+                              description="Directory for the processor state snapshots")
+    SNAPSHOT_PERIOD: int = Field(default = 60,
+                                 env="SNAPSHOT_PERIOD",
+                                 description="Snapshot period, in seconds")
     value_serializer: Callable = None
     value_deserializer: Callable = None
     
@@ -0,0 +1,68 @@
+from modules.orcevents.settings import OrcEventsConfig
+from modules.utilities.kafka_client import KafkaClient
+from modules.utilities.logger import get_debug_sampler
+from modules.utilities.metrics import REGISTRY
+from modules.utilities.orc_events import OrcEventParser
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Processing time per stage, in seconds", ["stage"])
+PARSE_SECONDS = STAGE_SECONDS.labels("orc_events")
+EVENTS_SENT = REGISTRY.counter("orc_events_sent_total", "Orchestrator events sent", ["kind"])
+
+class OrcEventsProcessor:
+    """
+    Parsing stage of the orchestrator-logs topic: each raw line is parsed once
+    into an OrcEvent, sent to the events topic consumed by the template parser
+    and the dataset collector. Deployment events are keyed by uuid, the other
+    lines by orchestrator instance and thread.
+    """
+
+    def __init__(self, settings: OrcEventsConfig, logger = None, kafka_client: KafkaClient = None):
+        self.logger = logger
+        self.settings = settings
+
+        # An external client can be passed, e.g. by replay tools and tests
+        self.kafka_client = kafka_client if kafka_client is not None else \
+                            KafkaClient(logger, **settings.get_values())
+        self.parser = OrcEventParser(settings, logger)
+        self.debug_sampler = get_debug_sampler(logger)
+
+        # Monitoring metrics
+        self.rec_orc_log = 0
+        self.msg_sent = 0
+        self.events_sent = {}
+
+    def get_mon_data(self) -> dict:
+        return {"rec_orc_log": self.rec_orc_log,
+                "msg_sent": self.msg_sent} | self.parser.get_mon_data() \
+                                           | self.kafka_client.get_mon_data()
+
+    def restore_history(self):
+        # Stateless: the consumption restarts from the offsets committed by the group
+        self.logger.info("No history to restore, resuming from the committed offsets")
+
+    def send_event(self, event, timestamp_ms: int = None) -> None:
+        # The default partitioner hashes the key, as KafkaClient.partition_for_key.
+        # The event keeps the timestamp of its input record: the join window of
+        # the consumers follows the event time, also when catching up.
+        self.kafka_client.send(value=event.to_dict(), key=event.get_key(), timestamp_ms=timestamp_ms)
+        self.msg_sent += 1
+        if event.kind not in self.events_sent:
+            self.events_sent[event.kind] = EVENTS_SENT.labels(event.kind)
+        self.events_sent[event.kind].inc()
+
+    def commit(self):
+        # Parsed events must be delivered before committing their input offsets
+        self.kafka_client.checkpoint()
+        self.kafka_client.commit_offsets(self.kafka_client.get_positions())
+
+    def process_new_messages(self):
+        for batch in self.kafka_client.iter_batches():
+            for records in batch.values():
+                for message in records:
+                    self.debug_sampler.new_message()
+                    self.rec_orc_log += 1
+                    with PARSE_SECONDS.time():
+                        event = self.parser.parse(message.value)
+                    if event is not None:
+                        self.send_event(event, message.timestamp)
+            self.commit()
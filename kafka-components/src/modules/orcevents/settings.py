@@ -0,0 +1,169 @@
+from pydantic import Field, validator
+from pydantic_settings import BaseSettings
+import json
+from typing import Callable, Dict, Any
+
+
+class OrcEventsConfig(BaseSettings):
+    
+    APP_NAME: str = Field(default = "orc-events",
+                          env="APP_NAME",
+                          description="Name of the application")
+    LOG_DIR: str = Field(default = "./logs",
+                         env="APP_LOG_DIR",
+                         description="Directory for application logs")
+    LOG_LEVEL: str = Field(default = "DEBUG",
+                           env="LOG_LEVEL",
+                           description="Logging level (DEBUG, INFO, WARNING, ERROR)")
+    LOG_DEBUG_SAMPLING: int = Field(default = 1,
+                                    env="LOG_DEBUG_SAMPLING",
+                                    description="Keep the DEBUG output of one consumed message every N")
+    KAFKA_ACKS: str = Field(default = 'all',
+                            env="KAFKA_ACKS",
+                            description="Acknowledgment setting for Kafka producer")    
+    KAFKA_ALLOW_AUTO_CREATE_TOPICS: bool = Field(default = False,
+                                                  env="KAFKA_ALLOW_AUTO_CREATE_TOPICS",
+                                                  description="Allow auto creation of topics in Kafka")
+    KAFKA_AUTO_OFFSET_RESET: str = Field(default = 'earliest',
+                                          env="KAFKA_AUTO_OFFSET_RESET",
+                                          description="Auto offset reset policy for Kafka consumer")
+    KAFKA_BATCH_SIZE: int = Field(default = 16384,
+                                  env="KAFKA_BATCH_SIZE",
+                                  description="Maximum size, in bytes, of a batch of records for the Kafka producer")
+    KAFKA_BOOTSTRAP_SERVERS: str = Field(default = 'kafka-1:9095,kafka-2:9095,kafka-3:9095',
+                                          env="KAFKA_BOOTSTRAP_SERVERS",
+                                          description="Bootstrap servers for Kafka cluster")
+    KAFKA_CLIENT_ID: str = Field(default = "prod-orc-events",
+                                            env="KAFKA_CLIENT_ID",
+                                            description="Client ID for Kafka producer/consumer")
+    KAFKA_ENABLE_AUTO_COMMIT: bool = Field(default = False,
+                                            env="KAFKA_ENABLE_AUTO_COMMIT",
+                                            description="Enable auto commit for Kafka consumer")
+    KAFKA_ENABLE_IDEMPOTENCE: bool = Field(default = True,
+                                            env="KAFKA_ENABLE_IDEMPOTENCE",
+                                            description="Enable idempotence for Kafka producer")
+    KAFKA_FETCH_MAX_BYTES: int = Field(default = 104857600,
+                                        env="KAFKA_FETCH_MAX_BYTES",
+                                        description="Maximum bytes to fetch in a single request for Kafka consumer")
+    KAFKA_GROUP_ID_BASE : str = Field(default = "prod-orc-events-group-id",
+                                           env="KAFKA_GROUP_ID",
+                                           description="Consumer group ID for Kafka consumer")
+    KAFKA_INPUT_TOPICS: list[str] = Field(default = [],
+                                           env="KAFKA_INPUT_TOPICS",
+                                           description="List of input Kafka topics")
+    KAFKA_INPUT_TOPIC: str = Field(default = "orchestrator-logs",
+                                   env="KAFKA_INPUT_TOPIC",
+                                   description="Input topic of the raw orchestrator logs")
+    KAFKA_LINGER_MS: int = Field(default = 0,
+                                 env="KAFKA_LINGER_MS",
+                                 description="Time, in ms, the Kafka producer waits to fill a batch before sending it")
+    KAFKA_MAX_POLL_RECORDS: int = Field(default = 500,
+                                         env="KAFKA_MAX_POLL_RECORDS",
+                                         description="Maximum number of records to return in a single poll for Kafka consumer")
+    KAFKA_MAX_REQUEST_SIZE: int = Field(default = 104857600,
+                                         env="KAFKA_MAX_REQUEST_SIZE",
+                                         description="Maximum request size for Kafka producer")
+    KAFKA_OUTPUT_TOPIC: str = Field(default = "orchestrator-events",
+                                    env="KAFKA_OUTPUT_TOPIC",
+                                    description="Output Kafka topic for the parsed orchestrator events")
+    KAFKA_LOG_TOPIC: str = Field(default = "logs-proc-orc-events",
+                                 env="KAFKA_LOG_TOPIC",
+                                 description="Kafka topic for logging messages")    
+    KAFKA_LOG_QUEUE_SIZE: int = Field(default = 10000,
+                                      env="KAFKA_LOG_QUEUE_SIZE",
+                                      description="Maximum number of log records waiting to be sent to the log topic")
+    KAFKA_LOG_BATCH_SIZE: int = Field(default = 100,
+                                      env="KAFKA_LOG_BATCH_SIZE",
+                                      description="Maximum number of log records sent to the log topic at once")
+    KAFKA_LOG_BATCH_TIMEOUT_S: float = Field(default = 0.5,
+                                             env="KAFKA_LOG_BATCH_TIMEOUT_S",
+                                             description="Maximum time, in seconds, a log record waits for its batch")
+    KAFKA_POLL_TIMEOUT_MS: int = Field(default = 1000,
+                                       env="KAFKA_POLL_TIMEOUT_MS",
+                                       description="Timeout, in ms, of a single poll of the Kafka consumer")
+    KAFKA_SEND_MODE: str = Field(default = 'batch',
+                                 env="KAFKA_SEND_MODE",
+                                 description="Send mode: 'sync' flushes every message, 'batch' flushes on thresholds/checkpoints")
+    KAFKA_SEND_FLUSH_RECORDS: int = Field(default = 1000,
+                                          env="KAFKA_SEND_FLUSH_RECORDS",
+                                          description="In batch mode, number of pending records that triggers a flush")
+    KAFKA_SEND_FLUSH_INTERVAL_S: float = Field(default = 1.0,
+                                               env="KAFKA_SEND_FLUSH_INTERVAL_S",
+                                               description="In batch mode, maximum interval, in seconds, between two flushes")
+    KAFKA_SEND_MAX_RETRIES: int = Field(default = 3,
+                                        env="KAFKA_SEND_MAX_RETRIES",
+                                        description="In batch mode, maximum delivery attempts of a failed message")
+    KAFKA_STABLE_GROUP_ID: bool = Field(default = True,
+                                        env="KAFKA_STABLE_GROUP_ID",
+                                        description="Use the group ID as is, without random suffix, so committed offsets survive restarts")
+    KAFKA_SSL_CAFILE: str = Field(default = "./certs/ca_cert.pem",
+                                   env="KAFKA_SSL_CAFILE",
+                                   description="Path to the CA certificate file")
+    KAFKA_SSL_CERTFILE: str = Field(default = "./certs/proc_template_parser_cert_signed.pem",
+                                     env="KAFKA_SSL_CERTFILE",
+                                     description="Path to the SSL certificate file")
+    KAFKA_SSL_KEYFILE: str = Field(default = "./certs/proc_template_parser_key.pem",
+                                   env="KAFKA_SSL_KEYFILE",
+                                   description="Path to the SSL key file")
+    KAFKA_SSL_PASSWORD_PATH: str = Field(default = "./certs/proc_template_parser.password",
+                                         env="KAFKA_SSL_PASSWORD_PATH",
+                                         description="Path to the SSL password file")
+    KAFKA_VALUE_DESERIALIZER_STR: str = Field(default = 'string',
+                                           env="KAFKA_VALUE_DESERIALIZER",
+                                           description="Deserializer for Kafka message values")
+    KAFKA_VALUE_SERIALIZER_STR: str = Field(default = 'json',
+                                           env="KAFKA_VALUE_SERIALIZER",
+                                           description="Serializer for Kafka message values")
+    LOG_SEP: str = Field(default = "paas-orchestrator orchestrator/",
+                                     env="LOG_SEP",
+                                     description="Log separator used in the log parser")
+    MONITORING_ENABLED: bool = Field(default = True,
+                                     env="MONITORING_ENABLED",
+                                     description="Enable monitoring service")
+    MONITORING_PERIOD: int = Field(default = 600, # 10 minutes
+                                   env="MONITORING_PERIOD",
+                                   description="Monitoring period, in seconds")
+    METRICS_ENABLED: bool = Field(default = True,
+                                  env="METRICS_ENABLED",
+                                  description="Expose the metrics on a local HTTP endpoint")
+    METRICS_PORT: int = Field(default = 8000,
+                              env="METRICS_PORT",
+                              description="Port of the metrics HTTP endpoint")
+    
+    value_serializer: Callable = None
+    value_deserializer: Callable = None
+    
+    @validator("value_deserializer", pre=True, always=True)
+    def parse_kafka_value_deserializer(cls, v, values) -> Callable:
+        function_name = values.get('KAFKA_VALUE_DESERIALIZER_STR', 'json')
+        if function_name == 'json':
+            return lambda x: json.loads(x.decode('utf-8'))
+        elif function_name == 'string':
+            return lambda x: x.decode('utf-8')
+        else:
+            raise ValueError(f"Unsupported deserializer: {function_name}")
+    
+    @validator("value_serializer", pre=True, always=True)
+    def parse_kafka_value_serializer(cls, v, values) -> Callable:
+        function_name = values.get('KAFKA_VALUE_SERIALIZER_STR', 'json')
+        if function_name == 'json':
+            return lambda x: json.dumps(x, sort_keys=True).encode('utf-8')
+        elif function_name == 'string':
+            return lambda x: x.encode('utf-8')
+        else:
+            raise ValueError(f"Unsupported serializer: {function_name}")
+
+    def get_values(self) -> Dict[str, Any]:
+        settings_dict = {}
+        for key, value in self.model_dump().items():
+            key = key.lower()
+            if key.endswith('_str'):
+                continue
+            if key.startswith('kafka_'):
+                key = key.replace('kafka_', '')
+            settings_dict[key] = value
+        
+        settings_dict['input_topics'] = [settings_dict['input_topic']]
+        return settings_dict
+    
+    
\ No newline at end of file
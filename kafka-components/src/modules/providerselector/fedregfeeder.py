@@ -26,6 +26,12 @@ class FederationRegistryFeeder:
             self.MON_DATABASE_SIZE: len(self.data)
             }
         
+    def get_state(self) -> dict:
+        return {"data": self.data}
+    
+    def set_state(self, state: dict) -> None:
+        self.data = state["data"]
+        
     def are_keys_present(self, m):
         return all(key in m for key in self.PROVIDER_ID_KEYS)
     
@@ -1,17 +1,25 @@
 
-import threading
+import logging
 from sys import maxsize as sys_maxsize
-from time import sleep, time
+from time import time
 from modules.providerselector.fedregfeeder import FederationRegistryFeeder
 from modules.providerselector.rally import Rally 
 from modules.providerselector.settings import ProviderSelectorConfig
 from modules.utilities.kafka_client import KafkaClient
+from modules.utilities.logger import get_debug_sampler
+from modules.utilities.metrics import REGISTRY
+from modules.utilities.snapshot import Snapshot
 from modules.providerselector import conf as ipc
 import json
 
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Processing time per stage, in seconds", ["stage"])
+RALLY_SECONDS = STAGE_SECONDS.labels("rally")
+FEDREG_SECONDS = STAGE_SECONDS.labels("fedreg")
+TEMPLATE_SECONDS = STAGE_SECONDS.labels("valid_template")
+
 class ProviderSelectorProcessor:
     
-    def __init__(self, settings: ProviderSelectorConfig, logger = None):
+    def __init__(self, settings: ProviderSelectorConfig, logger = None, kafka_client: KafkaClient = None):
         self.rally_data = Rally(logger)
         self.fedreg_mon  = FederationRegistryFeeder(logger)
         self.logger = logger
@@ -22,58 +30,98 @@ class ProviderSelectorProcessor:
                                    self.settings.KAFKA_INPUT_FEDREG_TOPIC,
                                    self.settings.KAFKA_INPUT_VALTEMPL_TOPIC]
         self.RESTORE_TOPICS = [self.settings.KAFKA_INPUT_RALLY_TOPIC,
-                               self.settings.KAFKA_INPUT_FEDREG_TOPIC,
-                               self.settings.KAFKA_OUTPUT_TOPIC]
+                               self.settings.KAFKA_INPUT_FEDREG_TOPIC]
+        self.RESTORE_KEYS_TOPICS = [self.settings.KAFKA_OUTPUT_TOPIC]
         
-        self.kafka_client = KafkaClient(logger, **settings.get_values())
+        # An external client can be passed, e.g. by replay tools and tests
+        self.kafka_client = kafka_client if kafka_client is not None else \
+                            KafkaClient(logger, **settings.get_values())
+        self.snapshot = Snapshot(settings, logger)
+        self.debug_sampler = get_debug_sampler(logger)
         self.msg_sent = 0
         
-        if self.settings.MONITORING_ENABLED:
-            monitor_thread = threading.Thread(target=self.monitoring_task)
-            monitor_thread.daemon = True
-            monitor_thread.start()
-        
-    def monitoring_task(self):
-        while True:
-            mon = self.get_mon_data()
-            self.logger.info(f"Monitoring data: {mon}")
-            sleep(self.settings.MONITORING_PERIOD)
-        
+    def get_state(self) -> dict:
+        return {"rally": self.rally_data.get_state(),
+                "fedreg": self.fedreg_mon.get_state(),
+                "output_uuids": self.output_uuids}
+    
+    def set_state(self, state: dict) -> None:
+        self.rally_data.set_state(state["rally"])
+        self.fedreg_mon.set_state(state["fedreg"])
+        self.output_uuids = state["output_uuids"]
+    
+    def save_snapshot(self):
+        # Sent messages must be delivered before committing their input offsets
+        self.kafka_client.checkpoint()
+        offsets = self.kafka_client.get_positions()
+        self.snapshot.save(self.get_state(), offsets)
+        self.kafka_client.commit_offsets(offsets)
+    
+    def restore_snapshot(self) -> bool:
+        state, offsets = self.snapshot.load()
+        if state is None:
+            return False
+        self.set_state(state)
+        self.kafka_client.set_start_offsets(offsets)
+        mon = self.rally_data.get_mon_data() | self.fedreg_mon.get_mon_data()
+        self.logger.info(f"Restored state from snapshot: {len(self.output_uuids)} uuids sent, {mon}")
+        return True
+    
     def restore_history(self):
         self.logger.info("Start of initialization phase : Collecting message from output topic")
+        if self.restore_snapshot():
+            self.logger.info("End of initialization phase")
+            return
         start_time = time()
         self.logger.debug(f"Topics to collect messages: {self.RESTORE_TOPICS}")
-        collected_msgs = self.kafka_client.collect_all_msgs_from_topics(self.RESTORE_TOPICS)
+        collected_msgs = self.kafka_client.stream_msgs_from_topics(self.RESTORE_TOPICS,
+                                                                   self.restore_messages)
+        # Only the keys of the output topic are needed
+        self.logger.debug(f"Topics to collect keys: {self.RESTORE_KEYS_TOPICS}")
+        self.output_uuids = self.kafka_client.collect_keys_from_topics(self.RESTORE_KEYS_TOPICS)
         interval_s = round(time()-start_time,2)
-        tot_msg_num = sum([len(v) for v in collected_msgs.values()])
+        tot_msg_num = sum(collected_msgs.values())
         self.logger.debug(f"Collected {tot_msg_num} tot messages in {interval_s} s")
-        for topic, messages in collected_msgs.items():
-            self.logger.debug(f"Collected {len(messages)} from topic {topic}")    
-            
-            # Collect messages from the output topic and extract template uuids
-            if topic == self.settings.KAFKA_OUTPUT_TOPIC:
-                self.output_uuids = {message.key.decode('utf-8') for message in messages if message.key is not None and message.key != ''}
-                self.logger.debug(f"Imported {len(self.output_uuids)} messages from topic {self.settings.KAFKA_OUTPUT_TOPIC}")
-                self.logger.debug(f"{self.output_uuids=}")
-                
-            # Collect messages from rally topic and aggregate them
-            if topic == self.settings.KAFKA_INPUT_RALLY_TOPIC:
-                msgs = [ msg.value for msg in messages if isinstance(msg.value, dict) ]
-                self.rally_data.import_multiple_messages(msgs)
-                self.logger.debug(f"Imported {self.rally_data.size()} rally messages from topic {self.settings.KAFKA_INPUT_RALLY_TOPIC}")
-            
-            # Collect messages from federation registry feeder topic and aggregate them
-            if topic == self.settings.KAFKA_INPUT_FEDREG_TOPIC:
-                for msg in messages:
-                    self.fedreg_mon.update_providers_data(msg.value)
-                self.logger.debug(f"Imported {self.fedreg_mon.size()} project mondata from topic {self.settings.KAFKA_INPUT_FEDREG_TOPIC}")
+        for topic, n_messages in collected_msgs.items():
+            self.logger.debug(f"Collected {n_messages} from topic {topic}")    
+        self.logger.debug(f"Imported {len(self.output_uuids)} messages from topic {self.settings.KAFKA_OUTPUT_TOPIC}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{self.output_uuids=}")
+        self.logger.debug(f"Imported {self.rally_data.size()} rally messages from topic {self.settings.KAFKA_INPUT_RALLY_TOPIC}")
+        self.logger.debug(f"Imported {self.fedreg_mon.size()} project mondata from topic {self.settings.KAFKA_INPUT_FEDREG_TOPIC}")
 
         mon = self.rally_data.get_mon_data() | self.fedreg_mon.get_mon_data()
         self.logger.debug(f"Monitoring data: {mon}")
         self.logger.info("End of initialization phase")    
 
+    def restore_messages(self, topic: str, messages: list):
+        # Collect messages from rally topic and aggregate them
+        if topic == self.settings.KAFKA_INPUT_RALLY_TOPIC:
+            msgs = [ msg.value for msg in messages if isinstance(msg.value, dict) ]
+            if msgs:
+                self.import_rally_messages(msgs)
+        
+        # Collect messages from federation registry feeder topic and aggregate them
+        if topic == self.settings.KAFKA_INPUT_FEDREG_TOPIC:
+            for msg in messages:
+                self.fedreg_mon.update_providers_data(msg.value)
+
+    def import_rally_messages(self, msgs: list[dict]):
+        # The messages are merged at once. If the batch fails they are imported 
+        # one by one: only the invalid ones are dropped
+        try:
+            self.rally_data.import_multiple_messages(msgs)
+        except Exception as e:
+            self.logger.warning(f"Error importing {len(msgs)} rally messages, importing them one by one: {e}")
+            for msg in msgs:
+                try:
+                    self.rally_data.import_single_message(msg)
+                except Exception as e:
+                    self.logger.error(f"Error importing rally message: {e}. Message: {msg}")
+
     def get_mon_data(self) -> dict:
-        return self.rally_data.get_mon_data() | self.fedreg_mon.get_mon_data() | {"msg_sent": self.msg_sent}
+        return self.rally_data.get_mon_data() | self.fedreg_mon.get_mon_data() | {"msg_sent": self.msg_sent} \
+            | self.kafka_client.get_mon_data() | self.snapshot.get_mon_data()
     
     
     def import_size(self, str_value):
@@ -328,37 +376,61 @@ class ProviderSelectorProcessor:
             m[ipc.O_PROVIDERS_KEY].append(p_info)
         return m
 
+    def process_valid_template(self, val_templ: dict):
+        dep_data = self.extract_data_from_valid_template(val_templ)
+        dep_data = self.best_match_finder(dep_data)
+        n_found_projects = len(dep_data['providers'])
+        if n_found_projects < 1:
+            self.logger.warning(f"No found any available projects for the deployment with uuid: {dep_data['uuid']}")
+            return
+        
+        dep_data = self.remove_null(dep_data)
+        dep_data = self.compute_aggregated_resource(dep_data) 
+        msg = self.get_msg(dep_data)
+        
+        msg_uuid = msg['uuid']
+        if msg_uuid not in self.output_uuids:
+            self.kafka_client.send(msg)
+            self.logger.info(f"Template with uuid {msg_uuid} has been processed and sent successfully")
+            self.output_uuids.add(msg_uuid)
+            self.msg_sent += 1
+        else:
+            self.logger.info(f"Template with uuid {msg_uuid} already in the output topic")
+
     def process_new_messages(self):
-        for message in self.kafka_client.consumer:
-            try:
-                topic = str(message.topic)
-                if topic == self.settings.KAFKA_INPUT_RALLY_TOPIC:
-                    self.rally_data.import_single_message(message.value)
-                elif topic == self.settings.KAFKA_INPUT_FEDREG_TOPIC:
-                    self.fedreg_mon.update_providers_data(message.value)
-                elif topic == self.settings.KAFKA_INPUT_VALTEMPL_TOPIC:
-                    dep_data = self.extract_data_from_valid_template(message.value)
-                    dep_data = self.best_match_finder(dep_data)
-                    n_found_projects = len(dep_data['providers'])
-                    if n_found_projects < 1:
-                        self.logger.warning(f"No found any available projects for the deployment with uuid: {dep_data['uuid']}")
-                        continue
-                    
-                    dep_data = self.remove_null(dep_data)
-                    dep_data = self.compute_aggregated_resource(dep_data) 
-                    msg = self.get_msg(dep_data)
-                    
-                    msg_uuid = msg['uuid']
-                    if msg_uuid not in self.output_uuids:
-                        self.kafka_client.send(msg)
-                        self.logger.info(f"Template with uuid {msg_uuid} has been processed and sent successfully")
-                        self.output_uuids.add(msg_uuid)
-                        self.msg_sent += 1
-                    else:
-                        self.logger.info(f"Template with uuid {msg_uuid} already in the output topic")
-            except Exception as e:
-                self.logger.error(f"Error processing message from topic {topic}: {e}", exc_info=True)
-                self.logger.error(f"Message: {json.dumps(message.value, indent=2)}")
-                continue
-                    
-                    
\ No newline at end of file
+        for batch in self.kafka_client.iter_batches():
+            rally_msgs = []
+            templates = []
+            for records in batch.values():
+                for message in records:
+                    self.debug_sampler.new_message()
+                    topic = str(message.topic)
+                    if topic == self.settings.KAFKA_INPUT_RALLY_TOPIC:
+                        if isinstance(message.value, dict):
+                            rally_msgs.append(message.value)
+                    elif topic == self.settings.KAFKA_INPUT_FEDREG_TOPIC:
+                        try:
+                            with FEDREG_SECONDS.time():
+                                self.fedreg_mon.update_providers_data(message.value)
+                        except Exception as e:
+                            self.logger.error(f"Error processing message from topic {topic}: {e}", exc_info=True)
+                    elif topic == self.settings.KAFKA_INPUT_VALTEMPL_TOPIC:
+                        templates.append(message)
+            
+            # Rally results are merged in the dataframe once per batch,
+            # before matching the templates of the same batch
+            if rally_msgs:
+                with RALLY_SECONDS.time():
+                    self.import_rally_messages(rally_msgs)
+            
+            for message in templates:
+                try:
+                    with TEMPLATE_SECONDS.time():
+                        self.process_valid_template(message.value)
+                except Exception as e:
+                    self.logger.error(f"Error processing message from topic {message.topic}: {e}", exc_info=True)
+                    self.logger.error(f"Message: {json.dumps(message.value, indent=2)}")
+                    continue
+            
+            if self.snapshot.is_due():
+                self.save_snapshot()
@@ -33,9 +33,14 @@ class Rally:
             self.MON_DATASET_SIZE: self.df.shape[0]
             }
     
+    def get_state(self) -> dict:
+        return {"df": self.df}
+    
+    def set_state(self, state: dict) -> None:
+        self.df = state["df"]
+    
     def import_multiple_messages(self, messages: list):
         
-        self.received_messages += len(messages)
         # Create new dataframe from new message
         new_df = pd.DataFrame(messages).drop(self.MSG_VERSION, axis=1)
         
@@ -52,6 +57,8 @@ class Rally:
         
         # Drop duplicates
         self.df = self.df.drop_duplicates()
+        # Counted once imported: a failed batch is imported again message by message
+        self.received_messages += len(messages)
         
     def import_single_message(self, message: dict):
         
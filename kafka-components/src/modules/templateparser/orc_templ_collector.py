@@ -1,19 +1,45 @@
 import json
 import yaml
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from sys import exit
-import pytz
+from modules.utilities.metrics import REGISTRY
+from modules.utilities.orc_events import OrcEvent, OrcEventParser
+from modules.utilities.timestamps import LOCAL_TZ, parse_orc_ts, parse_syslog_ts
+from modules.utilities.prefilter import RawLinePrefilter
+from modules.templateparser.template_cache import TemplateCache
+
+ABANDONED_BUFFERS = REGISTRY.counter("template_buffers_abandoned_total",
+                                     "Template reassembly buffers dropped before the user parameters", ["reason"])
+DUPLICATES_SKIPPED = REGISTRY.counter("templates_duplicate_skipped_total",
+                                      "Templates of already published deployments, dropped before parsing")
+
+class TemplateBuffer:
+    """Template lines of a deployment, collected from the lines of one orchestrator thread"""
+    __slots__ = ('lines', 'collecting', 'last_ts')
+
+    def __init__(self, last_ts: datetime):
+        self.lines = []
+        self.collecting = True
+        self.last_ts = last_ts
 
 class LogOrchestratorCollector:
     """
     Class to manage the state of the log orchestrator.
     It provides methods to check if a line is the start of a template collection,
     if a line should be rejected, and to extract information from log lines.
+    The templates are reassembled in buffers keyed by orchestrator instance and
+    thread, so concurrent deployments do not mix their lines. The number of open buffers
+    is bounded, and buffers without new lines for a timeout are dropped.
     """
     
-    START_TEMPLATE_STRING = ": Creating deployment with template"
-    EVENT_TEMPLATE_SEP = " i.r.o.service.DeploymentServiceImpl      : "
-    EVENT_TEMPLATE_STRING = " i.r.o.service.DeploymentServiceImpl      : {"
+    START_TEMPLATE_STRING = OrcEventParser.START_TEMPLATE_STRING
+    EVENT_TEMPLATE_SEP = OrcEventParser.EVENT_TEMPLATE_SEP
+    EVENT_TEMPLATE_STRING = OrcEventParser.EVENT_TEMPLATE_STRING
+    # Kinds whose payload is the orchestrator message, the other lines only carry the timestamp
+    TEMPLATE_KINDS = frozenset([OrcEventParser.KIND_TEMPLATE_START,
+                                OrcEventParser.KIND_TEMPLATE_LINE,
+                                OrcEventParser.KIND_USER_PARAMETERS])
     
     INFO_TEMPLATE_STRING = "{\"uuid\""  # JSON string containing the UUID   
     # LOG_SEP = "]: "  # Separator for log lines 
@@ -22,18 +48,44 @@ class LogOrchestratorCollector:
     LOG_FILTER = " paas-orchestrator orchestrator/"  # Filter for log lines to reject
     
     LOG_INPUT_FORMAT = "%b %d %H:%M:%S %Y"
-    LOG_LOCAL_TIMEZONE = pytz.timezone("Europe/Rome")
+    LOG_LOCAL_TIMEZONE = LOCAL_TZ
     LOG_SEP_DEFAULT = 'paas-orchestrator orchestrator/'
     LOG_SEP_KEY = "log_sep"
     KEY_TIMESTAMP = 'timestamp'
+    KEY_UUID = 'uuid'
+    TEMPLATE_CACHE_SIZE_KEY = "template_cache_size"
+    TEMPLATE_CACHE_SIZE_DEFAULT = 128
+    MAX_BUFFERS_KEY = "template_max_buffers"
+    MAX_BUFFERS_DEFAULT = 64
+    BUFFER_TIMEOUT_KEY = "template_buffer_timeout_s"
+    BUFFER_TIMEOUT_DEFAULT = 600
+    
+    # Reasons of the abandoned buffers
+    ABANDONED_RESTARTED = 'restarted'
+    ABANDONED_OVERFLOW = 'overflow'
+    ABANDONED_TIMEOUT = 'timeout'
     
     def __init__(self, settings, logger):
-        self.collect = False  # Flag to indicate if template collection is in progress
-        self.str_template = []  # List to collect template lines
         self.logger = logger  # Logger instance for logging messages
-        self.collect_template = False  # Flag to indicate if template collection is in progress
-        self.str_template = []
-        self.received_user_parameters = False  # Flag to indicate if user parameters have been received
+        # Template buffers by (source, thread) of the orchestrator lines, the least recently updated first
+        self.buffers = OrderedDict()
+        self.max_buffers = settings.get(self.MAX_BUFFERS_KEY, self.MAX_BUFFERS_DEFAULT)
+        self.buffer_timeout = timedelta(seconds=settings.get(self.BUFFER_TIMEOUT_KEY, self.BUFFER_TIMEOUT_DEFAULT))
+        self.template = None
+        self.depl_data = None
+        # Called with the uuid of each deployment: True if its template is already
+        # published, the template is then dropped without parsing it
+        self.is_duplicate = None
+        # False when the templates are parsed elsewhere, e.g. by a TemplateParsePool:
+        # str_template then holds the lines of the completed template
+        self.parse_templates = True
+        self.str_template = None
+        
+        # Monitoring metrics
+        self.duplicates_skipped = 0
+        self.abandoned_buffers = {reason: 0 for reason in (self.ABANDONED_RESTARTED,
+                                                           self.ABANDONED_OVERFLOW,
+                                                           self.ABANDONED_TIMEOUT)}
         
         if hasattr(settings, self.LOG_SEP_KEY):
             self.LOG_SEP = settings.LOG_SEP
@@ -41,6 +93,79 @@ class LogOrchestratorCollector:
             self.LOG_SEP = self.LOG_SEP_DEFAULT
         self.LOG_FILTER = self.LOG_SEP
         self.logger.info(f"Using log separator: {self.LOG_SEP}")
+        # Template lines carry no marker, only the log separator can be checked
+        self.prefilter = RawLinePrefilter("orc_templ_collector", required=[self.LOG_SEP])
+        self.parser = OrcEventParser({OrcEventParser.LOG_SEP_KEY: self.LOG_SEP}, logger, prefilter=self.prefilter)
+        # A few templates account for most deployments: parse each one once
+        self.template_cache = TemplateCache(settings.get(self.TEMPLATE_CACHE_SIZE_KEY, self.TEMPLATE_CACHE_SIZE_DEFAULT),
+                                            logger)
+    
+    def get_state(self) -> dict:
+        """
+        Get the template collection state, to be stored in a snapshot.
+        
+        Returns:
+            dict: The state of the finite state machine.
+        """
+        return {"buffers": self.buffers,
+                "last_threads": self.parser.last_threads}
+    
+    def set_state(self, state: dict) -> None:
+        """
+        Restore the template collection state from a snapshot.
+        
+        Args:
+            state (dict): The state returned by get_state.
+        """
+        self.buffers = state["buffers"]
+        self.parser.last_threads = state["last_threads"]
+    
+    def get_mon_data(self) -> dict:
+        """
+        Get the template reassembly metrics.
+        
+        Returns:
+            dict: Open buffers and abandoned buffers by reason.
+        """
+        return {"template_buffers_open": len(self.buffers),
+                "templates_duplicate_skipped": self.duplicates_skipped} | \
+               {f"template_buffers_{reason}": count for reason, count in self.abandoned_buffers.items()} | \
+               self.template_cache.get_mon_data()
+    
+    def abandon_buffer(self, key: tuple, reason: str) -> None:
+        self.abandoned_buffers[reason] += 1
+        ABANDONED_BUFFERS.labels(reason).inc()
+        self.logger.debug(f"Template buffer of {key} abandoned: {reason}")
+    
+    def start_buffer(self, key: tuple, ts: datetime) -> None:
+        """
+        Open a new template buffer for an orchestrator thread.
+        
+        Args:
+            key (tuple): The source and thread of the orchestrator line.
+            ts (datetime): The timestamp of the line starting the template.
+        """
+        if self.buffers.pop(key, None) is not None:
+            # Not received user parameters in the last template of the thread
+            self.abandon_buffer(key, self.ABANDONED_RESTARTED)
+        self.buffers[key] = TemplateBuffer(ts)
+        if len(self.buffers) > self.max_buffers:
+            old_key, _ = self.buffers.popitem(last=False)
+            self.abandon_buffer(old_key, self.ABANDONED_OVERFLOW)
+    
+    def evict_expired(self, ts: datetime) -> None:
+        """
+        Drop the buffers not updated since the timeout before ts.
+        
+        Args:
+            ts (datetime): The timestamp of the current line.
+        """
+        while self.buffers:
+            key, buffer = next(iter(self.buffers.items()))
+            if ts - buffer.last_ts <= self.buffer_timeout:
+                break
+            del self.buffers[key]
+            self.abandon_buffer(key, self.ABANDONED_TIMEOUT)
     
     # Parse timestamp
     def extract_timestamp(self, line) -> tuple[datetime, datetime]:
@@ -64,10 +189,10 @@ class LogOrchestratorCollector:
         if not line.split(self.LOG_SEP)[1]:
             self.logger.error(f"Line does not contain a valid log message: {line}")
             return None, None
-        syslog_ts = datetime.strptime(line.split()[0], self.SYSLOG_TS_FORMAT)
+        syslog_ts = parse_syslog_ts(line.split(maxsplit=1)[0])
         try:
-            orc_ts_str = " ".join(line.split(self.LOG_SEP)[1].split()[0:2])
-            orc_ts = datetime.strptime(orc_ts_str, self.TS_FORMAT)
+            orc_ts_str = " ".join(line.split(self.LOG_SEP)[1].split(maxsplit=2)[0:2])
+            orc_ts = parse_orc_ts(orc_ts_str)
         except (ValueError, IndexError):
             orc_ts = None
         return syslog_ts, orc_ts
@@ -86,19 +211,6 @@ class LogOrchestratorCollector:
             return False
         return ts and self.START_TEMPLATE_STRING in line
 
-    def is_line_to_reject(self, line) -> bool:
-        """ 
-        Checks if the line should be rejected based on specific criteria.
-        Args:
-            line (str): The log line to check.  
-        Returns:
-            bool: True if the line should be rejected, False otherwise.
-        """
-        if not isinstance(line, str):
-            self.logger.error("Line is not a valid string.")
-            return True
-        return self.LOG_FILTER not in line
-
     def is_user_parameter_line(self, line):
         """
         Checks if the line contains user parameters and metadata.
@@ -112,32 +224,6 @@ class LogOrchestratorCollector:
             return False
         return self.EVENT_TEMPLATE_STRING in line
 
-    def extract_info(self, line) -> tuple [datetime, datetime, str]:
-        """
-        Extracts the syslog timestamp, ORC timestamp, and the log message from a log line.      
-        Args:
-            line (str): The log line to parse.
-        Returns:
-            tuple: A tuple containing the syslog timestamp, ORC timestamp, and the log message.
-                   Returns (None, None, None) if the line is invalid or does not contain timestamps.
-        """
-        if not line:
-            self.logger.error("Line is empty or None.")
-            return None, None, None
-        if isinstance(line, str) and not line.strip():
-            self.logger.error("Line is an empty string.")
-            return None, None, None
-        syslog_ts = datetime.strptime(line.split()[0], self.SYSLOG_TS_FORMAT)
-        pre_line = " ".join(line.split()[:3]) + " "
-        line = line.split(pre_line)[1]
-        try:
-            orc_ts_str = " ".join(line.split()[0:2])
-            orc_ts = datetime.strptime(orc_ts_str, self.TS_FORMAT)
-        except (ValueError, IndexError):
-            orc_ts = None
-            
-        return syslog_ts, orc_ts, line
-    
     # Extract user parameter from json
     def extract_user_parameters(self, line: str) -> dict | None:
         """
@@ -167,7 +253,6 @@ class LogOrchestratorCollector:
             return None
         
         str_json = line.split(self.EVENT_TEMPLATE_SEP)[1]
-        self.received_user_parameters = True
         try:
             return json.loads(str_json)
         except Exception as e:
@@ -176,119 +261,126 @@ class LogOrchestratorCollector:
             return None
     
     # Validate YAML
-    def import_template(self) -> dict | None:
+    def import_template(self, str_template: list[str]) -> dict | None:
         """
         Import the template from the collected log lines.
 
+        Args:
+            str_template (list[str]): The template lines.
+
         Returns:
             dict | None: Returns the parsed template as a dictionary if successful, None otherwise.
+                         The nested objects are shared with the template cache.
         """
         try:
-            template = yaml.safe_load("\n".join(self.str_template))
+            template = self.template_cache.load("\n".join(str_template))
         except yaml.YAMLError as e:
-            self.logger.debug(f"{json.dumps(self.str_template, indent=2, sort_keys=True)}")
+            self.logger.debug(f"{json.dumps(str_template, indent=2, sort_keys=True)}")
             self.logger.error(f"Error importing template. YAML Error: {e}")
             return None
         except Exception as e:
-            self.logger.debug(f"{json.dumps(self.str_template, indent=2, sort_keys=True)}")
+            self.logger.debug(f"{json.dumps(str_template, indent=2, sort_keys=True)}")
             self.logger.error(f"Error importing template. Generic Error: {e}")
             return None
-        else:
-            template['is_automatic'] = "policies" not in template['topology_template'] 
-            return template
+        if not isinstance(template, dict) or not isinstance(template.get('topology_template'), dict):
+            # e.g. an empty buffer: the template lines were not received
+            self.logger.debug(f"{json.dumps(str_template, indent=2, sort_keys=True)}")
+            self.logger.error("Error importing template. No topology_template in the template.")
+            return None
+        return template | {'is_automatic': "policies" not in template['topology_template']}
     
-    def convert_message(self, log) -> str:
+    def import_line(self, line: str) -> bool:
         """
-        Convert a log message to a standardized format.
+        Import a raw orchestrator-logs record.
+        
         Args:
-            log (str): The log message to convert.
+            line (str): Log line to process.
+        
         Returns:
-            str: The converted log message in ISO 8601 format.
+            bool: True if a template is completed, False otherwise
         """
-        current_year = datetime.now().year
-        log_timestamp_str = ' '.join(log.split()[0:3])
-        log_value = self.LOG_SEP + log.split(self.LOG_SEP)[1]
-        full_timestamp_str = f"{log_timestamp_str} {current_year}"
-        dt_object = datetime.strptime(full_timestamp_str, self.LOG_INPUT_FORMAT)
-        localized_dt_object = self.LOG_LOCAL_TIMEZONE.localize(dt_object, is_dst=None)
-        utc_dt_object = localized_dt_object.astimezone(pytz.utc)
-        iso_format = utc_dt_object.strftime(self.SYSLOG_TS_FORMAT)
-        new_log_format = f"{iso_format[:-2]}:{iso_format[-2:]} {log_value}"
-        return new_log_format
-
-    def import_line(self, line: str) -> bool:
+        event = self.parser.parse(line)
+        if event is None:
+            return False
+        return self.import_event(event)
+    
+    def import_event_record(self, value) -> bool:
         """
-        Finite state machine to process log lines and manage template collection.
+        Import a record of the orchestrator events topic.
         
         Args:
-            line (str): Log line to process.
+            value (str | dict): The serialized OrcEvent.
         
         Returns:
-            bool: True if the line is processed successfully, False if it is not completed yet
+            bool: True if a template is completed, False otherwise
         """
-        
         try:
-            message = json.loads(line)['message']
-        except json.JSONDecodeError:
-            self.logger.error(f"Line is not a valid JSON message: {line}")
-            return False   
-        except KeyError:
-            self.logger.error(f"Line does not contain 'message' key: {line}")
-            return False
+            event = OrcEvent.from_json(value)
         except Exception as e:
-            self.logger.error(f"Unexpected error while processing line: {line}")
+            self.logger.error(f"Invalid event record: {value}")
             self.logger.error(f"Error: {e}")
             return False
+        return self.import_event(event)
+    
+    def import_event(self, event: OrcEvent) -> bool:
+        """
+        Finite state machine to process log lines and manage template collection.
         
-        try:
-            line = self.convert_message(message)
-        except Exception as e:
-            self.logger.error(f"Error converting log line: {message}")
-            self.logger.error(f"Error: {e}")
-            return False
+        Args:
+            event (OrcEvent): Orchestrator log line to process.
         
-        if self.is_line_to_reject(line): 
-            self.logger.debug("Messages rejected")
-            return False
-
-        _ , ts, orc_log = self.extract_info(line)
+        Returns:
+            bool: True if the line is processed successfully, False if it is not completed yet
+                  or the template is already published
+        """
+        ts = event.orc_ts
+        orc_log = event.payload if event.kind in self.TEMPLATE_KINDS else ""
+        key = event.get_stream()
+        if ts:
+            self.evict_expired(ts)
         
         if self.is_start_to_collect(ts, orc_log):
-            if not self.received_user_parameters:
-                self.logger.debug("Not received user parameters in the last template")
-            else:
-                self.received_user_parameters = False
-
-            self.collect_template = True
+            self.start_buffer(key, ts)
             self.logger.debug("Reset State and Start of template collection")
-            self.str_template = []
-            self.template = None
-            self.depl_data = None
             return False
         
-        if ts and self.collect_template:
-            self.collect_template = False
-        
-        if not ts and self.collect_template:
-            self.str_template.append(orc_log) 
+        buffer = self.buffers.get(key)
+        if buffer is not None and buffer.collecting:
+            if ts:
+                buffer.collecting = False
+            else:
+                buffer.lines.append(orc_log)
+                self.buffers.move_to_end(key)
         
         if self.is_user_parameter_line(orc_log):
-            self.received_user_parameters = True
-           
-            self.depl_data = self.extract_user_parameters(line)
+            self.template = None
+            self.str_template = None
+            self.depl_data = self.extract_user_parameters(orc_log)
             if self.depl_data:
                 self.depl_data[self.KEY_TIMESTAMP] = ts.strftime(self.TS_FORMAT)
             else:
                 msg = "Error during the extraction of user parameters from the log line."
                 self.logger.error(msg)
-                self.logger.debug(f"Collected template lines: {line}")
+                self.logger.debug(f"Collected template lines: {orc_log}")
                 exit(0)
             
-            self.template = self.import_template()
+            buffer = self.buffers.pop(key, None)
+            if self.is_duplicate is not None and self.is_duplicate(self.depl_data.get(self.KEY_UUID)):
+                self.duplicates_skipped += 1
+                DUPLICATES_SKIPPED.inc()
+                self.logger.debug(f"Template of {self.depl_data.get(self.KEY_UUID)} already published, not parsed")
+                return False
+            if buffer is None:
+                self.logger.error(f"No template collected on {key} before the user parameters.")
+                return True
+            self.str_template = buffer.lines
+            if not self.parse_templates:
+                return True
+            self.template = self.import_template(buffer.lines)
             if not self.template:
                 msg = "Error during the import of the template from the log line."
                 self.logger.error(msg)
-                self.logger.debug(f"Collected template lines: {self.str_template}")
+                self.logger.debug(f"Collected template lines: {buffer.lines}")
             return True
         return False
     
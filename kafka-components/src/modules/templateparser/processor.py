@@ -0,0 +1,169 @@
+from time import time
+from modules.templateparser.orc_templ_collector import LogOrchestratorCollector
+from modules.templateparser.parse_pool import TemplateParsePool
+from modules.templateparser.settings import TemplateParserConfig
+from modules.templateparser.templ_parser_message import TemplateParserMessage
+from modules.utilities.kafka_client import KafkaClient
+from modules.utilities.logger import get_debug_sampler
+from modules.utilities.metrics import REGISTRY
+from modules.utilities.snapshot import Snapshot
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Processing time per stage, in seconds", ["stage"])
+ORC_LOG_SECONDS = STAGE_SECONDS.labels("orc_log")
+TEMPLATE_SECONDS = STAGE_SECONDS.labels("template_parse")
+
+class TemplateParserProcessor:
+    """
+    Reassembly of the deployment templates from the orchestrator logs, or from
+    the orchestrator-events topic, and validation of the templates sent to the
+    validated-templates topic, once per deployment uuid.
+    """
+
+    def __init__(self, settings: TemplateParserConfig, logger = None, kafka_client: KafkaClient = None):
+        self.logger = logger
+        self.settings = settings
+
+        # An external client can be passed, e.g. by replay tools and benchmarks
+        self.kafka_client = kafka_client if kafka_client is not None else \
+                            KafkaClient(logger, **settings.get_values())
+        self.orc_templ_collector = LogOrchestratorCollector(settings.get_values(), logger)
+        self.snapshot = Snapshot(settings, logger)
+        self.debug_sampler = get_debug_sampler(logger)
+        # Orchestrator lines parsed by the orc-events stage, or raw lines parsed here
+        if self.settings.ORC_EVENTS_ENABLED:
+            self.import_orc_record = self.orc_templ_collector.import_event_record
+        else:
+            self.import_orc_record = self.orc_templ_collector.import_line
+        # Templates parsed and validated by a process pool, or on the consumer thread
+        if self.settings.TEMPLATE_PARSE_WORKERS > 0:
+            self.parse_pool = TemplateParsePool(settings, logger)
+            self.orc_templ_collector.parse_templates = False
+        else:
+            self.parse_pool = None
+        # Templates already in the output topic are dropped by the collector before parsing
+        self.orc_templ_collector.is_duplicate = self.is_duplicate
+
+        # Internal variables
+        self.validated_templates_uuids = set()
+
+        # Monitoring metrics
+        self.rec_orc_log = 0
+        self.templ_parsed = 0
+        self.msg_sent = 0
+
+    def get_mon_data(self) -> dict:
+        return {"rec_orc_log": self.rec_orc_log,
+                "templ_parsed": self.templ_parsed,
+                "msg_sent": self.msg_sent,
+                "rejected_lines": self.orc_templ_collector.prefilter.rejected.value} | self.kafka_client.get_mon_data() \
+                                                                                   | self.snapshot.get_mon_data() \
+                                                                                   | self.orc_templ_collector.get_mon_data() \
+                                                                                   | (self.parse_pool.get_mon_data() if self.parse_pool else {})
+
+    def get_state(self) -> dict:
+        return {"validated_templates_uuids": self.validated_templates_uuids,
+                "orc_templ_collector": self.orc_templ_collector.get_state()}
+
+    def set_state(self, state: dict) -> None:
+        self.validated_templates_uuids = state["validated_templates_uuids"]
+        self.orc_templ_collector.set_state(state["orc_templ_collector"])
+
+    def is_duplicate(self, uuid: str) -> bool:
+        return uuid in self.validated_templates_uuids
+
+    def save_snapshot(self):
+        # Templates still in the parse pool must be sent before saving their offsets
+        self.flush_parse_pool(wait=True)
+        # Sent messages must be delivered before committing their input offsets
+        self.kafka_client.checkpoint()
+        offsets = self.kafka_client.get_positions()
+        self.snapshot.save(self.get_state(), offsets)
+        self.kafka_client.commit_offsets(offsets)
+
+    def restore_snapshot(self) -> bool:
+        state, offsets = self.snapshot.load()
+        if state is None:
+            return False
+        self.set_state(state)
+        self.kafka_client.set_start_offsets(offsets)
+        self.logger.info(f"Restored state from snapshot: {len(self.validated_templates_uuids)} templates sent")
+        return True
+
+    def restore_history(self):
+        self.logger.info("Start of initialization phase: Collecting message from output topic")
+        if self.restore_snapshot():
+            self.logger.info("End of initialization phase")
+            return
+        # No state restored: the templates in flight are rebuilt from the whole input
+        self.kafka_client.set_start_from_beginning()
+        start_time = time()
+        # Only the keys of the output topic are needed
+        self.validated_templates_uuids = self.kafka_client.collect_keys_from_topics(self.settings.KAFKA_OUTPUT_TOPIC)
+        interval_s = round(time()-start_time,2)
+        self.logger.debug(f"Collected keys from topic {self.settings.KAFKA_OUTPUT_TOPIC}, in {interval_s} s")
+        self.logger.info(f"Imported {len(self.validated_templates_uuids)} validated template(s)")
+        self.logger.info("End of initialization phase")
+
+    def send_template(self, template: dict):
+        self.templ_parsed += 1
+        validated_template_uuid = template.get(TemplateParserMessage.TEMPL_UUID, None)
+        self.logger.debug("Collected the uuid of the current template: %s", validated_template_uuid)
+        if validated_template_uuid not in self.validated_templates_uuids:
+            self.kafka_client.send(template)
+            self.validated_templates_uuids.add(validated_template_uuid)
+            self.msg_sent += 1
+        else:
+            self.logger.debug("Message not sent, template already present in the output topic")
+        self.logger.debug("-------------------------------------------------------------------------------")
+
+    def flush_parse_pool(self, wait: bool = False):
+        if self.parse_pool is None:
+            return
+        templates = self.parse_pool.drain() if wait else self.parse_pool.ready()
+        for template in templates:
+            self.send_template(template)
+
+    def process_record(self, value):
+        """
+        Import a record of the input topic, and send its template when completed.
+        Args:
+            value: The orchestrator-logs record, or the serialized OrcEvent.
+        """
+        self.debug_sampler.new_message()
+        self.rec_orc_log += 1
+        with ORC_LOG_SECONDS.time():
+            completed = self.import_orc_record(value)
+        if not completed:
+            return
+        if self.parse_pool is not None:
+            if self.orc_templ_collector.str_template is not None:
+                for template in self.parse_pool.submit(self.orc_templ_collector.str_template,
+                                                       self.orc_templ_collector.depl_data):
+                    self.send_template(template)
+            return
+        enriched_template = self.orc_templ_collector.get_template_and_user_parameters()
+        if enriched_template:
+            with TEMPLATE_SECONDS.time():
+                validated_template = TemplateParserMessage(enriched_template, self.logger)
+            self.send_template(validated_template.get_dict())
+
+    def process_batch(self, values: list):
+        """
+        Import a batch of input records, e.g. replayed from a dump.
+        The templates still in the parse pool are sent by flush_parse_pool.
+        """
+        for value in values:
+            self.process_record(value)
+        # Templates completed by the parse pool meanwhile
+        self.flush_parse_pool()
+
+    def process_new_messages(self):
+        self.logger.info(f"Starting to consume messages from {self.kafka_client.input_topics} topic")
+        for batch in self.kafka_client.iter_batches():
+            for records in batch.values():
+                self.process_batch([message.value for message in records])
+            # Templates completed by the parse pool while waiting for new messages
+            self.flush_parse_pool()
+
+            if self.snapshot.is_due():
+                self.save_snapshot()
@@ -12,6 +12,12 @@ class TemplateParserConfig(BaseSettings):
     LOG_DIR: str = Field(default = "./logs",
                          env="APP_LOG_DIR",
                          description="Directory for application logs")
+    LOG_LEVEL: str = Field(default = "DEBUG",
+                           env="LOG_LEVEL",
+                           description="Logging level (DEBUG, INFO, WARNING, ERROR)")
+    LOG_DEBUG_SAMPLING: int = Field(default = 1,
+                                    env="LOG_DEBUG_SAMPLING",
+                                    description="Keep the DEBUG output of one consumed message every N")
     KAFKA_ACKS: str = Field(default = 'all',
                             env="KAFKA_ACKS",
                             description="Acknowledgment setting for Kafka producer")    
@@ -21,6 +27,9 @@ class TemplateParserConfig(BaseSettings):
     KAFKA_AUTO_OFFSET_RESET: str = Field(default = 'earliest',
                                           env="KAFKA_AUTO_OFFSET_RESET",
                                           description="Auto offset reset policy for Kafka consumer")
+    KAFKA_BATCH_SIZE: int = Field(default = 16384,
+                                  env="KAFKA_BATCH_SIZE",
+                                  description="Maximum size, in bytes, of a batch of records for the Kafka producer")
     KAFKA_BOOTSTRAP_SERVERS: str = Field(default = 'kafka-1:9095,kafka-2:9095,kafka-3:9095',
                                           env="KAFKA_BOOTSTRAP_SERVERS",
                                           description="Bootstrap servers for Kafka cluster")
@@ -45,7 +54,13 @@ class TemplateParserConfig(BaseSettings):
     KAFKA_INPUT_TOPIC: str = Field(default = "orchestrator-logs",
                                    env="KAFKA_INPUT_TOPIC",
                                    description="List of input Kafka topics")
-    KAFKA_MAX_POLL_RECORDS: int = Field(default = 1,
+    KAFKA_INPUT_ORC_EVENTS_TOPIC: str = Field(default = "orchestrator-events",
+                                              env="KAFKA_INPUT_ORC_EVENTS_TOPIC",
+                                              description="Topic of the parsed orchestrator events, read when ORC_EVENTS_ENABLED")
+    KAFKA_LINGER_MS: int = Field(default = 0,
+                                 env="KAFKA_LINGER_MS",
+                                 description="Time, in ms, the Kafka producer waits to fill a batch before sending it")
+    KAFKA_MAX_POLL_RECORDS: int = Field(default = 500,
                                          env="KAFKA_MAX_POLL_RECORDS",
                                          description="Maximum number of records to return in a single poll for Kafka consumer")
     KAFKA_MAX_REQUEST_SIZE: int = Field(default = 104857600,
@@ -57,6 +72,33 @@ class TemplateParserConfig(BaseSettings):
     KAFKA_LOG_TOPIC: str = Field(default = "logs-proc-template-parser",
                                  env="KAFKA_LOG_TOPIC",
                                  description="Kafka topic for logging messages")    
+    KAFKA_LOG_QUEUE_SIZE: int = Field(default = 10000,
+                                      env="KAFKA_LOG_QUEUE_SIZE",
+                                      description="Maximum number of log records waiting to be sent to the log topic")
+    KAFKA_LOG_BATCH_SIZE: int = Field(default = 100,
+                                      env="KAFKA_LOG_BATCH_SIZE",
+                                      description="Maximum number of log records sent to the log topic at once")
+    KAFKA_LOG_BATCH_TIMEOUT_S: float = Field(default = 0.5,
+                                             env="KAFKA_LOG_BATCH_TIMEOUT_S",
+                                             description="Maximum time, in seconds, a log record waits for its batch")
+    KAFKA_POLL_TIMEOUT_MS: int = Field(default = 1000,
+                                       env="KAFKA_POLL_TIMEOUT_MS",
+                                       description="Timeout, in ms, of a single poll of the Kafka consumer")
+    KAFKA_SEND_MODE: str = Field(default = 'sync',
+                                 env="KAFKA_SEND_MODE",
+                                 description="Send mode: 'sync' flushes every message, 'batch' flushes on thresholds/checkpoints")
+    KAFKA_SEND_FLUSH_RECORDS: int = Field(default = 1000,
+                                          env="KAFKA_SEND_FLUSH_RECORDS",
+                                          description="In batch mode, number of pending records that triggers a flush")
+    KAFKA_SEND_FLUSH_INTERVAL_S: float = Field(default = 1.0,
+                                               env="KAFKA_SEND_FLUSH_INTERVAL_S",
+                                               description="In batch mode, maximum interval, in seconds, between two flushes")
+    KAFKA_SEND_MAX_RETRIES: int = Field(default = 3,
+                                        env="KAFKA_SEND_MAX_RETRIES",
+                                        description="In batch mode, maximum delivery attempts of a failed message")
+    KAFKA_STABLE_GROUP_ID: bool = Field(default = False,
+                                        env="KAFKA_STABLE_GROUP_ID",
+                                        description="Use the group ID as is, without random suffix, so committed offsets survive restarts")
     KAFKA_SSL_CAFILE: str = Field(default = "./certs/ca_cert.pem",
                                    env="KAFKA_SSL_CAFILE",
                                    description="Path to the CA certificate file")
@@ -78,6 +120,45 @@ class TemplateParserConfig(BaseSettings):
     LOG_SEP: str = Field(default = "paas-orchestrator orchestrator/",
                                      env="LOG_SEP",
                                      description="Log separator used in the log parser")
+    ORC_EVENTS_ENABLED: bool = Field(default = False,
+                                     env="ORC_EVENTS_ENABLED",
+                                     description="Consume the events parsed by the orc-events stage instead of the raw orchestrator logs")
+    MONITORING_ENABLED: bool = Field(default = True,
+                                     env="MONITORING_ENABLED",
+                                     description="Enable monitoring service")
+    MONITORING_PERIOD: int = Field(default = 600, # 10 minutes
+                                   env="MONITORING_PERIOD",
+                                   description="Monitoring period, in seconds")
+    METRICS_ENABLED: bool = Field(default = True,
+                                  env="METRICS_ENABLED",
+                                  description="Expose the metrics on a local HTTP endpoint")
+    METRICS_PORT: int = Field(default = 8000,
+                              env="METRICS_PORT",
+                              description="Port of the metrics HTTP endpoint")
+    TEMPLATE_CACHE_SIZE: int = Field(default = 128,
+                                     env="TEMPLATE_CACHE_SIZE",
+                                     description="Parsed templates kept in the cache, 0 to disable it")
+    TEMPLATE_MAX_BUFFERS: int = Field(default = 64,
+                                      env="TEMPLATE_MAX_BUFFERS",
+                                      description="Templates reassembled at the same time, one per orchestrator thread")
+    TEMPLATE_BUFFER_TIMEOUT_S: int = Field(default = 600,
+                                           env="TEMPLATE_BUFFER_TIMEOUT_S",
+                                           description="Seconds of orchestrator time after which an incomplete template is dropped")
+    TEMPLATE_PARSE_WORKERS: int = Field(default = 0,
+                                        env="TEMPLATE_PARSE_WORKERS",
+                                        description="Worker processes parsing and validating the templates, 0 to parse them on the consumer thread")
+    TEMPLATE_PARSE_MAX_INFLIGHT: int = Field(default = 16,
+                                             env="TEMPLATE_PARSE_MAX_INFLIGHT",
+                                             description="Templates submitted to the parse workers and not sent yet")
+    SNAPSHOT_ENABLED: bool = Field(default = False,
+                                   env="SNAPSHOT_ENABLED",
+                                   description="Enable periodic snapshots of the processor state")
+    SNAPSHOT_DIR: str = Field(default = "./snapshots",
+                              env="SNAPSHOT_DIR",
+                              description="Directory for the processor state snapshots")
+    SNAPSHOT_PERIOD: int = Field(default = 60,
+                                 env="SNAPSHOT_PERIOD",
+                                 description="Snapshot period, in seconds")
     
     value_serializer: Callable = None
     value_deserializer: Callable = None
@@ -112,7 +193,10 @@ class TemplateParserConfig(BaseSettings):
                 key = key.replace('kafka_', '')
             settings_dict[key] = value
         
-        settings_dict['input_topics'] = [settings_dict['input_topic']]
+        if settings_dict['orc_events_enabled']:
+            settings_dict['input_topics'] = [settings_dict['input_orc_events_topic']]
+        else:
+            settings_dict['input_topics'] = [settings_dict['input_topic']]
         return settings_dict
     
     
\ No newline at end of file
@@ -85,18 +85,26 @@ class TemplateParserMessage:
         """
         return self.template.get(self.TEMPL_UUID, None)
     
-    def _find_get_input(self, var):
+    def _resolve_get_input(self, var):
+        # Returns var with the get_input references replaced, without modifying it:
+        # only the containers on the path of a reference are copied
         if isinstance(var, dict):
+            resolved = None
             for k,v in var.items():
                 if isinstance(v,dict) and self.TEMPL_GET_INPUT in v:
                     input_var = v[self.TEMPL_GET_INPUT]
-                    input_value = self.template[self.TEMPL_TOPOLOGY_TEMPL][self.TEMLP_INPUTS][input_var]
-                    var[k] = input_value
+                    new_v = self.template[self.TEMPL_TOPOLOGY_TEMPL][self.TEMLP_INPUTS][input_var]
                 else:
-                    self._find_get_input(v)
+                    new_v = self._resolve_get_input(v)
+                if new_v is not v:
+                    if resolved is None:
+                        resolved = dict(var)
+                    resolved[k] = new_v
+            return var if resolved is None else resolved
         if isinstance(var, list):
-            for el in var:
-                self._find_get_input(el)
+            resolved = [self._resolve_get_input(el) for el in var]
+            return var if all(new_el is el for new_el, el in zip(resolved, var)) else resolved
+        return var
     
     def get_template_name(self) -> None:
         """
@@ -122,6 +130,11 @@ class TemplateParserMessage:
             None
         """
         self.template = self.enriched_template.copy()
+        # The parsed template is shared with the template cache: 
+        # copy the parts modified here instead of changing them in place
+        topology = dict(self.template[self.TEMPL_TOPOLOGY_TEMPL])
+        topology[self.TEMLP_INPUTS] = dict(topology[self.TEMLP_INPUTS])
+        self.template[self.TEMPL_TOPOLOGY_TEMPL] = topology
         self.template[self.TEMPL_MSG_VERSION] = self.TEMPL_MSG_VERSION_VALUE
         self.get_template_name()
     
@@ -225,8 +238,9 @@ class TemplateParserMessage:
                 self.template[self.TEMPL_TOPOLOGY_TEMPL][self.TEMLP_INPUTS][param_key] = param
 
         try:
-            for _, node_data in self.template[self.TEMPL_TOPOLOGY_TEMPL][self.TEMPL_NODE_TEMPL].items():
-                self._find_get_input(node_data)
+            topology = self.template[self.TEMPL_TOPOLOGY_TEMPL]
+            topology[self.TEMPL_NODE_TEMPL] = {node_name: self._resolve_get_input(node_data) 
+                                               for node_name, node_data in topology[self.TEMPL_NODE_TEMPL].items()}
         except KeyError as e:
             self.logger.error(f"KeyError during template processing: {e}")
         else:
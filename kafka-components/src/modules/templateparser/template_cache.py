@@ -0,0 +1,63 @@
+import hashlib
+from collections import OrderedDict
+from copy import deepcopy
+import yaml
+from modules.utilities.metrics import REGISTRY
+
+# libyaml loader when available, same results as the pure-Python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+CACHE_HITS = REGISTRY.counter("template_cache_hits_total", "Templates found in the parsed template cache")
+CACHE_MISSES = REGISTRY.counter("template_cache_misses_total", "Templates parsed and added to the cache")
+
+class TemplateCache:
+    """
+    LRU cache of the parsed YAML templates, keyed by the hash of their text.
+    The parsed templates are shared by all the hits and must not be modified:
+    load(copy=True) returns a deep copy.
+    """
+
+    def __init__(self, max_size: int, logger):
+        self.logger = logger
+        self.max_size = max_size
+        self.cache = OrderedDict()
+
+        # Monitoring metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get_mon_data(self) -> dict:
+        return {"template_cache_hits": self.hits,
+                "template_cache_misses": self.misses,
+                "template_cache_size": len(self.cache)}
+
+    def get_key(self, text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def load(self, text: str, copy: bool = False):
+        """
+        Parse a YAML template, or get it from the cache.
+        Args:
+            text (str): The YAML template.
+            copy (bool): Return a deep copy, which the caller can modify.
+        Returns:
+            The parsed template. yaml.YAMLError is raised if the text is not valid.
+        """
+        key = self.get_key(text)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            template = self.cache[key]
+            self.hits += 1
+            CACHE_HITS.inc()
+        else:
+            template = yaml.load(text, Loader=SafeLoader)
+            self.misses += 1
+            CACHE_MISSES.inc()
+            if self.max_size > 0:
+                self.cache[key] = template
+                if len(self.cache) > self.max_size:
+                    self.cache.popitem(last=False)
+        return deepcopy(template) if copy else template
@@ -1,22 +1,139 @@
-import logging,sys
+import copy
+import logging
+import queue
 import socket
+import sys
+import threading
+from time import time
 
 class KafkaLoggingHandler(logging.Handler):
-    def __init__(self, producer, log_topic):
+    """
+    Logging handler shipping the records to a Kafka topic.
+    emit() formats the record and enqueues it: a background thread sends the
+    records in batches, so logging never waits for the broker.
+    When the queue is full the record is dropped and counted.
+    close() sends the records still queued and flushes the producer.
+    """
+
+    # Queued by close(): the listener stops after sending the records before it
+    CLOSE_SENTINEL = object()
+
+    def __init__(self, producer, log_topic, queue_size=10000, batch_size=100, batch_timeout_s=0.5,
+                 close_timeout_s=10.0):
         super().__init__()
         self.producer = producer
         self.log_topic = log_topic
+        self.hostname = socket.gethostname()
+        self.batch_size = batch_size
+        self.batch_timeout_s = batch_timeout_s
+        self.close_timeout_s = close_timeout_s
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock_counters = threading.Lock()
+        self.dropped_records = 0
+        self.sent_records = 0
+        self.failed_records = 0
+        self.closed = False
+        self.listener = threading.Thread(target=self.listener_task)
+        self.listener.daemon = True
+        self.listener.start()
+
+    def get_mon_data(self) -> dict:
+        return {"log_queue_size": self.queue.qsize(),
+                "log_sent_records": self.sent_records,
+                "log_failed_records": self.failed_records,
+                "log_dropped_records": self.dropped_records}
+
+    def count_dropped(self) -> None:
+        with self.lock_counters:
+            self.dropped_records += 1
+
+    def prepare(self, record) -> logging.LogRecord:
+        # As QueueHandler.prepare: the record is formatted by the logging call,
+        # its arguments and exc_info are not kept in the queue
+        msg = self.format(record)
+        record = copy.copy(record)
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
 
     def emit(self, record):
+        if self.closed:
+            self.count_dropped()
+            return
+        try:
+            record = self.prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.count_dropped()
+
+    def collect_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time() + self.batch_timeout_s
+        while len(batch) < self.batch_size and batch[-1] is not self.CLOSE_SENTINEL:
+            remaining = deadline - time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    # Delivery callbacks, executed by the producer I/O thread.
+    # No logging here: this handler would log through the same producer.
+    def on_send_success(self, record_metadata) -> None:
+        with self.lock_counters:
+            self.sent_records += 1
+
+    def on_send_error(self, exc) -> None:
+        with self.lock_counters:
+            self.failed_records += 1
+
+    def send_record(self, record) -> None:
         try:
             msg = {
-                'msg': str(self.format(record)),
-                'hostname': socket.gethostname()
+                'msg': record.msg,
+                'hostname': self.hostname
             }
-            self.producer.send(self.log_topic, msg)
-            self.producer.flush(timeout=1.0)
-        except:
-            import traceback
-            ei = sys.exc_info()
-            traceback.print_exception(ei[0], ei[1], ei[2], None, sys.stderr)
-            del ei
\ No newline at end of file
+            future = self.producer.send(self.log_topic, msg)
+        except Exception:
+            self.on_send_error(None)
+            # Prints the traceback to stderr, like the other logging handlers
+            self.handleError(record)
+            return
+        future.add_callback(self.on_send_success)
+        future.add_errback(self.on_send_error)
+
+    def listener_task(self):
+        while True:
+            batch = self.collect_batch()
+            for record in batch:
+                if record is self.CLOSE_SENTINEL:
+                    return
+                self.send_record(record)
+
+    def close(self):
+        """
+        Send the queued records and flush the producer, waiting at most
+        close_timeout_s for each step. The records emitted afterwards are dropped.
+        """
+        if not self.closed:
+            self.closed = True
+            try:
+                self.queue.put(self.CLOSE_SENTINEL, timeout=self.close_timeout_s)
+                self.listener.join(self.close_timeout_s)
+            except queue.Full:
+                sys.stderr.write(f"KafkaLoggingHandler: {self.queue.qsize()} log records not sent on close\n")
+            try:
+                self.producer.flush(timeout=self.close_timeout_s)
+            except Exception as e:
+                sys.stderr.write(f"KafkaLoggingHandler: producer flush failed on close: {e}\n")
+        super().close()
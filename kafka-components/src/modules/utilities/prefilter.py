@@ -0,0 +1,37 @@
+from modules.utilities.metrics import REGISTRY
+
+PREFILTER_REJECTED = REGISTRY.counter("prefilter_rejected_total",
+                                      "Raw records discarded before JSON decoding", ["component"])
+
+class RawLinePrefilter:
+    """
+    Substring checks on the raw record, before JSON decoding.
+    A line is accepted if it contains every string in required, at least one
+    string in any_of (if given) and none of the strings in none_of.
+    The checks are run on str or bytes values; other types are accepted.
+    """
+
+    def __init__(self, component: str, required=(), any_of=(), none_of=()):
+        self.str_needles = (tuple(required), tuple(any_of), tuple(none_of))
+        self.bytes_needles = tuple(tuple(item.encode('utf-8') for item in needles)
+                                   for needles in self.str_needles)
+        self.rejected = PREFILTER_REJECTED.labels(component)
+
+    def accept(self, raw) -> bool:
+        if isinstance(raw, str):
+            required, any_of, none_of = self.str_needles
+        elif isinstance(raw, (bytes, bytearray)):
+            required, any_of, none_of = self.bytes_needles
+        else:
+            return True
+        for item in required:
+            if item not in raw:
+                self.rejected.inc()
+                return False
+        if any_of and not any(item in raw for item in any_of):
+            self.rejected.inc()
+            return False
+        if any(item in raw for item in none_of):
+            self.rejected.inc()
+            return False
+        return True
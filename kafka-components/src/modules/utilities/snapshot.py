@@ -0,0 +1,144 @@
+import os
+import pickle
+from time import time
+
+def write_pickle_atomic(filename: str, data) -> None:
+    # A crash during the write leaves the previous file untouched
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, 'wb') as fout:
+        pickle.dump(data, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp_filename, filename)
+
+class Snapshot:
+    """
+    Periodic checkpoint of the processor state, stored together with the 
+    consumer offsets it corresponds to. On restart the processor loads the
+    state and resumes the consumption from those offsets.
+    """
+    
+    SNAPSHOT_VERSION = 7
+    KEY_VERSION = 'version'
+    KEY_STATE = 'state'
+    KEY_OFFSETS = 'offsets'
+    KEY_TIMESTAMP = 'timestamp'
+
+    def __init__(self, settings, logger):
+        self.settings = settings
+        self.logger = logger
+        self.enabled = self.settings.SNAPSHOT_ENABLED
+        self.period = self.settings.SNAPSHOT_PERIOD
+        self.filename = os.path.join(self.settings.SNAPSHOT_DIR, 
+                                     f"{self.settings.APP_NAME}.snapshot")
+        self.last_ts = time()
+        
+        # Monitoring metrics
+        self.saved_snapshots = 0
+        self.last_size = 0
+        
+        if self.enabled:
+            os.makedirs(self.settings.SNAPSHOT_DIR, exist_ok=True)
+            self.logger.info(f"State snapshots enabled. File: {self.filename}, period: {self.period} s")
+    
+    def get_mon_data(self) -> dict:
+        return {"snapshots_saved": self.saved_snapshots,
+                "snapshot_size_bytes": self.last_size}
+    
+    def is_due(self) -> bool:
+        return self.enabled and time() - self.last_ts >= self.period
+    
+    def reset_period(self) -> None:
+        # The state was saved by other means, e.g. partition handoffs
+        self.last_ts = time()
+    
+    def save(self, state: dict, offsets: dict) -> None:
+        """
+        Write the snapshot atomically: a crash during the write leaves the
+        previous snapshot untouched.
+        """
+        start_time = time()
+        data = {self.KEY_VERSION: self.SNAPSHOT_VERSION,
+                self.KEY_TIMESTAMP: start_time,
+                self.KEY_STATE: state,
+                self.KEY_OFFSETS: offsets}
+        write_pickle_atomic(self.filename, data)
+        self.last_ts = time()
+        self.saved_snapshots += 1
+        self.last_size = os.path.getsize(self.filename)
+        interval_s = round(self.last_ts - start_time, 2)
+        self.logger.info(f"Saved snapshot of {self.last_size} bytes in {interval_s} s")
+    
+    def load(self) -> tuple[dict | None, dict | None]:
+        """
+        Returns:
+            tuple: (state, offsets) if a valid snapshot is found, (None, None) otherwise.
+        """
+        if not self.enabled or not os.path.exists(self.filename):
+            return None, None
+        try:
+            with open(self.filename, 'rb') as fin:
+                data = pickle.load(fin)
+        except Exception as e:
+            self.logger.error(f"Error loading snapshot {self.filename}: {e}")
+            return None, None
+        if data.get(self.KEY_VERSION) != self.SNAPSHOT_VERSION:
+            self.logger.warning(f"Snapshot version {data.get(self.KEY_VERSION)} not supported. Ignored")
+            return None, None
+        self.logger.info(f"Loaded snapshot {self.filename} with offsets {data[self.KEY_OFFSETS]}")
+        return data[self.KEY_STATE], data[self.KEY_OFFSETS]
+
+class PartitionHandoff:
+    """
+    State of single input partitions, written by the replica losing them on a
+    rebalance, or periodically in place of the snapshot, and read by the replica
+    they are assigned to. Each file matches the offsets committed with it, so it
+    is kept after loading: it is the restart point of the partition until the
+    next save. SNAPSHOT_DIR must be shared by all the replicas.
+    """
+    
+    def __init__(self, settings, logger):
+        self.logger = logger
+        self.directory = settings.SNAPSHOT_DIR
+        self.app_name = settings.APP_NAME
+        os.makedirs(self.directory, exist_ok=True)
+        
+        # Monitoring metrics
+        self.handed_off = 0
+        self.taken_over = 0
+    
+    def get_mon_data(self) -> dict:
+        return {"partitions_handed_off": self.handed_off,
+                "partitions_taken_over": self.taken_over}
+    
+    def get_filename(self, partition: int) -> str:
+        return os.path.join(self.directory, f"{self.app_name}.p{partition}.handoff")
+    
+    def save(self, partition: int, state: dict) -> None:
+        write_pickle_atomic(self.get_filename(partition), 
+                            {Snapshot.KEY_VERSION: Snapshot.SNAPSHOT_VERSION,
+                             Snapshot.KEY_TIMESTAMP: time(),
+                             Snapshot.KEY_STATE: state})
+        self.handed_off += 1
+        self.logger.info(f"Handed off the state of partition {partition}")
+    
+    def load(self, partition: int) -> dict | None:
+        """
+        Returns:
+            dict | None: the state of the partition, None if there is no handoff.
+        """
+        filename = self.get_filename(partition)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, 'rb') as fin:
+                data = pickle.load(fin)
+        except Exception as e:
+            self.logger.error(f"Error loading handoff {filename}: {e}")
+            return None
+        if data.get(Snapshot.KEY_VERSION) != Snapshot.SNAPSHOT_VERSION:
+            self.logger.warning(f"Handoff version {data.get(Snapshot.KEY_VERSION)} not supported. Ignored")
+            return None
+        self.taken_over += 1
+        self.logger.info(f"Took over the state of partition {partition}")
+        return data[Snapshot.KEY_STATE]
@@ -0,0 +1,22 @@
+# /bin/env python3
+
+# Python dependecies:
+# - kafka-python
+
+# input-files (written by consumer-file.py):
+#   orchestrator-logs dump
+#   providers-to-rank dump
+# output-file:
+#   dataset.jsonl
+
+from modules.datasetcollector.backfill import DatasetBackfill
+from modules.datasetcollector.settings import DatasetCollectorConfig as Config
+from modules.utilities.logger import create_logger
+
+if __name__ == "__main__": 
+    settings = Config()
+    logger = create_logger(settings)
+    logger.info(settings.show_configs())
+
+    backfill = DatasetBackfill(settings, logger)
+    backfill.run()
@@ -14,6 +14,7 @@
 from modules.datasetcollector.processor import DatasetCollectorProcessor as Processor
 from modules.datasetcollector.settings import DatasetCollectorConfig as Config
 from modules.utilities.logger import create_logger
+from modules.utilities.shutdown import exit_on_sigterm
 from modules.utilities.monitoring import Monitoring
 
 if __name__ == "__main__": 
@@ -26,5 +27,10 @@ if __name__ == "__main__":
     mon = Monitoring(settings, logger, processor)
     
     # Start Restore History
-    processor.restore_history()
-    processor.process_new_messages()
\ No newline at end of file
+    exit_on_sigterm()
+    try:
+        processor.restore_history()
+        processor.process_new_messages()
+    finally:
+        # The Parquet files and the queued log records are written before the producer cleanup at exit
+        processor.close()
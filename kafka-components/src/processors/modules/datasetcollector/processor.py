@@ -1,13 +1,24 @@
 
+import logging
 from time import time
 from modules.datasetcollector.datasetmessage import DatasetMessage
+from modules.datasetcollector.joinwindow import JoinWindow
 from modules.datasetcollector.loganalyzer import LogAnalyzer
+from modules.datasetcollector.parquetsink import ParquetSink
 from modules.datasetcollector.providers import Providers
 from modules.datasetcollector.settings import DatasetCollectorConfig
 from modules.utilities.kafka_client import KafkaClient
+from modules.utilities.logger import get_debug_sampler
+from modules.utilities.metrics import REGISTRY
+from modules.utilities.snapshot import PartitionHandoff, Snapshot
+from modules.utilities.state_store import create_state_store
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Processing time per stage, in seconds", ["stage"])
+ORC_LOG_SECONDS = STAGE_SECONDS.labels("orc_log")
+PROVIDERS_SECONDS = STAGE_SECONDS.labels("providers")
 
 class DatasetCollectorProcessor:
-    def __init__(self, settings: DatasetCollectorConfig, logger = None):
+    def __init__(self, settings: DatasetCollectorConfig, logger = None, kafka_client: KafkaClient = None):
         
         # Import logger and settings objects
         self.logger = logger
@@ -15,16 +26,46 @@ class DatasetCollectorProcessor:
         
         # Overwrite Kafka settings
         self.RESTORE_TOPICS = [self.settings.KAFKA_OUTPUT_TOPIC]
-        self.settings.KAFKA_INPUT_TOPICS = [self.settings.KAFKA_INPUT_ORC_LOG_TOPIC,
+        # Orchestrator lines parsed by the orc-events stage, or raw lines parsed here
+        if self.settings.ORC_EVENTS_ENABLED:
+            self.orc_topic = self.settings.KAFKA_INPUT_ORC_EVENTS_TOPIC
+        else:
+            self.orc_topic = self.settings.KAFKA_INPUT_ORC_LOG_TOPIC
+        self.settings.KAFKA_INPUT_TOPICS = [self.orc_topic,
                                             self.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC]
         # Internal objects
-        self.log_analyzer = LogAnalyzer(settings.get_values(), logger)
-        self.kafka_client = KafkaClient(logger, **settings.get_values())
-        self.providers = Providers(logger)
+        self.log_analyzer = LogAnalyzer(settings.get_values(), logger,
+                                        depl_status=create_state_store(settings, "depl_status"),
+                                        data=create_state_store(settings, "depl_data"))
+        if self.settings.ORC_EVENTS_ENABLED:
+            self.import_orc_record = self.log_analyzer.import_event_record
+        else:
+            self.import_orc_record = self.log_analyzer.import_line
+        # An external client can be passed, e.g. by replay tools and tests
+        self.kafka_client = kafka_client if kafka_client is not None else \
+                            KafkaClient(logger, **settings.get_values())
+        self.providers = Providers(logger, data=create_state_store(settings, "providers"))
+        self.join_window = JoinWindow(settings, logger)
+        self.parquet_sink = ParquetSink(settings, logger) if settings.PARQUET_SINK_ENABLED else None
+        self.snapshot = Snapshot(settings, logger)
+        # Scale-out: the state is split by input partition and follows the partition assignment
+        self.handoff = PartitionHandoff(settings, logger) if settings.KAFKA_SCALE_OUT else None
+        if self.handoff is not None:
+            self.kafka_client.set_rebalance_handler(self)
+            if not self.settings.ORC_EVENTS_ENABLED:
+                self.logger.warning("Scale-out on the raw orchestrator logs: the topic must be keyed by deployment uuid")
+        self.debug_sampler = get_debug_sampler(logger)
+        
+        # Incremental join: each insert looks up its counterpart by key
+        self.log_analyzer.on_store = self.join_key
+        self.providers.on_store = self.join_key
+        self.log_analyzer.is_expired = self.join_window.is_expired
         
         # Internal variables
         self.output_uuids = None
-        self.keys_sent = set()
+        # Event timestamp of each key sent: a key expires with both sides of its join
+        self.keys_sent = create_state_store(settings, "keys_sent")
+        self.keys_sent.ts_of = float
         self.depl_data = {}
         self.depl_status_db = {}
         
@@ -37,67 +78,214 @@ class DatasetCollectorProcessor:
         return self.log_analyzer.get_mon_data() | {"msg_sent": self.msg_sent,
                                                    "rev_orc_logs": self.rev_orc_logs,
                                                    "rev_airanker_infer": self.rev_airanker_infer,
-                                                   }
+                                                   } | self.providers.get_mon_data() \
+                                                     | self.join_window.get_mon_data() \
+                                                     | self.kafka_client.get_mon_data() \
+                                                     | self.snapshot.get_mon_data() \
+                                                     | (self.handoff.get_mon_data() if self.handoff else {}) \
+                                                     | (self.parquet_sink.get_mon_data() if self.parquet_sink else {})
+    
+    def get_state(self) -> dict:
+        return {"log_analyzer": self.log_analyzer.get_state(),
+                "providers": self.providers.get_state(),
+                "join_window": self.join_window.get_state(),
+                "keys_sent": self.keys_sent.get_state()}
+    
+    def set_state(self, state: dict) -> None:
+        self.log_analyzer.set_state(state["log_analyzer"])
+        self.providers.set_state(state["providers"])
+        self.join_window.set_state(state["join_window"])
+        self.keys_sent.set_state(state["keys_sent"])
+    
+    def flush_parquet_sink(self) -> bool:
+        if self.parquet_sink is None or self.parquet_sink.flush():
+            return True
+        self.logger.warning("[processor][flush_parquet_sink] Rows not written to Parquet: offsets not committed")
+        return False
+    
+    def save_snapshot(self):
+        # Sent messages must be delivered, and written to Parquet, before committing their input offsets
+        self.kafka_client.checkpoint()
+        if not self.flush_parquet_sink():
+            # Retried at the next period
+            self.snapshot.reset_period()
+            return
+        offsets = self.kafka_client.get_positions()
+        if self.handoff is not None:
+            self.save_partitions({partition for _, partition in offsets})
+            self.snapshot.reset_period()
+        else:
+            self.snapshot.save(self.get_state(), offsets)
+        self.kafka_client.commit_offsets(offsets)
+    
+    def close(self) -> None:
+        # The Parquet files open are closed, the queued log records sent
+        if self.parquet_sink is not None:
+            self.parquet_sink.close()
+        self.kafka_client.close()
+    
+    def save_partitions(self, partitions: set[int], remove: bool = False) -> None:
+        """
+        Write the state of each input partition to its handoff file.
+        The input topics are keyed by deployment uuid and co-partitioned.
+        """
+        partition_of = {}
+        def get_partition(uuid):
+            if uuid not in partition_of:
+                partition_of[uuid] = self.kafka_client.partition_for_key(self.orc_topic, uuid)
+            return partition_of[uuid]
+        for partition in sorted(partitions):
+            self.handoff.save(partition, self.select_partition(partition, get_partition, remove))
+    
+    def select_partition(self, partition: int, get_partition, remove: bool = False) -> dict:
+        # State of an input partition, get_partition(uuid) gives the partition of a uuid
+        def in_partition(uuid):
+            return get_partition(uuid) == partition
+        keys_sent = {key: ts for key, ts in self.keys_sent.items() if in_partition(key.rsplit('_', 1)[-1])}
+        if remove:
+            for key in keys_sent:
+                del self.keys_sent[key]
+        return {"log_analyzer": self.log_analyzer.select_state(in_partition, remove),
+                "providers": self.providers.select_state(in_partition, remove),
+                "keys_sent": keys_sent}
+    
+    def on_partitions_revoked(self, revoked) -> None:
+        self.kafka_client.checkpoint()
+        revoked = {(tp.topic, tp.partition) for tp in revoked}
+        partitions = {partition for _, partition in revoked}
+        if not self.flush_parquet_sink():
+            # The last handoff and its offsets are kept: the new owner replays the records since
+            def get_partition(uuid):
+                return self.kafka_client.partition_for_key(self.orc_topic, uuid)
+            for partition in sorted(partitions):
+                self.select_partition(partition, get_partition, remove=True)
+            return
+        offsets = {tp: offset for tp, offset in self.kafka_client.get_positions().items() if tp in revoked}
+        self.save_partitions(partitions, remove=True)
+        self.kafka_client.commit_offsets(offsets)
+    
+    def on_partitions_assigned(self, assigned) -> None:
+        for partition in sorted({tp.partition for tp in assigned}):
+            state = self.handoff.load(partition)
+            if state is None:
+                # No valid handoff: the partition state is rebuilt from its whole input
+                self.kafka_client.seek_to_beginning([tp for tp in assigned if tp.partition == partition])
+                continue
+            self.log_analyzer.merge_state(state["log_analyzer"])
+            self.providers.merge_state(state["providers"])
+            self.keys_sent.update(state["keys_sent"])
+    
+    def restore_snapshot(self) -> bool:
+        if self.handoff is not None:
+            # The state is loaded on partition assignment
+            return False
+        state, offsets = self.snapshot.load()
+        if state is None:
+            return False
+        self.set_state(state)
+        self.kafka_client.set_start_offsets(offsets)
+        self.logger.info(f"Restored state from snapshot: {len(self.keys_sent)} keys sent")
+        return True
+    
     def restore_history(self):
         self.logger.info("Start of initialization phase : Collecting message from output topic")
+        if self.restore_snapshot():
+            self.logger.info("End of initialization phase")
+            return
+        if self.handoff is None:
+            # No state restored: the joins in flight are rebuilt from the whole input
+            self.kafka_client.set_start_from_beginning()
         start_time = time()
         self.logger.debug(f"Topics to collect messages: {self.RESTORE_TOPICS}")
-        collected_msgs = self.kafka_client.collect_all_msgs_from_topics(self.RESTORE_TOPICS)
+        # Only the keys of the output topic are needed, with the time they were sent
+        self.keys_sent.set_state(self.kafka_client.collect_key_timestamps_from_topics(self.RESTORE_TOPICS))
         interval_s = round(time()-start_time,2)
-        tot_msg_num = sum([len(v) for v in collected_msgs.values()])
-        self.logger.debug(f"Collected {tot_msg_num} tot messages in {interval_s} s")
-        for topic, messages in collected_msgs.items():
-            self.logger.debug(f"Collected {len(messages)} from topic {topic}")    
-            
-            # Collect messages from the output topic and extract template uuids
-            if topic == self.settings.KAFKA_OUTPUT_TOPIC:
-                self.keys_sent = {message.key.decode('utf-8') for message in messages if message.key is not None and message.key != ''}
-                self.logger.debug(f"Imported {len(self.keys_sent)} messages from topic {self.settings.KAFKA_OUTPUT_TOPIC}")
-                self.logger.debug(f"{self.keys_sent=}")
+        self.logger.debug(f"Imported {len(self.keys_sent)} messages from topic {self.settings.KAFKA_OUTPUT_TOPIC} in {interval_s} s")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"keys_sent={list(self.keys_sent)}")
         self.logger.info("End of initialization phase")    
         
     def send_keys(self, keys_to_send):
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         for key in keys_to_send:
             
             prov_data = self.providers.get(key)
-            self.logger.debug("[processor][send_keys] Collected provider data")
-            
             depl_status_data = self.log_analyzer.get(key)
-            self.logger.debug("[processor][send_keys] Collected deployment status")
-            
             msg = DatasetMessage(prov_data, depl_status_data).get_message()
-            self.logger.debug("[processor][send_keys] Created message")
             
-            self.kafka_client.send(value=msg, key=key)
-            self.logger.debug("[processor][send_keys] Message sent")
-
+            self.kafka_client.send(value=msg, key=key, partition_key=depl_status_data[LogAnalyzer.UUID])
+            if self.parquet_sink is not None:
+                self.parquet_sink.append(msg)
             self.msg_sent += 1
+            self.keys_sent[key] = max(prov_data.event_ts, LogAnalyzer.get_event_ts(depl_status_data))
+            if debug:
+                self.logger.debug("[processor][send_keys] Message sent and key added in sent_keys: %s", key)
             
-            self.keys_sent.add(key)
-            self.logger.debug("[processor][send_keys] Added key in sent_keys")
-            
-    def check_and_send(self):
-        prov_keys = self.providers.keys()
-        depl_status_keys = self.log_analyzer.keys()
-        common_keys = prov_keys & depl_status_keys
-        keys_to_send = common_keys - self.keys_sent
-        if len(keys_to_send) > 0:
-            self.logger.debug(f"[processor][check_and_send] Keys to send: {keys_to_send}")
-            self.send_keys(keys_to_send)
-        else:
-            self.logger.debug("[processor][check_and_send] No message to send")
+    def evict_expired(self):
+        expiration_ts = self.join_window.start_eviction()
+        # Evicted entries never sent have not found their counterpart within the window
+        prov_keys = self.providers.evict(expiration_ts)
+        prov_orphans = sum(1 for key in prov_keys if key not in self.keys_sent)
+        self.join_window.count_evicted("providers", len(prov_keys), prov_orphans)
+        depl_keys, n_in_flight = self.log_analyzer.evict(expiration_ts)
+        depl_orphans = sum(1 for key in depl_keys if key not in self.keys_sent)
+        self.join_window.count_evicted("deployments", len(depl_keys), depl_orphans)
+        self.join_window.count_evicted("in_flight", n_in_flight, n_in_flight)
+        # Both sides of these keys are evicted
+        sent_keys = self.keys_sent.evict(expiration_ts)
+        self.join_window.count_evicted("keys_sent", len(sent_keys), 0)
+        if prov_keys or depl_keys or n_in_flight or sent_keys:
+            self.logger.info(f"[processor][evict_expired] Evicted {len(prov_keys)} provider records "
+                             f"({prov_orphans} orphans), {len(depl_keys)} deployments ({depl_orphans} orphans), "
+                             f"{n_in_flight} deployments never completed, {len(sent_keys)} keys sent")
+    
+    def join_key(self, key):
+        # Entries expired and not evicted yet are ignored, as if evicted
+        is_expired = self.join_window.is_expired
+        sent_ts = self.keys_sent.get(key)
+        if sent_ts is not None and not is_expired(sent_ts):
+            return
+        prov_data = self.providers.get(key)
+        depl_status_data = self.log_analyzer.get(key)
+        if prov_data is None or depl_status_data is None:
+            return
+        if is_expired(prov_data.event_ts) or is_expired(LogAnalyzer.get_event_ts(depl_status_data)):
+            return
+        self.logger.debug("[processor][join_key] Joined key to send: %s", key)
+        self.send_keys([key])
+    
+    def process_record(self, topic: str, value, event_ts: float):
+        """
+        Import a record of the input topics, sending the keys it joins.
+        Args:
+            topic (str): The input topic of the record.
+            value: The record value.
+            event_ts (float): The record timestamp, in seconds.
+        """
+        self.debug_sampler.new_message()
+        self.join_window.observe(event_ts)
+        if topic == self.orc_topic:
+            self.rev_orc_logs += 1
+            with ORC_LOG_SECONDS.time():
+                new_event = self.import_orc_record(value)
+            if new_event:
+                self.logger.debug("[processor][process_record] New event is emitted from log analyzer")
+        elif topic == self.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC:
+            self.rev_airanker_infer += 1
+            with PROVIDERS_SECONDS.time():
+                self.providers.import_msg(value, event_ts)
         
     def process_new_messages(self):
-        for message in self.kafka_client.consumer:
-            topic = str(message.topic)
-            if topic == self.settings.KAFKA_INPUT_ORC_LOG_TOPIC:
-                self.rev_orc_logs += 1
-                if self.log_analyzer.import_line(message.value):
-                    self.logger.debug("[processor][process_new_message] New event is emitted from log analyzer")
-                    self.check_and_send()
-                    
-            elif topic == self.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC:
-                self.rev_airanker_infer += 1
-                self.providers.import_msg(message.value)
-                self.check_and_send()
-                
\ No newline at end of file
+        for batch in self.kafka_client.iter_batches():
+            for records in batch.values():
+                for message in records:
+                    self.process_record(str(message.topic), message.value, message.timestamp / 1000)
+            
+            if self.join_window.is_eviction_due():
+                self.evict_expired()
+            
+            if self.parquet_sink is not None and self.parquet_sink.is_flush_due():
+                self.parquet_sink.flush()
+            
+            if self.snapshot.is_due():
+                self.save_snapshot()
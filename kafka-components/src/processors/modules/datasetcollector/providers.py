@@ -1,6 +1,9 @@
 
 
 import json 
+from time import time
+from modules.datasetcollector.records import ProviderRecord
+from modules.utilities.state_store import InMemoryStateStore, StateStore
 
 class Providers:
     PROVIDERS_KEY   = 'providers'
@@ -16,9 +19,12 @@ class Providers:
         USER_GROUP_KEY,
         UUID_KEY]   
     
-    def __init__(self, logger=None):
-        self.data = {}
+    def __init__(self, logger=None, data: StateStore = None):
+        self.data = data if data is not None else InMemoryStateStore()
+        self.data.ts_of = self.get_event_ts
         self.logger = logger # check if logger is not none
+        # Called with the key of each stored provider record
+        self.on_store = None
     
     def generate_key(self, obj:dict) -> str:
         k_list = [
@@ -27,25 +33,60 @@ class Providers:
             obj[self.UUID_KEY]
         ]
         new_key = "_".join(k_list).lower()
-        self.logger.debug(f"[providers][generate_key] Generated new key: {new_key}")
+        self.logger.debug("[providers][generate_key] Generated new key: %s", new_key)
         return new_key
 
-    def import_msg(self, msg_str: str):
+    def import_msg(self, msg_str: str, event_ts: float = None):
+        if event_ts is None:
+            event_ts = time()
         msg: dict = json.loads(msg_str)
         for prov_data in msg[self.PROVIDERS_KEY]:
             unified_msg = prov_data | { k:v for k,v in msg.items()
                                         if k in self.KEYS_TO_COPY 
                                         }
             prov_reg_uuid_key = self.generate_key(unified_msg)
-            self.data[prov_reg_uuid_key] = unified_msg 
             if prov_reg_uuid_key in self.data:
-                self.logger.debug(f"[providers][import_msg] Provider selector message already in memory. uuid: {prov_reg_uuid_key}.")
+                self.logger.debug("[providers][import_msg] Provider selector message already in memory. uuid: %s.", prov_reg_uuid_key)
             else:
-                self.logger.debug(f"[providers][import_msg] Added new Provider selector message. uuid: {prov_reg_uuid_key}.")
+                self.logger.debug("[providers][import_msg] Added new Provider selector message. uuid: %s.", prov_reg_uuid_key)
+            self.data[prov_reg_uuid_key] = ProviderRecord.from_dict(unified_msg, event_ts)
+            if self.on_store is not None:
+                self.on_store(prov_reg_uuid_key)
+    
+    def get_mon_data(self) -> dict:
+        return {"providers_size": len(self.data)}
+    
+    @staticmethod
+    def get_event_ts(record: ProviderRecord) -> float:
+        return record.event_ts
+    
+    def get_state(self) -> dict:
+        return {"data": self.data.get_state()}
+    
+    def set_state(self, state: dict) -> None:
+        self.data.set_state(state["data"])
+    
+    def select_state(self, uuid_filter, remove: bool = False) -> dict:
+        """
+        State of the records whose uuid satisfies uuid_filter(uuid), 
+        in the get_state() format. With remove, the records are deleted.
+        """
+        data = {key: record for key, record in self.data.items() if uuid_filter(record[self.UUID_KEY])}
+        if remove:
+            for key in data:
+                del self.data[key]
+        return {"data": data}
+    
+    def merge_state(self, state: dict) -> None:
+        self.data.update(state["data"])
+    
+    def evict(self, expiration_ts: float) -> list[str]:
+        # Remove the records received before expiration_ts, returns their keys
+        return self.data.evict(expiration_ts)
     
     def keys(self) -> set:
         prov_keys = set(self.data.keys())
         return prov_keys
     
-    def get(self, key) -> dict:
+    def get(self, key) -> ProviderRecord:
         return self.data.get(key, None)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from modules.templateparser.orc_templ_collector import LogOrchestratorCollector
+from modules.templateparser.templ_parser_message import TemplateParserMessage
+from modules.utilities.metrics import REGISTRY
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Processing time per stage, in seconds", ["stage"])
+TEMPLATE_SECONDS = STAGE_SECONDS.labels("template_parse")
+PARSE_INFLIGHT = REGISTRY.gauge("template_parse_inflight", "Templates submitted to the parse pool and not sent yet")
+PARSE_ERRORS = REGISTRY.counter("template_parse_errors_total", "Templates not parsed or validated by the parse pool")
+
+# Collector of the worker process, only used to import the templates
+_collector = None
+
+def init_worker(settings_values: dict) -> None:
+    global _collector
+    logger = logging.getLogger("template-parser.worker")
+    logger.setLevel(logging.WARNING)
+    _collector = LogOrchestratorCollector(settings_values, logger)
+
+def parse_template(str_template: list[str], depl_data: dict) -> tuple[dict | None, float]:
+    """
+    Import and validate a reassembled template, in a worker process.
+    Args:
+        str_template (list[str]): The template lines.
+        depl_data (dict): The user parameters of the deployment.
+    Returns:
+        tuple: (validated template, None if not imported, parse time in seconds)
+    """
+    start = perf_counter()
+    template = _collector.import_template(str_template)
+    if not template:
+        return None, perf_counter() - start
+    validated_template = TemplateParserMessage(template | depl_data, _collector.logger).get_dict()
+    return validated_template, perf_counter() - start
+
+class TemplateParsePool:
+    """
+    Parsing and validation of the reassembled templates in a process pool, off
+    the consumer thread. Results are returned in submission order. At most
+    TEMPLATE_PARSE_MAX_INFLIGHT templates are pending: submit() waits for the
+    oldest ones beyond that. Each worker has its own parsed template cache.
+    Workers are started by a forkserver, not forked from the processor: the
+    Kafka clients, logging and monitoring threads are already running.
+    """
+
+    START_METHOD = "forkserver"
+
+    def __init__(self, settings, logger):
+        self.logger = logger
+        self.n_workers = settings.TEMPLATE_PARSE_WORKERS
+        self.max_inflight = max(settings.TEMPLATE_PARSE_MAX_INFLIGHT, 1)
+        settings_values = {key: value for key, value in settings.get_values().items()
+                           if not callable(value)}
+        self.executor = ProcessPoolExecutor(max_workers=self.n_workers,
+                                            mp_context=multiprocessing.get_context(self.START_METHOD),
+                                            initializer=init_worker,
+                                            initargs=(settings_values,))
+        self.inflight = deque()
+
+        # Monitoring metrics
+        self.submitted = 0
+        self.parse_errors = 0
+
+        self.logger.info(f"Template parse pool enabled. Workers: {self.n_workers}, "
+                         f"max in-flight templates: {self.max_inflight}")
+
+    def get_mon_data(self) -> dict:
+        return {"template_parse_inflight": len(self.inflight),
+                "template_parse_submitted": self.submitted,
+                "template_parse_errors": self.parse_errors}
+
+    def submit(self, str_template: list[str], depl_data: dict) -> list[dict]:
+        """
+        Submit a template to the pool.
+        Args:
+            str_template (list[str]): The template lines.
+            depl_data (dict): The user parameters of the deployment.
+        Returns:
+            list[dict]: The validated templates completed so far, in submission order.
+        """
+        self.inflight.append(self.executor.submit(parse_template, str_template, depl_data))
+        self.submitted += 1
+        return self.collect(self.max_inflight)
+
+    def ready(self) -> list[dict]:
+        # Completed templates at the head of the queue, without waiting
+        return self.collect(self.max_inflight)
+
+    def drain(self) -> list[dict]:
+        # All the submitted templates, e.g. before committing the input offsets
+        return self.collect(0)
+
+    def collect(self, max_pending: int) -> list[dict]:
+        results = []
+        while self.inflight and (self.inflight[0].done() or len(self.inflight) > max_pending):
+            future = self.inflight.popleft()
+            try:
+                template, interval_s = future.result()
+            except Exception as e:
+                self.parse_errors += 1
+                PARSE_ERRORS.inc()
+                self.logger.error(f"[template-parse-pool][collect] Error validating template: {e}")
+                continue
+            TEMPLATE_SECONDS.observe(interval_s)
+            if template is None:
+                self.parse_errors += 1
+                PARSE_ERRORS.inc()
+                continue
+            results.append(template)
+        PARSE_INFLIGHT.set(len(self.inflight))
+        return results
+
+    def close(self) -> list[dict]:
+        results = self.drain()
+        self.executor.shutdown()
+        return results
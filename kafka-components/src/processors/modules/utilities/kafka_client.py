@@ -1,21 +1,47 @@
 
 import copy 
 import json
+from collections import deque
 from logging import Formatter as logging_Formatter
 # import logging.handlers
 # import os
 import random
 import string
-from kafka import KafkaConsumer, KafkaProducer # type: ignore
+import threading
+from time import time
+from kafka import KafkaConsumer, KafkaProducer, TopicPartition # type: ignore
+from kafka import ConsumerRebalanceListener, OffsetAndMetadata # type: ignore
+from kafka.partitioner.default import murmur2 # type: ignore
 from modules.utilities.kafka_logging_handler import KafkaLoggingHandler
+from modules.utilities.metrics import REGISTRY
+
+RECORDS_CONSUMED = REGISTRY.counter("records_consumed_total", "Records consumed", ["topic"])
+CONSUMER_LAG = REGISTRY.gauge("consumer_lag_records", "Records behind the partition high watermark", 
+                              ["topic", "partition"])
+SEND_SECONDS = REGISTRY.histogram("send_seconds", "Time spent in KafkaClient.send")
+FLUSH_SECONDS = REGISTRY.histogram("flush_seconds", "Time spent flushing the producer")
+
+class ClientRebalanceListener(ConsumerRebalanceListener):
+    """Forwards the partition rebalances of the consumer to the KafkaClient"""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def on_partitions_revoked(self, revoked):
+        self.client.on_partitions_revoked(revoked)
+    
+    def on_partitions_assigned(self, assigned):
+        self.client.on_partitions_assigned(assigned)
 
 class KafkaClient():
     PROD_DEFAULT_CONFIG = {
         'acks': 'all',
         'allow_auto_create_topics': False,
+        'batch_size': 16384,
         'bootstrap_servers': 'kafka-1:9092,kafka-2:9092,kafka-3:9092',
         'client_id': None,
         'enable_idempotence': True,
+        'linger_ms': 0,
         'max_request_size': 104857600,
         'security_protocol': "SSL",
         'ssl_check_hostname': False,
@@ -34,7 +60,7 @@ class KafkaClient():
         'fetch_max_bytes': 104857600, 
         'group_id': None,
         # 'group_instance_id': None,
-        'max_poll_records': 1,
+        'max_poll_records': 500,
         'security_protocol': "SSL",
         'ssl_check_hostname': False,
         'ssl_password': 'password',
@@ -47,9 +73,25 @@ class KafkaClient():
     CLIENT_DEFAULT_CONFIG = {
         'app_name': "my-client",
         'cert_dir': None,
-        'log_dir': './log'
+        'log_dir': './log',
+        'log_queue_size': 10000,
+        'log_batch_size': 100,
+        'log_batch_timeout_s': 0.5,
+        'poll_timeout_ms': 1000,
+        'replay_max_records': 10000,
+        'replay_progress_period_s': 10,
+        'replay_timeout_s': 300,
+        'send_mode': 'sync',
+        'send_flush_records': 1000,
+        'send_flush_interval_s': 1.0,
+        'send_max_retries': 3,
+        'scale_out': False,
+        'stable_group_id': False
     }
     
+    SEND_MODE_SYNC = 'sync'
+    SEND_MODE_BATCH = 'batch'
+    
     def __init__(self, logger, **configs: dict[str]) -> None:
         
         self.logger = logger
@@ -75,7 +117,19 @@ class KafkaClient():
                                         string.ascii_lowercase +
                                         string.digits, k=64))
         
-        configs['group_id'] = configs['group_id_base'] + rnd_id 
+        if self.client_configs['scale_out']:
+            # Shared group: the replicas split the partitions, the state is 
+            # handed off with the offsets, committed only on handoff/snapshot
+            self.client_configs['stable_group_id'] = True
+            configs['group_id'] = configs['group_id_base']
+            configs['enable_auto_commit'] = False
+        elif self.client_configs['stable_group_id']:
+            # Shared group: the committed offsets survive restarts. They are
+            # committed with the state they belong to, never automatically
+            configs['group_id'] = configs['group_id_base']
+            configs['enable_auto_commit'] = False
+        else:
+            configs['group_id'] = configs['group_id_base'] + rnd_id 
         # configs['group_instance_id'] = self.client_configs['app_name'] + rnd_id
         
         self.prod_configs = copy.copy(self.PROD_DEFAULT_CONFIG)
@@ -95,7 +149,7 @@ class KafkaClient():
                 self.logger.info(f"\t{key}: {value}")
             self.logger.info("}")
             self.consumer = KafkaConsumer(**self.cons_configs)
-            self.consumer.subscribe(self.input_topics)
+            self.consumer.subscribe(self.input_topics, listener=ClientRebalanceListener(self))
             self.logger.info(f"Subscribed to topics: {self.input_topics}")
         else:
             self.consumer = None
@@ -117,70 +171,362 @@ class KafkaClient():
                 self.logger.info("Configuration for Kafka Handler:")
                 self.logger.info(f"log_topic = {self.log_topic}")
                 self.logger.info("")
-                kafka_handler = KafkaLoggingHandler(self.producer, self.log_topic)
+                kafka_handler = KafkaLoggingHandler(self.producer, self.log_topic,
+                                                    queue_size=self.client_configs['log_queue_size'],
+                                                    batch_size=self.client_configs['log_batch_size'],
+                                                    batch_timeout_s=self.client_configs['log_batch_timeout_s'])
                 formatter_str = '%(asctime)s [%(name)-12s] %(levelname)s %(message)s'
                 formatter = logging_Formatter(formatter_str)
                 kafka_handler.setFormatter(formatter)
                 self.logger.addHandler(kafka_handler)   
+                self.kafka_handler = kafka_handler
                 self.logger.info("Added KafkaLoggingHandler to logger")
             else:
                 self.log_topic = None
+                self.kafka_handler = None
         else:
             self.producer = None
+            self.kafka_handler = None
+        
+        # Batched send mode state
+        self.send_mode = self.client_configs['send_mode']
+        if self.send_mode not in (self.SEND_MODE_SYNC, self.SEND_MODE_BATCH):
+            raise ValueError(f"Unsupported send mode: {self.send_mode}")
+        self.logger.info(f"Send mode: {self.send_mode}")
+        self.send_lock = threading.Lock()
+        self.retry_queue = deque()
+        self.send_pending = 0
+        self.send_acked = 0
+        self.send_errors = 0
+        self.send_dropped = 0
+        self.last_flush_ts = time()
+        
+        # Offsets restored from a snapshot, applied on partition assignment
+        self.start_offsets = {}
+        # Without restored state the partitions are consumed from the beginning
+        # on their first assignment, see set_start_from_beginning
+        self.start_from_beginning = False
+        self.started_partitions = set()
+        # Object notified of the partition rebalances, see set_rebalance_handler
+        self.rebalance_handler = None
+        self.partitions = {}
         
     # Write message in kafka topic
-    def send(self, value, key=None) -> None:
+    # partition_key: records with the same partition key go to the same partition
+    # timestamp_ms: record timestamp, e.g. the one of the input record, the send time by default
+    def send(self, value, key=None, partition_key: str = None, timestamp_ms: int = None) -> None:
+        with SEND_SECONDS.time():
+            self._send(value, key, partition_key, timestamp_ms)
+    
+    def _send(self, value, key, partition_key, timestamp_ms) -> None:
         if key:
             key = key.encode('utf-8') if isinstance(key, str) else key
         elif "uuid" in value:
             key = value['uuid'].encode('utf-8')
         
         if self.output_topic is not None:
+            partition = None
+            if partition_key is not None:
+                partition = self.partition_for_key(self.output_topic, partition_key)
             if isinstance(value, list):
                 for msg in value:
-                    self.producer.send(self.output_topic, value=msg, key=key)
+                    self._send_record(self.output_topic, msg, key, partition, timestamp_ms, 0)
                     # self.logger.debug(f"Message sent to topic {self.output_topic}: {value}")
             else:
-                self.producer.send(self.output_topic, value=value, key=key)
+                self._send_record(self.output_topic, value, key, partition, timestamp_ms, 0)
                 # self.logger.debug(f"Message sent to topic {self.output_topic}: {value}")
+            
+            if self.send_mode == self.SEND_MODE_SYNC:
+                self.producer.flush()
+            elif self.send_pending >= self.client_configs['send_flush_records'] or \
+                time() - self.last_flush_ts >= self.client_configs['send_flush_interval_s']:
+                self.checkpoint()
+    
+    def _send_record(self, topic, value, key, partition, timestamp_ms, attempt) -> None:
+        future = self.producer.send(topic, value=value, key=key, partition=partition, timestamp_ms=timestamp_ms)
+        if self.send_mode == self.SEND_MODE_BATCH:
+            with self.send_lock:
+                self.send_pending += 1
+            future.add_callback(self._on_send_success)
+            future.add_errback(self._on_send_error, topic, value, key, partition, timestamp_ms, attempt)
+    
+    # Delivery callbacks, executed by the producer I/O thread. 
+    # No logging here: the Kafka logging handler shares this producer.
+    def _on_send_success(self, record_metadata) -> None:
+        with self.send_lock:
+            self.send_pending -= 1
+            self.send_acked += 1
+    
+    def _on_send_error(self, topic, value, key, partition, timestamp_ms, attempt, exc) -> None:
+        with self.send_lock:
+            self.send_pending -= 1
+            self.send_errors += 1
+        self.retry_queue.append((topic, value, key, partition, timestamp_ms, attempt + 1, exc))
+    
+    # Flush the buffered records and resubmit the failed ones
+    def checkpoint(self) -> None:
+        if self.producer is None:
+            return
+        with FLUSH_SECONDS.time():
+            self.producer.flush()
+        while self.retry_queue:
+            topic, value, key, partition, timestamp_ms, attempt, exc = self.retry_queue.popleft()
+            self.logger.error(f"Delivery to topic {topic} failed (attempt {attempt}). Error: {exc}")
+            if attempt < self.client_configs['send_max_retries']:
+                self._send_record(topic, value, key, partition, timestamp_ms, attempt)
+            else:
+                self.send_dropped += 1
+                self.logger.error(f"Message with key {key} dropped after {attempt} attempts")
+        if self.send_mode == self.SEND_MODE_BATCH:
             self.producer.flush()
+        self.last_flush_ts = time()
+    
+    def close(self) -> None:
+        self.checkpoint()
+        if self.kafka_handler is not None:
+            # The queued log records are sent before closing the producer
+            self.logger.removeHandler(self.kafka_handler)
+            self.kafka_handler.close()
+        if self.producer is not None:
+            self.producer.close()
+        if self.consumer is not None:
+            self.consumer.close()
+    
+    def get_mon_data(self) -> dict:
+        mon = {"send_pending": self.send_pending,
+               "send_acked": self.send_acked,
+               "send_errors": self.send_errors,
+               "send_dropped": self.send_dropped,
+               "send_retry_queue": len(self.retry_queue)}
+        if self.kafka_handler is not None:
+            mon |= self.kafka_handler.get_mon_data()
+        return mon
+
+    # Consumer offsets, as {(topic, partition): offset}
+    def get_positions(self) -> dict[tuple[str, int], int]:
+        return {(tp.topic, tp.partition): self.consumer.position(tp) 
+                for tp in self.consumer.assignment()}
+    
+    def set_start_offsets(self, offsets: dict[tuple[str, int], int]) -> None:
+        self.start_offsets = dict(offsets)
+        # Partitions may be already assigned
+        self.seek_start_offsets(self.consumer.assignment())
+    
+    def set_start_from_beginning(self) -> None:
+        """
+        Consume the input partitions from their beginning on their first assignment,
+        in place of the committed offsets: called when no state was restored, the
+        records consumed before the committed offsets rebuild it.
+        """
+        self.start_from_beginning = True
+        # Partitions may be already assigned
+        self.seek_start_offsets(self.consumer.assignment())
+    
+    def seek_start_offsets(self, partitions) -> None:
+        for tp in partitions:
+            offset = self.start_offsets.pop((tp.topic, tp.partition), None)
+            if offset is not None:
+                self.consumer.seek(tp, offset)
+                self.logger.info(f"Consumer of {tp.topic}[{tp.partition}] moved to offset {offset}")
+            elif self.start_from_beginning and (tp.topic, tp.partition) not in self.started_partitions:
+                self.seek_to_beginning([tp])
+            self.started_partitions.add((tp.topic, tp.partition))
+    
+    def seek_to_beginning(self, partitions) -> None:
+        for tp in partitions:
+            self.consumer.seek_to_beginning(tp)
+            self.logger.info(f"Consumer of {tp.topic}[{tp.partition}] moved to the beginning")
+    
+    def set_rebalance_handler(self, handler) -> None:
+        """
+        handler.on_partitions_revoked(partitions) and handler.on_partitions_assigned(partitions)
+        are called, from poll(), with the revoked/assigned TopicPartition.
+        """
+        self.rebalance_handler = handler
+    
+    def on_partitions_revoked(self, revoked) -> None:
+        self.logger.info(f"Partitions revoked: {sorted((tp.topic, tp.partition) for tp in revoked)}")
+        if self.rebalance_handler is not None:
+            self.rebalance_handler.on_partitions_revoked(revoked)
+    
+    def on_partitions_assigned(self, assigned) -> None:
+        self.logger.info(f"Partitions assigned: {sorted((tp.topic, tp.partition) for tp in assigned)}")
+        if self.rebalance_handler is not None:
+            self.rebalance_handler.on_partitions_assigned(assigned)
+        self.seek_start_offsets(assigned)
+    
+    # Partition of a key, as computed by the Java and kafka-python default partitioners
+    def partition_for_key(self, topic: str, key: str) -> int:
+        partitions = self.partitions.get(topic)
+        if partitions is None:
+            if self.producer is not None and topic == self.output_topic:
+                partitions = sorted(self.producer.partitions_for(topic))
+            else:
+                partitions = sorted(self.consumer.partitions_for_topic(topic))
+            self.partitions[topic] = partitions
+        return partitions[(murmur2(key.encode('utf-8')) & 0x7fffffff) % len(partitions)]
+    
+    def commit_offsets(self, offsets: dict[tuple[str, int], int]) -> None:
+        if not self.client_configs['stable_group_id']:
+            return
+        self.consumer.commit({TopicPartition(topic, partition): OffsetAndMetadata(offset, '', -1)
+                              for (topic, partition), offset in offsets.items()})
+        self.logger.debug(f"Committed offsets: {offsets}")
+
+    # Micro-batch consumption: yields {TopicPartition: [records]} per poll.
+    # An empty dict is yielded when the poll times out, so callers can run
+    # periodic work even without incoming traffic.
+    def iter_batches(self, max_records: int = None, timeout_ms: int = None):
+        if max_records is None:
+            max_records = self.cons_configs['max_poll_records']
+        if timeout_ms is None:
+            timeout_ms = self.client_configs['poll_timeout_ms']
+        while True:
+            batch = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+            for tp, records in batch.items():
+                RECORDS_CONSUMED.labels(tp.topic).inc(len(records))
+                highwater = self.consumer.highwater(tp)
+                if highwater is not None:
+                    CONSUMER_LAG.labels(tp.topic, str(tp.partition)).set(highwater - records[-1].offset - 1)
+            yield batch
+            if self.send_mode == self.SEND_MODE_BATCH:
+                self.checkpoint()
+
+    def _create_replay_consumer(self, topics: list[str], keys_only: bool = False):
+        temp_consumer_conf = copy.copy(self.cons_configs)
+        if keys_only:
+            # Values are left as raw bytes: no deserialization cost
+            temp_consumer_conf['value_deserializer'] = None
+        temp_consumer_conf['group_id'] = None
+        temp_consumer_conf['enable_auto_commit'] = False
+        client_id = self.cons_configs['client_id'] or self.client_configs['app_name']
+        temp_consumer_conf['client_id'] = f"{client_id}-replay"
+        temp_consumer_conf['max_poll_records'] = self.client_configs['replay_max_records']
+        
+        self.logger.info("Configuration for the Temporary Consumer: {")
+        for key, value in temp_consumer_conf.items():
+            self.logger.info(f"\t{key}: {value}")
+        self.logger.info("}")
+        
+        temp_consumer = KafkaConsumer(**temp_consumer_conf)
+        partitions = []
+        for topic in topics:
+            topic_partitions = temp_consumer.partitions_for_topic(topic)
+            if not topic_partitions:
+                self.logger.warning(f"No partition found for topic {topic}")
+                continue
+            partitions += [TopicPartition(topic, p) for p in sorted(topic_partitions)]
+        
+        # Offsets are fixed before reading: messages produced during the 
+        # replay are left to the live consumer
+        temp_consumer.assign(partitions)
+        beginning_offsets = temp_consumer.beginning_offsets(partitions)
+        end_offsets = temp_consumer.end_offsets(partitions)
+        if partitions:
+            temp_consumer.seek_to_beginning(*partitions)
+        remaining = {tp: end_offsets[tp] for tp in partitions
+                     if end_offsets[tp] > beginning_offsets[tp]}
+        for tp in partitions:
+            self.logger.debug(f"Replay of {tp.topic}[{tp.partition}]: "
+                              f"offsets {beginning_offsets[tp]} -> {end_offsets[tp]}")
+        return temp_consumer, remaining
+    
+    def _log_replay_progress(self, consumer, end_offsets: dict) -> None:
+        for tp, end_offset in end_offsets.items():
+            self.logger.info(f"Replay progress {tp.topic}[{tp.partition}]: "
+                             f"{consumer.position(tp)}/{end_offset}")
+    
+    # Read each partition from the beginning up to the end offset recorded
+    # when the replay starts. Yields {TopicPartition: [records]} batches.
+    # With keys_only=True record values are not deserialized.
+    def replay_batches(self, topics: list[str], keys_only: bool = False):
+        temp_consumer, remaining = self._create_replay_consumer(topics, keys_only)
+        end_offsets = dict(remaining)
+        timeout_s = self.client_configs['replay_timeout_s']
+        progress_period_s = self.client_configs['replay_progress_period_s']
+        last_progress_ts = last_record_ts = time()
+        try:
+            while remaining:
+                batch = temp_consumer.poll(timeout_ms=self.client_configs['poll_timeout_ms'])
+                now = time()
+                out_batch = {}
+                for tp, records in batch.items():
+                    if tp not in remaining:
+                        continue
+                    records = [r for r in records if r.offset < remaining[tp]]
+                    if records:
+                        out_batch[tp] = records
+                        last_record_ts = now
+                
+                for tp in list(remaining):
+                    if temp_consumer.position(tp) >= remaining[tp]:
+                        del remaining[tp]
+                        temp_consumer.pause(tp)
+                        self.logger.debug(f"Replay of {tp.topic}[{tp.partition}] completed")
+                
+                if out_batch:
+                    yield out_batch
+                
+                if now - last_progress_ts >= progress_period_s:
+                    self._log_replay_progress(temp_consumer, end_offsets)
+                    last_progress_ts = now
+                if remaining and now - last_record_ts >= timeout_s:
+                    self._log_replay_progress(temp_consumer, end_offsets)
+                    msg = f"Replay stalled: no records received in {timeout_s} s"
+                    self.logger.error(msg)
+                    raise TimeoutError(msg)
+        finally:
+            temp_consumer.close()
+
+    # Streaming replay: handler(topic, messages) is called for each fetched
+    # batch, so the caller folds the history without holding whole topics
+    def stream_msgs_from_topics(self, topics: list[str], handler, 
+                                keys_only: bool = False) -> dict[str, int]:
+        if not isinstance(topics, list):
+            topics = [topics] if topics else self.input_topics
+        self.logger.debug(f"Stream_msgs_from_topics. Input topics: {topics}")
+        
+        collected_msgs = { topic:0 for topic in topics }
+        for batch in self.replay_batches(topics, keys_only):
+            for tp, records in batch.items():
+                handler(tp.topic, records)
+                collected_msgs[tp.topic] += len(records)
+        self.logger.debug(f"Streamed messages from Kafka: {collected_msgs}")
+        return collected_msgs
+    
+    # Collect the set of keys of the given topics, used to rebuild the 
+    # sets of already sent messages
+    def collect_keys_from_topics(self, topics: list[str]) -> set[str]:
+        keys = set()
+        def add_keys(topic, messages):
+            keys.update(message.key.decode('utf-8') for message in messages 
+                        if message.key is not None and message.key != b'')
+        self.stream_msgs_from_topics(topics, add_keys, keys_only=True)
+        return keys
+
+    # Collect the keys of the given topics with the timestamp, in seconds, 
+    # of their last record, used to rebuild the keys sent within a time window
+    def collect_key_timestamps_from_topics(self, topics: list[str]) -> dict[str, float]:
+        key_timestamps = {}
+        def add_keys(topic, messages):
+            for message in messages:
+                if message.key is not None and message.key != b'':
+                    key = message.key.decode('utf-8')
+                    key_timestamps[key] = max(message.timestamp / 1000, key_timestamps.get(key, float("-inf")))
+        self.stream_msgs_from_topics(topics, add_keys, keys_only=True)
+        return key_timestamps
 
     def collect_all_msgs_from_topics(self, 
                                      topics: list[str] = None) -> dict[str, list]:
-        attempts = 5
-        if not isinstance(topics, list) and isinstance(topics, str):
+        if not isinstance(topics, list):
             topics = [topics] if topics else self.input_topics
         self.logger.debug(f"Collect_all_msg_from_topics. Input topics: {topics}")
         
-        tot_collected_msgs = 0
-        while tot_collected_msgs == 0 and attempts > 0:
-            group_id = ''.join(random.choices(string.ascii_uppercase +
-                                        string.ascii_lowercase +
-                                        string.digits, k=64))
-            group_base = '-'.join(self.input_topics)
-            temp_consumer_conf = copy.copy(self.cons_configs)
-            temp_consumer_conf['consumer_timeout_ms'] = 1000
-            temp_consumer_conf['group_id'] = group_base + group_id
-            temp_consumer_conf['client_id'] = group_base + group_id
-            temp_consumer_conf['max_poll_records'] = 10000
-            # temp_consumer_conf['group_instance_id'] = group_base + group_id
-            
-            self.logger.info("Configuration for the Temporary Consumer: {")
-            for key, value in temp_consumer_conf.items():
-                self.logger.info(f"\t{key}: {value}")
-            self.logger.info("}")
-            
-            temp_consumer = KafkaConsumer(**temp_consumer_conf)
-            temp_consumer.subscribe(topics)
-            collected_msgs = { topic:[] for topic in topics }
-            messages = [message for message in temp_consumer]
-            tot_collected_msgs = len(messages)
-            self.logger.debug(f"Collected messages from Kafka: {tot_collected_msgs}")
-            if tot_collected_msgs == 0:
-                self.logger.debug(f"Retry collection. Remaining {attempts} attempts")
-                attempts -= 1
-        
-        for message in messages:
-            topic = str(message.topic)
-            collected_msgs[topic].append(message)
-        return collected_msgs
\ No newline at end of file
+        collected_msgs = { topic:[] for topic in topics }
+        for batch in self.replay_batches(topics):
+            for tp, records in batch.items():
+                collected_msgs[tp.topic] += records
+        
+        tot_collected_msgs = sum(len(v) for v in collected_msgs.values())
+        self.logger.debug(f"Collected messages from Kafka: {tot_collected_msgs}")
+        return collected_msgs
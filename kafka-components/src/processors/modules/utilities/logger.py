@@ -3,6 +3,33 @@ import logging.handlers
 import os
 from modules.templateparser.settings import TemplateParserConfig
 
+class DebugSampler(logging.Filter):
+    """
+    Logger filter keeping the DEBUG records of one consumed message every 
+    'rate' messages. Records with higher level always pass.
+    """
+    
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(1, rate)
+        self.counter = 0
+        self.enabled = True
+    
+    def new_message(self) -> None:
+        self.counter += 1
+        self.enabled = self.counter % self.rate == 0
+    
+    def filter(self, record) -> bool:
+        return self.enabled or record.levelno > logging.DEBUG
+
+def get_debug_sampler(logger: logging.Logger) -> DebugSampler:
+    for log_filter in logger.filters:
+        if isinstance(log_filter, DebugSampler):
+            return log_filter
+    sampler = DebugSampler()
+    logger.addFilter(sampler)
+    return sampler
+
 def create_logger(settings: TemplateParserConfig) -> logging.Logger:
     
     log_dir = settings.LOG_DIR
@@ -23,6 +50,7 @@ def create_logger(settings: TemplateParserConfig) -> logging.Logger:
                                                         backupCount=7)
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
-    logger.setLevel(logging.DEBUG)
-    logger.info("Logger Configured")
-    return logger
\ No newline at end of file
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.addFilter(DebugSampler(settings.LOG_DEBUG_SAMPLING))
+    logger.info(f"Logger Configured. Level: {settings.LOG_LEVEL}, debug sampling: 1/{settings.LOG_DEBUG_SAMPLING}")
+    return logger
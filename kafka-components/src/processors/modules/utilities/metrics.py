@@ -0,0 +1,187 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+class Counter:
+    """Monotonic counter. inc() is a plain attribute update."""
+    TYPE = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+class Gauge:
+    """Value that can go up and down."""
+    TYPE = 'gauge'
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+class Histogram:
+    """Distribution of observed values over fixed buckets."""
+    TYPE = 'histogram'
+    DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return HistogramTimer(self)
+
+    def samples(self, name, labels):
+        acc = 0
+        for bound, count in zip(self.buckets, self.counts):
+            acc += count
+            yield f"{name}_bucket", labels + (('le', repr(bound)),), acc
+        acc += self.counts[-1]
+        yield f"{name}_bucket", labels + (('le', '+Inf'),), acc
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, acc
+
+class HistogramTimer:
+    """Context manager observing the elapsed time, in seconds."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(perf_counter() - self.start)
+
+class Metric:
+    """
+    Family of metrics sharing name and type, one child per label values.
+    Without label names the metric acts as its single child.
+    """
+
+    def __init__(self, name, documentation, metric_class, label_names=(), **kwargs):
+        self.name = name
+        self.documentation = documentation
+        self.metric_class = metric_class
+        self.label_names = tuple(label_names)
+        self.kwargs = kwargs
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self.children[()] = metric_class(**kwargs)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.metric_class(**self.kwargs))
+        return child
+
+    def __getattr__(self, attr):
+        # Unlabelled metric: forward inc/set/observe/time to the single child
+        return getattr(self.children[()], attr)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.metric_class.TYPE}"]
+        for values, child in list(self.children.items()):
+            labels = tuple(zip(self.label_names, values))
+            for sample_name, sample_labels, value in child.samples(self.name, labels):
+                lines.append(format_sample(sample_name, sample_labels, value))
+        return lines
+
+def format_sample(name, labels, value) -> str:
+    if labels:
+        str_labels = ','.join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{str_labels}}} {value}"
+    return f"{name} {value}"
+
+class MetricsRegistry:
+    """
+    Collection of metrics exposed in the Prometheus text format.
+    Callbacks returning dict[str, number] are exposed as gauges, so the
+    existing get_mon_data() dictionaries are published as they are.
+    """
+
+    def __init__(self, prefix='paasmon'):
+        self.prefix = prefix
+        self.metrics = {}
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def _register(self, name, documentation, metric_class, label_names, **kwargs):
+        full_name = f"{self.prefix}_{name}"
+        with self.lock:
+            if full_name not in self.metrics:
+                self.metrics[full_name] = Metric(full_name, documentation, metric_class,
+                                                 label_names, **kwargs)
+            return self.metrics[full_name]
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(name, documentation, Counter, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(name, documentation, Gauge, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self._register(name, documentation, Histogram, label_names, buckets=buckets)
+
+    def register_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def expose(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines += metric.expose()
+        for callback in self.callbacks:
+            for key, value in callback().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.prefix}_mon_{key}"
+                lines += [f"# TYPE {name} gauge", format_sample(name, (), value)]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        body = self.registry.expose().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, addr: str = '0.0.0.0') -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
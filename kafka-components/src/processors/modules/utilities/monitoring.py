@@ -1,14 +1,21 @@
 import threading
 from time import sleep
+from modules.utilities.metrics import REGISTRY, start_metrics_server
 
 class Monitoring:
 
     def __init__(self, settings, logger, obj_to_monitor):
         self.settings = settings
         self.logger = logger
+        self.obj_to_monitor = obj_to_monitor
+        
+        # get_mon_data() values are exposed as gauges with the registry metrics
+        if self.settings.METRICS_ENABLED:
+            REGISTRY.register_callback(self.obj_to_monitor.get_mon_data)
+            start_metrics_server(self.settings.METRICS_PORT)
+            self.logger.info(f"Metrics exposed on port {self.settings.METRICS_PORT}")
         
         if self.settings.MONITORING_ENABLED:
-            self.obj_to_monitor = obj_to_monitor
             monitor_thread = threading.Thread(target=self.monitoring_task)
             monitor_thread.daemon = True
             monitor_thread.start()
@@ -17,4 +24,4 @@ class Monitoring:
         while True:
             mon = self.obj_to_monitor.get_mon_data()
             self.logger.info(f"Monitoring data: {mon}")
-            sleep(self.settings.MONITORING_PERIOD)
\ No newline at end of file
+            sleep(self.settings.MONITORING_PERIOD)
@@ -0,0 +1,249 @@
+import json
+import re
+from datetime import datetime
+from modules.utilities.prefilter import RawLinePrefilter
+from modules.utilities.timestamps import parse_filebeat_ts, parse_orc_ts
+
+# Deployment uuid in a JSON payload, also when escaped in the raw filebeat envelope
+UUID_REGEX = re.compile(r'uuid[\\"]*\s*:\s*[\\"]*([0-9A-Za-z-]+)')
+
+class OrcEvent:
+    """
+    Orchestrator log line, parsed once and shared by the processors.
+    kind is one of the OrcEventParser kinds. timestamp is the filebeat time of
+    the deployment events, orc_ts the orchestrator time of the line, None for
+    the continuation lines of a multi-line message. source is the syslog host
+    and tag of the orchestrator instance: thread names repeat across the
+    instances. payload is the JSON of the deployment events, the orchestrator
+    message of the template lines, None for the other lines.
+    """
+    __slots__ = ('kind', 'timestamp', 'orc_ts', 'source', 'thread', 'logger', 'uuid', 'payload')
+    DATETIME_FIELDS = ('timestamp', 'orc_ts')
+
+    def __init__(self, kind, timestamp=None, orc_ts=None, source=None, thread=None, logger=None, uuid=None,
+                 payload=None):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.orc_ts = orc_ts
+        self.source = source
+        self.thread = thread
+        self.logger = logger
+        self.uuid = uuid
+        self.payload = payload
+
+    def get_stream(self) -> tuple:
+        # Lines of an orchestrator thread, in the order they were logged
+        return (self.source, self.thread)
+
+    def get_key(self) -> str | None:
+        # Deployment events are keyed by uuid, the template lines by source and thread to keep their order
+        if self.kind in OrcEventParser.DEPLOYMENT_KINDS:
+            return self.uuid
+        if self.source is None:
+            return self.thread
+        return f"{self.source}|{self.thread}"
+
+    def to_dict(self) -> dict:
+        data = {}
+        for key in self.__slots__:
+            value = getattr(self, key)
+            if value is None:
+                continue
+            data[key] = value.isoformat() if key in self.DATETIME_FIELDS else value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'OrcEvent':
+        data = dict(data)
+        for key in cls.DATETIME_FIELDS:
+            if data.get(key) is not None:
+                data[key] = datetime.fromisoformat(data[key])
+        return cls(**data)
+
+    @classmethod
+    def from_json(cls, value) -> 'OrcEvent':
+        # Record of the events topic, decoded or not by the consumer
+        return cls.from_dict(json.loads(value) if isinstance(value, (str, bytes)) else value)
+
+    @staticmethod
+    def kind_marker(kind: str) -> str:
+        # The JSON-encoded kind, for a RawLinePrefilter: found in a serialized
+        # record whatever the separators. Strings inside the payload are escaped.
+        # The consumer checks the kind of the decoded record.
+        return json.dumps(kind)
+
+    def __repr__(self):
+        return f"OrcEvent({self.to_dict()})"
+
+class OrcEventParser:
+    """
+    Parse the raw orchestrator-logs records, filebeat JSON envelopes of the
+    orchestrator syslog lines, into OrcEvent. The continuation lines of a
+    multi-line message carry no timestamp: they get the thread of the last
+    timestamped line of the same source, the syslog host and tag of the
+    orchestrator instance.
+    """
+
+    # Deployment events
+    SUBMISSION_LINE = "Submission of deployment request to the IM. "
+    COMPLETED_LINE  = "Deployment completed successfully. "
+    ERROR_LINE      = "Deployment in error. "
+    LINES_TO_REJECT = [
+        'it.reply.orchestrator.exception.service.DeploymentException: Error executing request to IM'
+    ]
+    MAX_MESSAGE_LEN = 8100
+
+    # Template lines
+    START_TEMPLATE_STRING = ": Creating deployment with template"
+    EVENT_TEMPLATE_SEP = " i.r.o.service.DeploymentServiceImpl      : "
+    EVENT_TEMPLATE_STRING = " i.r.o.service.DeploymentServiceImpl      : {"
+
+    LOG_SEP_DEFAULT = 'paas-orchestrator orchestrator/'
+    LOG_SEP_KEY = "log_sep"
+    THREAD_START = " --- ["
+    THREAD_END = "] "
+    LOGGER_END = " : "
+    MAX_SOURCES = 1024
+
+    # Kinds
+    KIND_SUBMISSION      = 'submission'
+    KIND_COMPLETED       = 'completed'
+    KIND_ERROR           = 'error'
+    KIND_TEMPLATE_START  = 'template_start'
+    KIND_TEMPLATE_LINE   = 'template_line'
+    KIND_USER_PARAMETERS = 'user_parameters'
+    KIND_LOG             = 'log'
+    DEPLOYMENT_KINDS = frozenset([KIND_SUBMISSION, KIND_COMPLETED, KIND_ERROR])
+
+    def __init__(self, settings, logger, prefilter: RawLinePrefilter = None):
+        self.logger = logger
+        if isinstance(settings, dict):
+            self.log_sep = settings.get(self.LOG_SEP_KEY) or self.LOG_SEP_DEFAULT
+        else:
+            self.log_sep = getattr(settings, 'LOG_SEP', self.LOG_SEP_DEFAULT)
+        self.prefilter = prefilter if prefilter is not None else \
+                         RawLinePrefilter("orc_events", required=[self.log_sep])
+        # Thread of the last timestamped line of each source, the least recent first
+        self.last_threads = {}
+
+        # Monitoring metrics
+        self.parse_errors = 0
+
+        # Single regex over all the event markers: the leftmost match gives the
+        # event kind and its end the offset of the JSON payload
+        markers = [(self.KIND_SUBMISSION, self.SUBMISSION_LINE),
+                   (self.KIND_COMPLETED, self.COMPLETED_LINE),
+                   (self.KIND_ERROR, self.ERROR_LINE)]
+        # A reject marker anywhere in the message, also after an event marker,
+        # means the line is not a deployment event
+        self.reject_regex = re.compile("|".join(re.escape(item) for item in self.LINES_TO_REJECT))
+        self.event_regex = re.compile("|".join(f"(?P<{kind}{i}>{re.escape(marker)})"
+                                               for i, (kind, marker) in enumerate(markers)))
+        self.event_kinds = {f"{kind}{i}": kind for i, (kind, _) in enumerate(markers)}
+
+    def get_mon_data(self) -> dict:
+        return {"rejected_lines": self.prefilter.rejected.value,
+                "parse_errors": self.parse_errors}
+
+    def event_payload(self, message: str, offset: int) -> str:
+        msg = message.rstrip()
+        payload = msg[offset:].strip()
+        # Truncated messages: close the JSON string and object
+        if len(msg.lstrip()) >= self.MAX_MESSAGE_LEN:
+            if payload.endswith('\\'):
+                payload = payload[:-1]
+            payload += ' "}'
+        return payload
+
+    def extract_uuid(self, payload: str) -> str | None:
+        match = UUID_REGEX.search(payload)
+        return match.group(1) if match else None
+
+    def get_source(self, record: dict, message: str, tag_pos: int, tag_end: int) -> str:
+        # Syslog tag of the orchestrator instance, e.g. '<host> orchestrator/<container>[<pid>]',
+        # with the host of the filebeat record if available
+        tag = message[tag_pos:tag_end].rstrip(':')
+        host = record.get('host')
+        if isinstance(host, dict) and host.get('name'):
+            return f"{host['name']} {tag}"
+        return tag
+
+    def set_last_thread(self, source: str, thread: str) -> None:
+        self.last_threads.pop(source, None)
+        self.last_threads[source] = thread
+        if len(self.last_threads) > self.MAX_SOURCES:
+            del self.last_threads[next(iter(self.last_threads))]
+
+    def parse_header(self, orc_log: str) -> tuple[str, str]:
+        # '<date> <time> <level> <pid> --- [<thread>] <logger> : <message>'
+        start = orc_log.find(self.THREAD_START)
+        if start < 0:
+            return None, None
+        start += len(self.THREAD_START)
+        end = orc_log.find(self.THREAD_END, start)
+        if end < 0:
+            return None, None
+        logger_end = orc_log.find(self.LOGGER_END, end)
+        logger_name = orc_log[end + len(self.THREAD_END):logger_end].strip() if logger_end >= 0 else None
+        return orc_log[start:end].strip(), logger_name
+
+    def parse(self, raw) -> OrcEvent | None:
+        """
+        Parse a raw orchestrator-logs record.
+        Args:
+            raw (str | bytes | dict): The filebeat record.
+        Returns:
+            OrcEvent | None: The parsed line, None if it is not an orchestrator line.
+        """
+        if not self.prefilter.accept(raw):
+            return None
+        try:
+            record = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+            message = record['message']
+        except Exception as e:
+            self.parse_errors += 1
+            self.logger.error(f"[orc-events][parse] Line is not a valid filebeat record: {raw}")
+            self.logger.error(f"[orc-events][parse] Error: {e}")
+            return None
+
+        tag_pos = message.find(self.log_sep)
+        if tag_pos < 0:
+            return None
+        body_pos = tag_pos + len(self.log_sep)
+        next_tag = message.find(self.log_sep, body_pos)
+        body = message[body_pos:next_tag] if next_tag >= 0 else message[body_pos:]
+        # Skip the rest of the syslog tag, the orchestrator message follows
+        space = body.find(' ')
+        orc_log = body[space + 1:] if space >= 0 else ''
+        source = self.get_source(record, message, tag_pos, body_pos + space if space >= 0 else body_pos + len(body))
+
+        try:
+            orc_ts = parse_orc_ts(" ".join(orc_log.split(maxsplit=2)[0:2]))
+        except (ValueError, IndexError):
+            orc_ts = None
+        if orc_ts is not None:
+            thread, logger_name = self.parse_header(orc_log)
+            self.set_last_thread(source, thread)
+        else:
+            thread, logger_name = self.last_threads.get(source), None
+
+        match = self.event_regex.search(message, body_pos)
+        if match is not None and self.reject_regex.search(message) is None:
+            try:
+                timestamp = parse_filebeat_ts(record['@timestamp'])
+            except (KeyError, ValueError) as e:
+                self.parse_errors += 1
+                self.logger.error(f"[orc-events][parse] Invalid filebeat timestamp in record: {raw}")
+                self.logger.error(f"[orc-events][parse] Error: {e}")
+                return None
+            payload = self.event_payload(message, match.end())
+            return OrcEvent(self.event_kinds[match.lastgroup], timestamp=timestamp, orc_ts=orc_ts,
+                            source=source, thread=thread, logger=logger_name, uuid=self.extract_uuid(payload), payload=payload)
+        if orc_ts is None:
+            return OrcEvent(self.KIND_TEMPLATE_LINE, source=source, thread=thread, payload=orc_log)
+        if self.START_TEMPLATE_STRING in orc_log:
+            return OrcEvent(self.KIND_TEMPLATE_START, orc_ts=orc_ts, source=source, thread=thread, logger=logger_name, payload=orc_log)
+        if self.EVENT_TEMPLATE_STRING in orc_log:
+            return OrcEvent(self.KIND_USER_PARAMETERS, orc_ts=orc_ts, source=source, thread=thread, logger=logger_name,
+                            uuid=self.extract_uuid(orc_log), payload=orc_log)
+        return OrcEvent(self.KIND_LOG, orc_ts=orc_ts, source=source, thread=thread, logger=logger_name)
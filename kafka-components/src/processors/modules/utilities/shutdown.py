@@ -0,0 +1,12 @@
+import signal
+import sys
+
+def exit_on_sigterm() -> None:
+    """
+    Turn the SIGTERM of docker stop and Kubernetes into SystemExit, so the
+    finally blocks of the entry points run, e.g. closing the Kafka client
+    before the atexit cleanup of the producer.
+    """
+    def handler(signum, frame):
+        sys.exit(128 + signum)
+    signal.signal(signal.SIGTERM, handler)
@@ -0,0 +1,233 @@
+import glob
+import os
+import pickle
+import sqlite3
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from time import time
+
+class StoreBackup:
+    """Copy of a SQLiteStateStore table, referenced by the snapshots in place of its content."""
+    __slots__ = ('filename', 'table')
+
+    def __init__(self, filename: str, table: str):
+        self.filename = filename
+        self.table = table
+
+    def items(self):
+        conn = sqlite3.connect(self.filename)
+        try:
+            for key, value in conn.execute(f"SELECT key, value FROM {self.table}"):
+                yield key, pickle.loads(value)
+        finally:
+            conn.close()
+
+class StateStore(MutableMapping):
+    """
+    Key-value store of a processor state, used as a dict.
+    get_state() returns the content to be stored in a snapshot, set_state() restores it.
+    ts_of(value), set by the owner of the store, returns the event timestamp of
+    a value: evict() removes the values older than the expiration timestamp.
+    """
+
+    ts_of = None
+
+    def get_state(self):
+        return dict(self.items())
+
+    def set_state(self, state) -> None:
+        self.clear()
+        self.update(state.items())
+
+    def evict(self, expiration_ts: float) -> list:
+        # Remove the values whose event timestamp is before expiration_ts, returns their keys
+        expired = [key for key, value in self.items() if self.ts_of(value) < expiration_ts]
+        for key in expired:
+            del self[key]
+        return expired
+
+    def close(self) -> None:
+        pass
+
+class InMemoryStateStore(dict, StateStore):
+    """Plain dict, the default store."""
+
+    def get_state(self):
+        return self
+
+class SQLiteStateStore(StateStore):
+    """
+    SQLite table with an in-memory LRU cache in front.
+    Each key lives either in the cache or in the table: the least recently used
+    entries are written to the table when the cache is full, and moved back to
+    the cache when accessed. Values stored in the cache can be modified in place.
+    The table is a spill area, it is emptied when the store is opened: the
+    state is restored from the snapshots or the topics history.
+    The event timestamp of the stored values is kept in an indexed column, so
+    the eviction does not load them. The snapshots copy the table with the
+    SQLite backup API to a file starting with backup_prefix: the snapshot only
+    references it. The two most recent copies are kept, the snapshot being
+    written after the copy.
+    """
+
+    BACKUPS_KEPT = 2
+
+    def __init__(self, filename: str, table: str, cache_size: int, backup_prefix: str = None):
+        self.table = table
+        self.cache_size = cache_size
+        self.backup_prefix = backup_prefix if backup_prefix is not None else filename
+        self.backup_generation = 0
+        self.cache = OrderedDict()
+        self.conn = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        # The content is not kept across restarts, the schema may be the one of a former version
+        self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self.conn.execute(f"CREATE TABLE {table} (key TEXT PRIMARY KEY, ts REAL, value BLOB)")
+        self.conn.execute(f"CREATE INDEX {table}_ts ON {table} (ts)")
+        self.n_stored = 0
+
+    def _row(self, key, value) -> tuple:
+        ts = self.ts_of(value) if self.ts_of is not None else None
+        return key, ts, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _load(self, key):
+        row = self.conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        self.n_stored -= 1
+        return pickle.loads(row[0])
+
+    def _cache_put(self, key, value) -> None:
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            old_key, old_value = self.cache.popitem(last=False)
+            self.conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, ts, value) VALUES (?, ?, ?)",
+                              self._row(old_key, old_value))
+            self.n_stored += 1
+
+    def __getitem__(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        value = self._load(key)
+        if value is None:
+            raise KeyError(key)
+        self._cache_put(key, value)
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        if key not in self.cache and self.n_stored:
+            cur = self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self.n_stored -= cur.rowcount
+        self._cache_put(key, value)
+
+    def __delitem__(self, key) -> None:
+        if key in self.cache:
+            del self.cache[key]
+            return
+        cur = self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        if cur.rowcount == 0:
+            raise KeyError(key)
+        self.n_stored -= 1
+
+    def __contains__(self, key) -> bool:
+        if key in self.cache:
+            return True
+        return self.n_stored > 0 and self.conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return len(self.cache) + self.n_stored
+
+    def __iter__(self):
+        yield from list(self.cache)
+        for (key,) in self.conn.execute(f"SELECT key FROM {self.table}").fetchall():
+            yield key
+
+    def items(self):
+        # Does not promote the stored entries to the cache
+        yield from list(self.cache.items())
+        for key, value in self.conn.execute(f"SELECT key, value FROM {self.table}"):
+            yield key, pickle.loads(value)
+
+    def clear(self) -> None:
+        self.cache.clear()
+        self.conn.execute(f"DELETE FROM {self.table}")
+        self.n_stored = 0
+
+    def evict(self, expiration_ts: float) -> list:
+        expired = [key for key, value in self.cache.items() if self.ts_of(value) < expiration_ts]
+        for key in expired:
+            del self.cache[key]
+        if self.n_stored:
+            stored = [key for (key,) in self.conn.execute(
+                f"SELECT key FROM {self.table} WHERE ts < ?", (expiration_ts,))]
+            if stored:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE ts < ?", (expiration_ts,))
+                self.n_stored -= len(stored)
+                expired += stored
+        return expired
+
+    def get_state(self) -> StoreBackup:
+        """
+        Copy the table to a new backup file, with the cached entries.
+        Returns the reference to the copy, stored in the snapshot.
+        """
+        self.backup_generation = max(int(time() * 1000), self.backup_generation + 1)
+        filename = f"{self.backup_prefix}.{self.backup_generation}.db"
+        tmp_filename = filename + ".tmp"
+        dest = sqlite3.connect(tmp_filename)
+        try:
+            self.conn.backup(dest)
+            dest.executemany(f"INSERT OR REPLACE INTO {self.table} (key, ts, value) VALUES (?, ?, ?)",
+                             (self._row(key, value) for key, value in self.cache.items()))
+            dest.commit()
+        finally:
+            dest.close()
+        os.replace(tmp_filename, filename)
+        self.remove_old_backups()
+        return StoreBackup(filename, self.table)
+
+    def remove_old_backups(self) -> None:
+        def generation(filename):
+            return int(filename.rsplit('.', 2)[-2])
+        backups = sorted(glob.glob(f"{glob.escape(self.backup_prefix)}.*.db"), key=generation)
+        for filename in backups[:-self.BACKUPS_KEPT]:
+            os.remove(filename)
+
+    def set_state(self, state) -> None:
+        if not isinstance(state, StoreBackup):
+            super().set_state(state)
+            return
+        self.cache.clear()
+        self.conn.execute("ATTACH DATABASE ? AS backup", (state.filename,))
+        try:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.execute(f"INSERT INTO {self.table} (key, ts, value) "
+                              f"SELECT key, ts, value FROM backup.{state.table}")
+        finally:
+            self.conn.execute("DETACH DATABASE backup")
+        self.n_stored = self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+STATE_STORE_MEMORY = 'memory'
+STATE_STORE_SQLITE = 'sqlite'
+
+def create_state_store(settings, name: str) -> StateStore:
+    """
+    Create the store selected by settings.STATE_STORE for the state 'name'.
+    """
+    if settings.STATE_STORE == STATE_STORE_MEMORY:
+        return InMemoryStateStore()
+    elif settings.STATE_STORE == STATE_STORE_SQLITE:
+        os.makedirs(settings.STATE_STORE_DIR, exist_ok=True)
+        filename = os.path.join(settings.STATE_STORE_DIR, f"{settings.APP_NAME}.{name}.db")
+        backup_prefix = os.path.join(settings.SNAPSHOT_DIR, f"{settings.APP_NAME}.{name}")
+        return SQLiteStateStore(filename, name, settings.STATE_STORE_CACHE_SIZE, backup_prefix)
+    else:
+        raise ValueError(f"Unsupported state store: {settings.STATE_STORE}")
@@ -0,0 +1,97 @@
+from datetime import datetime
+from functools import lru_cache
+from time import monotonic
+import pytz
+
+# Fixed-format timestamp parsers shared by the orchestrator-logs processors.
+# Log bursts share the same second: the second part of each timestamp is
+# parsed once and memoized, only the fraction is parsed per line.
+
+LOCAL_TZ = pytz.timezone("Europe/Rome")
+UTC_TZ = pytz.utc
+MEMO_SIZE = 1024
+
+FILEBEAT_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"   # 2025-01-31T12:34:56.789Z
+ORC_TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"         # 2025-01-31 12:34:56.789
+SYSLOG_TS_FORMAT = "%Y-%m-%dT%H:%M:%S%z"       # 2025-01-31T12:34:56+01:00
+SYSLOG_INPUT_FORMAT = "%b %d %H:%M:%S %Y"      # Jan 31 12:34:56 (+ current year)
+
+def _parse_fraction(fraction: str) -> int:
+    # '789' -> 789000 microseconds, as %f
+    if not fraction.isdigit() or len(fraction) > 6:
+        raise ValueError(f"Invalid fraction of second: {fraction!r}")
+    return int(fraction.ljust(6, '0'))
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _filebeat_second(str_second: str) -> datetime:
+    dt_utc = UTC_TZ.localize(datetime.fromisoformat(str_second))
+    return dt_utc.astimezone(LOCAL_TZ)
+
+def parse_filebeat_ts(ts_str: str) -> datetime:
+    """
+    Parse a filebeat '@timestamp' (UTC) into an aware datetime in the local timezone.
+    Args:
+        ts_str (str): Timestamp in FILEBEAT_TS_FORMAT.
+    Returns:
+        datetime: The timestamp converted to LOCAL_TZ.
+    """
+    if len(ts_str) < 22 or ts_str[19] != '.' or ts_str[-1] != 'Z':
+        raise ValueError(f"time data {ts_str!r} does not match format {FILEBEAT_TS_FORMAT!r}")
+    return _filebeat_second(ts_str[:19]).replace(microsecond=_parse_fraction(ts_str[20:-1]))
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _orc_second(str_second: str) -> datetime:
+    if len(str_second) != 19 or str_second[10] != ' ':
+        raise ValueError(f"time data {str_second!r} does not match format {ORC_TS_FORMAT!r}")
+    return datetime.fromisoformat(str_second)
+
+def parse_orc_ts(ts_str: str) -> datetime:
+    """
+    Parse the orchestrator timestamp at the beginning of its log messages.
+    Args:
+        ts_str (str): Timestamp in ORC_TS_FORMAT.
+    Returns:
+        datetime: The naive timestamp.
+    """
+    if len(ts_str) < 21 or ts_str[19] != '.':
+        raise ValueError(f"time data {ts_str!r} does not match format {ORC_TS_FORMAT!r}")
+    return _orc_second(ts_str[:19]).replace(microsecond=_parse_fraction(ts_str[20:]))
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_syslog_ts(ts_str: str) -> datetime:
+    """
+    Parse an ISO syslog timestamp with UTC offset.
+    Args:
+        ts_str (str): Timestamp in SYSLOG_TS_FORMAT.
+    Returns:
+        datetime: The aware timestamp.
+    """
+    if len(ts_str) != 25 or ts_str[10] != 'T':
+        raise ValueError(f"time data {ts_str!r} does not match format {SYSLOG_TS_FORMAT!r}")
+    return datetime.fromisoformat(ts_str)
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _syslog_to_iso(str_local_ts: str, year: int) -> str:
+    dt_local = datetime.strptime(f"{str_local_ts} {year}", SYSLOG_INPUT_FORMAT)
+    dt_utc = LOCAL_TZ.localize(dt_local, is_dst=None).astimezone(UTC_TZ)
+    return dt_utc.isoformat()
+
+def syslog_to_iso(str_local_ts: str) -> str:
+    """
+    Convert a local 'Mon DD HH:MM:SS' syslog timestamp of the current year to ISO UTC.
+    Args:
+        str_local_ts (str): Timestamp in SYSLOG_INPUT_FORMAT, without the year.
+    Returns:
+        str: The timestamp in SYSLOG_TS_FORMAT, with ':' in the UTC offset.
+    """
+    return _syslog_to_iso(str_local_ts, _current_year())
+
+_year_cache = {"year": None, "ts": float("-inf")}
+
+def _current_year() -> int:
+    # datetime.now() is refreshed at most once per second
+    now = monotonic()
+    if now - _year_cache["ts"] >= 1.0:
+        _year_cache["year"] = datetime.now().year
+        _year_cache["ts"] = now
+    return _year_cache["year"]
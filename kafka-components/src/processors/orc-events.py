@@ -0,0 +1,38 @@
+# /bin/env python3
+
+# Python dependecies:
+# - kafka-python
+
+# topics:
+#   inputs:
+#       orchestrator-logs
+#   outputs:
+#       orchestrator-events
+#   logs:
+#       logs-proc-orc-events
+
+from modules.orcevents.processor import OrcEventsProcessor as Processor
+from modules.orcevents.settings import OrcEventsConfig as Config
+from modules.utilities.logger import create_logger
+from modules.utilities.shutdown import exit_on_sigterm
+from modules.utilities.monitoring import Monitoring
+
+if __name__ == "__main__": 
+    settings = Config()
+    logger = create_logger(settings)
+    logger.info("Collecting configuration settings for Orchestrator Events:")
+    for key, value in settings.model_dump().items():
+        logger.info(f"\t{key} = {value}")
+    logger.info("}")
+
+    # Init external objects
+    processor = Processor(settings, logger)
+    mon = Monitoring(settings, logger, processor)
+    
+    exit_on_sigterm()
+    try:
+        processor.restore_history()
+        processor.process_new_messages()
+    finally:
+        # The queued log records are sent before the producer cleanup at exit
+        processor.kafka_client.close()
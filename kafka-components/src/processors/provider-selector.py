@@ -14,6 +14,8 @@
 from modules.providerselector.processor import ProviderSelectorProcessor
 from modules.providerselector.settings import ProviderSelectorConfig
 from modules.utilities.logger import create_logger
+from modules.utilities.shutdown import exit_on_sigterm
+from modules.utilities.monitoring import Monitoring
        
 if __name__ == "__main__": 
     settings = ProviderSelectorConfig()
@@ -21,5 +23,11 @@ if __name__ == "__main__":
     logger.info(settings.show_configs())
 
     processor = ProviderSelectorProcessor(settings, logger)
-    processor.restore_history()
-    processor.process_new_messages()
\ No newline at end of file
+    mon = Monitoring(settings, logger, processor)
+    exit_on_sigterm()
+    try:
+        processor.restore_history()
+        processor.process_new_messages()
+    finally:
+        # The queued log records are sent before the producer cleanup at exit
+        processor.kafka_client.close()
@@ -0,0 +1,110 @@
+import json
+import logging
+from types import SimpleNamespace
+import pytest
+from modules.utilities.orc_events import OrcEventParser
+from modules.utilities.timestamps import parse_filebeat_ts
+
+LOG_SEP = "paas-orchestrator orchestrator/"
+
+def orc_record(message: str, second: int = 0, thread: str = "exec-1", instance: str = "abc123",
+               logger_name: str = "i.r.o.service.DeploymentServiceImpl", host: str = None) -> str:
+    """Filebeat record of a timestamped orchestrator line"""
+    header = f"2025-03-30 10:00:{second:02d}.000  INFO 1 --- [{thread}] {logger_name:<40} : "
+    return continuation_record(header + message, second, instance, host)
+
+def continuation_record(line: str, second: int = 0, instance: str = "abc123", host: str = None) -> str:
+    """
+    Filebeat record of an orchestrator line without timestamp, e.g. a template line.
+    instance is the container of the orchestrator in the syslog tag, host the
+    host name added by filebeat.
+    """
+    record = {"@timestamp": f"2025-03-30T08:00:{second:02d}.000Z",
+              "message": f"Mar 30 10:00:{second:02d} {LOG_SEP}{instance}[42]: {line}"}
+    if host is not None:
+        record["host"] = {"name": host}
+    return json.dumps(record)
+
+def record_ts(second: int = 0) -> float:
+    """Event time of the records built with the given second, in seconds"""
+    return parse_filebeat_ts(f"2025-03-30T08:00:{second:02d}.000Z").timestamp()
+
+def submission_message(uuid: str, provider: str = "P0", region: str = "R0") -> str:
+    return OrcEventParser.SUBMISSION_LINE + json.dumps({"uuid": uuid, "provider_name": provider,
+                                                        "provider_region": region})
+
+def completed_message(uuid: str) -> str:
+    return OrcEventParser.COMPLETED_LINE + json.dumps({"uuid": uuid})
+
+def providers_message(uuid: str, providers=(("P0", "R0"),)) -> str:
+    """providers-to-rank message of a deployment"""
+    return json.dumps({"uuid": uuid, "msg_version": "1.0", "template_name": "tosca.yaml",
+                       "user_group": "group-a",
+                       "providers": [{"provider_name": name, "region_name": region, "rank": i}
+                                     for i, (name, region) in enumerate(providers)]})
+
+class FakeKafkaClient:
+    """
+    In-memory client of a processor: iter_batches() yields the queued
+    records, one batch per call of add_batch(), and send() collects the messages.
+    The history topics are empty.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.sent = []
+        self.sent_timestamps = []
+        self.committed = []
+        self.input_topics = []
+        self.positions = {}
+        self.start_offsets = {}
+        self.start_from_beginning = False
+
+    def add_batch(self, records) -> None:
+        # records: (topic, value, timestamp in seconds)
+        messages = [SimpleNamespace(topic=topic, value=value, timestamp=ts * 1000)
+                    for topic, value, ts in records]
+        self.batches.append({("input", 0): messages})
+
+    def iter_batches(self):
+        while self.batches:
+            batch = self.batches.pop(0)
+            # Consumer positions move on poll
+            for tp, messages in batch.items():
+                self.positions[tp] = self.positions.get(tp, 0) + len(messages)
+            yield batch
+
+    def send(self, value, key=None, partition_key=None, timestamp_ms=None) -> None:
+        self.sent.append((key, value))
+        self.sent_timestamps.append(timestamp_ms)
+
+    def checkpoint(self) -> None:
+        pass
+
+    def get_positions(self) -> dict:
+        return dict(self.positions)
+
+    def set_start_offsets(self, offsets: dict) -> None:
+        self.start_offsets = dict(offsets)
+
+    def set_start_from_beginning(self) -> None:
+        self.start_from_beginning = True
+
+    def collect_keys_from_topics(self, topics) -> set:
+        return set()
+
+    def collect_key_timestamps_from_topics(self, topics) -> dict:
+        return {}
+
+    def commit_offsets(self, offsets: dict) -> None:
+        self.committed.append(offsets)
+
+    def close(self) -> None:
+        pass
+
+    def get_mon_data(self) -> dict:
+        return {}
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("tests")
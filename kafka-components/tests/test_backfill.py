@@ -0,0 +1,92 @@
+import json
+import pytest
+from conftest import FakeKafkaClient, completed_message, orc_record, providers_message, record_ts, submission_message
+from modules.datasetcollector.backfill import DatasetBackfill, read_dump
+from modules.datasetcollector.processor import DatasetCollectorProcessor
+from modules.datasetcollector.settings import DatasetCollectorConfig
+
+ORC = "orc"
+PROVIDERS = "providers"
+
+# (second, topic, value) in timestamp order, join window of 30 s
+RECORDS = [
+    # Joined when the deployment completes
+    (0, PROVIDERS, providers_message("11ee-000a")),
+    (1, ORC, submission_message("11ee-000a")),
+    (2, ORC, completed_message("11ee-000a")),
+    # Submission expired when resubmitted at 40 s
+    (3, ORC, submission_message("11ee-000d")),
+    # Joined when the providers message arrives
+    (4, ORC, submission_message("11ee-000b")),
+    (5, ORC, completed_message("11ee-000b")),
+    (6, PROVIDERS, providers_message("11ee-000b")),
+    # Providers message expired when the deployment completes
+    (7, PROVIDERS, providers_message("11ee-000c")),
+    (38, ORC, submission_message("11ee-000c")),
+    (39, ORC, completed_message("11ee-000c")),
+    (39, PROVIDERS, providers_message("11ee-000d")),
+    (40, ORC, submission_message("11ee-000d")),
+    (42, ORC, completed_message("11ee-000d")),
+    # Sent last, its key sorts first
+    (43, PROVIDERS, providers_message("11ee-0001")),
+    (44, ORC, submission_message("11ee-0001")),
+    (45, ORC, completed_message("11ee-0001")),
+]
+
+def make_settings(**values) -> DatasetCollectorConfig:
+    return DatasetCollectorConfig(JOIN_WINDOW_S=30, JOIN_ALLOWED_LATENESS_S=0, **values)
+
+def stream(logger, eviction_period_s: int, batch_size: int) -> list:
+    processor = DatasetCollectorProcessor(make_settings(JOIN_EVICTION_PERIOD_S=eviction_period_s), logger,
+                                          kafka_client=FakeKafkaClient())
+    topics = {ORC: processor.orc_topic, PROVIDERS: processor.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC}
+    records = [(topics[topic], orc_record(value, second) if topic == ORC else value, record_ts(second))
+               for second, topic, value in RECORDS]
+    for start in range(0, len(records), batch_size):
+        processor.kafka_client.add_batch(records[start:start + batch_size])
+    processor.process_new_messages()
+    return processor.kafka_client.sent
+
+def write_dumps(tmp_path, orc_timestamps: bool) -> dict:
+    orc_dump, providers_dump = tmp_path / "orc.txt", tmp_path / "providers.txt"
+    with open(orc_dump, 'w') as f_orc, open(providers_dump, 'w') as f_prov:
+        for second, topic, value in RECORDS:
+            prefix = f"{int(record_ts(second) * 1000)}\t"
+            if topic == ORC:
+                # Dumped with the 'string' deserializer
+                f_orc.write(f"{prefix if orc_timestamps else ''}{json.dumps(orc_record(value, second))}\n")
+            else:
+                f_prov.write(f"{prefix}{json.dumps(json.loads(value))}\n")
+    return {"BACKFILL_ORC_LOG_FILE": str(orc_dump),
+            "BACKFILL_PROVIDERS_FILE": str(providers_dump),
+            "BACKFILL_OUTPUT_FILE": str(tmp_path / "dataset.jsonl")}
+
+def test_streaming_join_does_not_depend_on_eviction(logger):
+    messages = stream(logger, eviction_period_s=3600, batch_size=len(RECORDS))
+    assert [key for key, _ in messages] == ["p0_r0_11ee-000a", "p0_r0_11ee-000b", "p0_r0_11ee-000d",
+                                            "p0_r0_11ee-0001"]
+    # The expired submission was not merged with the new one
+    assert messages[2][1]["completion_time_s"] == 2.0
+    assert stream(logger, eviction_period_s=0, batch_size=1) == messages
+
+@pytest.mark.parametrize("orc_timestamps", [True, False])
+def test_backfill_parity_with_streaming(tmp_path, logger, orc_timestamps):
+    backfill = DatasetBackfill(make_settings(BACKFILL_WORKERS=2, **write_dumps(tmp_path, orc_timestamps)), logger)
+    assert backfill.run() == 4
+    with open(tmp_path / "dataset.jsonl") as fin:
+        backfilled = [json.loads(line) for line in fin]
+    # In the order of the streaming collector
+    assert backfilled == [msg for _, msg in stream(logger, eviction_period_s=0, batch_size=1)]
+
+def test_providers_dump_needs_timestamps(tmp_path, logger):
+    dumps = write_dumps(tmp_path, orc_timestamps=False)
+    with open(dumps["BACKFILL_PROVIDERS_FILE"], 'w') as fout:
+        fout.write(f"{providers_message('11ee-000a')}\n")
+    backfill = DatasetBackfill(make_settings(BACKFILL_WORKERS=1, **dumps), logger)
+    with pytest.raises(ValueError):
+        backfill.run()
+
+def test_read_dump(tmp_path):
+    dump = tmp_path / "dump.txt"
+    dump.write_text('1743321600000\t{"uuid": "a"}\n"raw\\tline"\n\n')
+    assert list(read_dump(str(dump))) == [(1743321600.0, '{"uuid": "a"}'), (None, "raw\tline")]
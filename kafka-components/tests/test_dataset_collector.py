@@ -0,0 +1,140 @@
+import json
+from types import SimpleNamespace
+import pytest
+from conftest import FakeKafkaClient, completed_message, orc_record, providers_message, record_ts, submission_message
+from modules.datasetcollector.joinwindow import JoinWindow
+from modules.datasetcollector.loganalyzer import LogAnalyzer
+from modules.datasetcollector.processor import DatasetCollectorProcessor
+from modules.datasetcollector.settings import DatasetCollectorConfig
+from modules.orcevents.processor import OrcEventsProcessor
+from modules.orcevents.settings import OrcEventsConfig
+from modules.utilities.orc_events import OrcEventParser
+
+UUID = "11ee-0001"
+KEY = f"p0_r0_{UUID}"
+
+def window_settings(window_s: int = 60, lateness_s: int = 5) -> SimpleNamespace:
+    return SimpleNamespace(JOIN_WINDOW_S=window_s, JOIN_ALLOWED_LATENESS_S=lateness_s,
+                           JOIN_EVICTION_PERIOD_S=0)
+
+def test_watermark_follows_largest_timestamp(logger):
+    window = JoinWindow(window_settings(), logger)
+    assert window.observe(100.0) is False
+    assert window.observe(97.0) is False  # out of order, within the lateness
+    assert window.watermark() == 95.0
+    assert window.observe(94.0) is True   # behind the watermark
+    assert window.late_records == 1
+    assert window.watermark() == 95.0
+
+def test_expiration_behind_watermark(logger):
+    window = JoinWindow(window_settings(), logger)
+    window.observe(1000.0)
+    assert window.is_eviction_due()
+    assert window.expiration_ts() == 1000.0 - 5 - 60
+    window.set_state(window.get_state() | {"max_event_ts": 2000.0})
+    assert window.expiration_ts() == 2000.0 - 5 - 60
+
+@pytest.fixture
+def processor(logger):
+    settings = DatasetCollectorConfig(JOIN_WINDOW_S=30, JOIN_ALLOWED_LATENESS_S=0, JOIN_EVICTION_PERIOD_S=0)
+    return DatasetCollectorProcessor(settings, logger, kafka_client=FakeKafkaClient())
+
+def orc_logs(processor, *messages):
+    # (message, second) records of the orchestrator logs topic
+    return [(processor.orc_topic, orc_record(message, second), record_ts(second))
+            for message, second in messages]
+
+def providers_to_rank(processor, uuid: str, second: int):
+    return (processor.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC, providers_message(uuid), record_ts(second))
+
+def test_joined_key_sent_once(processor):
+    client = processor.kafka_client
+    client.add_batch([providers_to_rank(processor, UUID, 0)] +
+                     orc_logs(processor, (submission_message(UUID), 1), (completed_message(UUID), 2)))
+    # The same deployment and providers again: already sent
+    client.add_batch([providers_to_rank(processor, UUID, 3)] +
+                     orc_logs(processor, (submission_message(UUID), 4), (completed_message(UUID), 5)))
+    processor.process_new_messages()
+    assert [key for key, _ in client.sent] == [KEY]
+    assert client.sent[0][1]["provider_name"] == "P0"
+    # Sent when the deployment completed, with the time of its last submission
+    assert processor.keys_sent[KEY] == record_ts(1)
+
+def test_keys_sent_evicted_with_the_join(processor):
+    client = processor.kafka_client
+    client.add_batch([providers_to_rank(processor, UUID, 0)] +
+                     orc_logs(processor, (submission_message(UUID), 1), (completed_message(UUID), 2)))
+    processor.process_new_messages()
+    assert KEY in processor.keys_sent
+    # A record 31 s later: the watermark moves the whole join out of the window
+    client.add_batch(orc_logs(processor, ("Some other log line", 33)))
+    processor.process_new_messages()
+    assert KEY not in processor.keys_sent
+    assert processor.providers.get(KEY) is None
+    assert processor.log_analyzer.get(KEY) is None
+    assert processor.join_window.orphans == 0
+
+def test_orphans_counted(processor):
+    client = processor.kafka_client
+    client.add_batch([providers_to_rank(processor, UUID, 0)] +
+                     orc_logs(processor, ("Some other log line", 32)))
+    processor.process_new_messages()
+    assert client.sent == []
+    assert processor.providers.get(KEY) is None
+    assert processor.join_window.orphans == 1
+
+@pytest.mark.parametrize("separators", [None, (",", ":")])
+def test_event_records_prefiltered_by_kind(logger, separators):
+    parser = OrcEventParser({}, logger)
+    analyzer = LogAnalyzer({}, logger)
+    def event_record(message: str) -> str:
+        # Record of the orchestrator events topic
+        return json.dumps(parser.parse(orc_record(message)).to_dict(), separators=separators, sort_keys=True)
+    rejected = analyzer.event_prefilter.rejected.value
+    analyzer.import_event_record(event_record(submission_message(UUID)))
+    analyzer.import_event_record(event_record(completed_message(UUID)))
+    assert analyzer.detected_events == 2
+    assert analyzer.get(KEY) is not None
+    # Deployment kinds only found in the payload of other kinds
+    analyzer.import_event_record(event_record('Some other log line {"kind": "error"}'))
+    analyzer.import_event_record(event_record(json.dumps({"uuid": UUID, "status": "error"})))
+    assert analyzer.event_prefilter.rejected.value == rejected + 2
+    assert analyzer.detected_events == 2
+
+def test_old_events_joined_through_the_events_topic(logger):
+    # orc-events catching up on old orchestrator logs, e.g. after an outage
+    events_client = FakeKafkaClient()
+    orc_events = OrcEventsProcessor(OrcEventsConfig(), logger, kafka_client=events_client)
+    events_client.add_batch([("orchestrator-logs", orc_record(submission_message(UUID), 1), record_ts(1)),
+                             ("orchestrator-logs", orc_record(completed_message(UUID), 2), record_ts(2))])
+    orc_events.process_new_messages()
+    # The events keep the timestamps of the logs, not the time they are produced
+    assert events_client.sent_timestamps == [record_ts(1) * 1000, record_ts(2) * 1000]
+
+    settings = DatasetCollectorConfig(ORC_EVENTS_ENABLED=True, JOIN_WINDOW_S=30, JOIN_ALLOWED_LATENESS_S=0)
+    processor = DatasetCollectorProcessor(settings, logger, kafka_client=FakeKafkaClient())
+    processor.kafka_client.add_batch([providers_to_rank(processor, UUID, 0)] +
+                                     [(processor.orc_topic, value, ts / 1000)
+                                      for (_, value), ts in zip(events_client.sent, events_client.sent_timestamps)])
+    processor.process_new_messages()
+    assert [key for key, _ in processor.kafka_client.sent] == [KEY]
+
+def test_offsets_not_committed_when_parquet_rows_not_written(tmp_path, logger, monkeypatch):
+    settings = DatasetCollectorConfig(JOIN_WINDOW_S=30, JOIN_ALLOWED_LATENESS_S=0, SNAPSHOT_ENABLED=True,
+                                      SNAPSHOT_DIR=str(tmp_path), PARQUET_SINK_ENABLED=True,
+                                      PARQUET_SINK_DIR=str(tmp_path / "dataset"))
+    processor = DatasetCollectorProcessor(settings, logger, kafka_client=FakeKafkaClient())
+    processor.kafka_client.add_batch([providers_to_rank(processor, UUID, 0)] +
+                                     orc_logs(processor, (submission_message(UUID), 1), (completed_message(UUID), 2)))
+    processor.process_new_messages()
+    sink = processor.parquet_sink
+    with monkeypatch.context() as patch:
+        patch.setattr(sink, "write_rows", lambda day, rows: False)
+        processor.save_snapshot()
+    assert processor.kafka_client.committed == []
+    assert processor.snapshot.saved_snapshots == 0
+    assert sink.get_mon_data()["parquet_rows_buffered"] == 1
+    processor.save_snapshot()
+    assert processor.kafka_client.committed == [{("input", 0): 3}]
+    processor.close()
+    assert sink.rows_written == 1
@@ -0,0 +1,50 @@
+import pytest
+from kafka import TopicPartition # type: ignore
+from modules.utilities.kafka_client import KafkaClient
+
+class FakeConsumer:
+    """Consumer recording the seeks of the client"""
+
+    def __init__(self, assigned=()):
+        self.assigned = set(assigned)
+        self.seeks = []
+
+    def assignment(self):
+        return self.assigned
+
+    def seek(self, tp, offset):
+        self.seeks.append((tp.partition, offset))
+
+    def seek_to_beginning(self, *partitions):
+        self.seeks += [(tp.partition, "beginning") for tp in partitions]
+
+def make_client(logger, **configs) -> KafkaClient:
+    # Neither input nor output topics: no connection to the brokers
+    return KafkaClient(logger, group_id_base="group", **configs)
+
+@pytest.mark.parametrize("configs", [{"stable_group_id": True}, {"scale_out": True}])
+def test_no_auto_commit_with_stable_group(logger, configs):
+    client = make_client(logger, **configs)
+    assert client.cons_configs["group_id"] == "group"
+    assert client.cons_configs["enable_auto_commit"] is False
+
+def test_start_offsets_applied_on_assignment(logger):
+    client = make_client(logger, stable_group_id=True)
+    client.consumer = FakeConsumer([TopicPartition("input", 0)])
+    client.set_start_offsets({("input", 0): 10, ("input", 1): 20})
+    assert client.consumer.seeks == [(0, 10)]
+    client.on_partitions_assigned([TopicPartition("input", 1)])
+    assert client.consumer.seeks == [(0, 10), (1, 20)]
+    # Applied once: later assignments resume from the committed offsets
+    client.on_partitions_assigned([TopicPartition("input", 1)])
+    assert client.consumer.seeks == [(0, 10), (1, 20)]
+
+def test_start_from_beginning_on_first_assignment(logger):
+    client = make_client(logger, stable_group_id=True)
+    client.consumer = FakeConsumer()
+    client.set_start_offsets({("input", 0): 10})
+    client.set_start_from_beginning()
+    client.on_partitions_assigned([TopicPartition("input", 0), TopicPartition("input", 1)])
+    assert sorted(client.consumer.seeks) == [(0, 10), (1, "beginning")]
+    client.on_partitions_assigned([TopicPartition("input", 1)])
+    assert len(client.consumer.seeks) == 2
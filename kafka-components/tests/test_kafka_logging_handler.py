@@ -0,0 +1,104 @@
+import logging
+import sys
+import pytest
+from modules.utilities.kafka_logging_handler import KafkaLoggingHandler
+
+class FakeFuture:
+    """Delivery future resolved at once, like a record acked or failed by the broker"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+
+    def add_callback(self, callback):
+        if self.error is None:
+            callback(None)
+
+    def add_errback(self, errback):
+        if self.error is not None:
+            errback(self.error)
+
+class FakeProducer:
+    def __init__(self, error: Exception = None, send_error: Exception = None):
+        self.error = error
+        self.send_error = send_error
+        self.sent = []
+        self.flushed = 0
+
+    def send(self, topic, value):
+        if self.send_error is not None:
+            raise self.send_error
+        self.sent.append((topic, value["msg"]))
+        return FakeFuture(self.error)
+
+    def flush(self, timeout=None):
+        self.flushed += 1
+
+def make_record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord("tests", logging.INFO, __file__, 1, msg, None, None)
+
+@pytest.fixture
+def records():
+    return [make_record(f"line {i}") for i in range(5)]
+
+def test_close_sends_queued_records(records):
+    producer = FakeProducer()
+    handler = KafkaLoggingHandler(producer, "logs", batch_size=2, batch_timeout_s=10)
+    for record in records:
+        handler.emit(record)
+    handler.close()
+    assert producer.sent == [("logs", f"line {i}") for i in range(5)]
+    assert producer.flushed == 1
+    assert not handler.listener.is_alive()
+    assert handler.get_mon_data() == {"log_queue_size": 0, "log_sent_records": 5,
+                                      "log_failed_records": 0, "log_dropped_records": 0}
+    # After close the records are dropped, close is idempotent
+    handler.emit(make_record("late"))
+    handler.close()
+    assert handler.dropped_records == 1
+    assert producer.flushed == 1
+
+def test_failed_deliveries_not_counted_as_sent(records):
+    handler = KafkaLoggingHandler(FakeProducer(error=RuntimeError("broker down")), "logs")
+    for record in records:
+        handler.emit(record)
+    handler.close()
+    assert handler.sent_records == 0
+    assert handler.failed_records == 5
+
+def test_send_errors_reported(records, capsys):
+    handler = KafkaLoggingHandler(FakeProducer(send_error=ValueError("too large")), "logs")
+    handler.emit(records[0])
+    handler.close()
+    assert handler.sent_records == 0
+    assert handler.failed_records == 1
+    assert "too large" in capsys.readouterr().err
+
+def test_full_queue_drops_records(records):
+    handler = KafkaLoggingHandler(FakeProducer(), "logs", queue_size=1)
+    # The listener is stopped first: nothing leaves the queue
+    handler.queue.put(KafkaLoggingHandler.CLOSE_SENTINEL)
+    handler.listener.join()
+    handler.emit(records[0])
+    handler.emit(records[1])
+    assert handler.dropped_records == 1
+
+def test_records_formatted_when_emitted():
+    producer = FakeProducer()
+    handler = KafkaLoggingHandler(producer, "logs")
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    pending = ["a"]
+    record = logging.LogRecord("tests", logging.INFO, __file__, 1, "pending %s", (pending,), None)
+    try:
+        raise ValueError("bad value")
+    except ValueError:
+        error = logging.LogRecord("tests", logging.ERROR, __file__, 1, "failed", None, sys.exc_info())
+    handler.emit(record)
+    handler.emit(error)
+    # Changed after the logging call, e.g. by the consumer thread
+    pending.append("b")
+    handler.close()
+    assert producer.sent[0] == ("logs", "INFO pending ['a']")
+    assert producer.sent[1][1].startswith("ERROR failed\nTraceback")
+    assert "ValueError: bad value" in producer.sent[1][1]
+    # The queued copies are formatted, the records of the caller are untouched
+    assert record.args == (pending,) and error.exc_info is not None
@@ -0,0 +1,86 @@
+import json
+import pytest
+from conftest import continuation_record, orc_record
+from modules.utilities.orc_events import OrcEvent, OrcEventParser
+
+SUBMISSION = OrcEventParser.SUBMISSION_LINE + json.dumps({"uuid": "11ee-0001", "provider_name": "P0"})
+ERROR = OrcEventParser.ERROR_LINE + json.dumps({"uuid": "11ee-0001", "status": "CREATE_FAILED"})
+REJECT = OrcEventParser.LINES_TO_REJECT[0]
+
+@pytest.fixture
+def parser(logger):
+    return OrcEventParser({}, logger)
+
+@pytest.mark.parametrize("message, kind", [
+    (SUBMISSION, OrcEventParser.KIND_SUBMISSION),
+    (OrcEventParser.COMPLETED_LINE + json.dumps({"uuid": "11ee-0001"}), OrcEventParser.KIND_COMPLETED),
+    (ERROR, OrcEventParser.KIND_ERROR),
+    ("Creating deployment with template", OrcEventParser.KIND_TEMPLATE_START),
+    (json.dumps({"uuid": "11ee-0001", "user_group": "g"}), OrcEventParser.KIND_USER_PARAMETERS),
+    ("Some other log line", OrcEventParser.KIND_LOG),
+])
+def test_classification(parser, message, kind):
+    event = parser.parse(orc_record(message))
+    assert event.kind == kind
+    assert event.thread == "exec-1"
+    if kind in OrcEventParser.DEPLOYMENT_KINDS or kind == OrcEventParser.KIND_USER_PARAMETERS:
+        assert event.uuid == "11ee-0001"
+
+def test_deployment_event_payload(parser):
+    event = parser.parse(orc_record(SUBMISSION))
+    assert json.loads(event.payload) == {"uuid": "11ee-0001", "provider_name": "P0"}
+    assert event.timestamp is not None
+
+def test_continuation_line_gets_last_thread(parser):
+    parser.parse(orc_record("Creating deployment with template", thread="exec-7"))
+    event = parser.parse(continuation_record("topology_template:"))
+    assert event.kind == OrcEventParser.KIND_TEMPLATE_LINE
+    assert event.orc_ts is None
+    assert event.thread == "exec-7"
+    assert event.payload == "topology_template:"
+
+def test_reject_marker_is_not_a_deployment_event(parser):
+    event = parser.parse(orc_record(REJECT))
+    assert event.kind not in OrcEventParser.DEPLOYMENT_KINDS
+
+def test_reject_marker_after_event_marker(parser):
+    # The reject marker in the payload of an event still rejects the event
+    message = OrcEventParser.ERROR_LINE + json.dumps({"uuid": "11ee-0001", "status_reason": REJECT})
+    event = parser.parse(orc_record(message))
+    assert event.kind not in OrcEventParser.DEPLOYMENT_KINDS
+
+def test_not_orchestrator_lines(parser):
+    assert parser.parse(json.dumps({"@timestamp": "2025-03-30T08:00:00.000Z",
+                                    "message": "Mar 30 10:00:00 host other-prog: nothing"})) is None
+    assert parser.parse("not json " + OrcEventParser.LOG_SEP_DEFAULT) is None
+    assert parser.get_mon_data()["parse_errors"] == 1
+
+def test_event_round_trip(parser):
+    event = parser.parse(orc_record(SUBMISSION))
+    restored = OrcEvent.from_json(json.dumps(event.to_dict()))
+    assert restored.to_dict() == event.to_dict()
+
+def test_continuation_lines_per_source(parser):
+    # Pooled thread names repeat on every orchestrator instance
+    parser.parse(orc_record("Creating deployment with template", thread="exec-1", instance="orc-1"))
+    parser.parse(orc_record("Creating deployment with template", thread="exec-2", instance="orc-2"))
+    event_1 = parser.parse(continuation_record("a: 1", instance="orc-1"))
+    event_2 = parser.parse(continuation_record("b: 2", instance="orc-2"))
+    assert event_1.thread == "exec-1"
+    assert event_2.thread == "exec-2"
+    assert event_1.source != event_2.source
+
+def test_template_lines_keyed_by_source_and_thread(parser):
+    event_1 = parser.parse(orc_record("Creating deployment with template", instance="orc-1"))
+    event_2 = parser.parse(orc_record("Creating deployment with template", instance="orc-2"))
+    assert event_1.thread == event_2.thread
+    assert event_1.get_key() != event_2.get_key()
+    # Deployment events are keyed by uuid
+    assert parser.parse(orc_record(SUBMISSION, instance="orc-1")).get_key() == "11ee-0001"
+
+def test_sources_of_different_hosts(parser):
+    # Same syslog tag shipped by the filebeat of two hosts
+    parser.parse(orc_record("Creating deployment with template", thread="exec-1", host="host-1"))
+    parser.parse(orc_record("Creating deployment with template", thread="exec-2", host="host-2"))
+    assert parser.parse(continuation_record("a: 1", host="host-1")).thread == "exec-1"
+    assert parser.parse(continuation_record("b: 2", host="host-2")).thread == "exec-2"
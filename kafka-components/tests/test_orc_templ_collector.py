@@ -0,0 +1,97 @@
+import json
+import pytest
+from conftest import continuation_record, orc_record
+from modules.templateparser.orc_templ_collector import LogOrchestratorCollector
+from modules.utilities.orc_events import OrcEventParser
+
+START = "Creating deployment with template"
+
+def template_lines(name: str) -> list[str]:
+    return ["topology_template:",
+            "  node_templates:",
+            f"    {name}: {{type: tosca.nodes.Compute}}"]
+
+def user_parameters(uuid: str) -> str:
+    return json.dumps({"uuid": uuid, "user_group": "g"})
+
+def import_records(collector, records) -> list[tuple]:
+    completed = []
+    for record in records:
+        if collector.import_line(record):
+            completed.append((collector.depl_data["uuid"], collector.template))
+    return completed
+
+@pytest.fixture
+def collector(logger):
+    return LogOrchestratorCollector({}, logger)
+
+def test_single_template(collector):
+    records = [orc_record(START, 0)] + [continuation_record(line, 0) for line in template_lines("a")] + \
+              [orc_record(user_parameters("uuid-a"), 1)]
+    [(uuid, template)] = import_records(collector, records)
+    assert uuid == "uuid-a"
+    assert list(template["topology_template"]["node_templates"]) == ["a"]
+    assert template["is_automatic"] is True
+    assert collector.get_mon_data()["template_buffers_open"] == 0
+
+def test_interleaved_instances_with_the_same_thread(collector):
+    # Two orchestrator instances log at the same time on threads with the same name
+    lines_a, lines_b = template_lines("a"), template_lines("b")
+    records = [orc_record(START, 0, instance="orc-1"), orc_record(START, 0, instance="orc-2")]
+    for line_a, line_b in zip(lines_a, lines_b):
+        records += [continuation_record(line_a, 0, instance="orc-1"), continuation_record(line_b, 0, instance="orc-2")]
+    records += [orc_record(user_parameters("uuid-b"), 1, instance="orc-2"),
+                orc_record(user_parameters("uuid-a"), 1, instance="orc-1")]
+    completed = import_records(collector, records)
+    assert [(uuid, list(template["topology_template"]["node_templates"])) for uuid, template in completed] == \
+           [("uuid-b", ["b"]), ("uuid-a", ["a"])]
+
+def test_interleaved_events(collector):
+    # Same lines through the orchestrator-events topic, parsed by the orc-events stage
+    lines_a, lines_b = template_lines("a"), template_lines("b")
+    records = [orc_record(START, 0, instance="orc-1"), orc_record(START, 0, instance="orc-2")]
+    for line_a, line_b in zip(lines_a, lines_b):
+        records += [continuation_record(line_a, 0, instance="orc-1"), continuation_record(line_b, 0, instance="orc-2")]
+    records += [orc_record(user_parameters("uuid-a"), 1, instance="orc-1"),
+                orc_record(user_parameters("uuid-b"), 1, instance="orc-2")]
+    stage = OrcEventParser({}, collector.logger)
+    completed = []
+    for record in records:
+        if collector.import_event_record(json.dumps(stage.parse(record).to_dict())):
+            completed.append((collector.depl_data["uuid"], collector.template))
+    assert [(uuid, list(template["topology_template"]["node_templates"])) for uuid, template in completed] == \
+           [("uuid-a", ["a"]), ("uuid-b", ["b"])]
+
+def test_user_parameters_without_template(collector):
+    records = [orc_record(START, 0, thread="exec-1"), orc_record(user_parameters("uuid-a"), 1, thread="exec-1"),
+               orc_record(user_parameters("uuid-b"), 1, thread="exec-2")]
+    assert import_records(collector, records) == [("uuid-a", None), ("uuid-b", None)]
+
+def test_buffer_overflow_restart_and_timeout(logger):
+    collector = LogOrchestratorCollector({"template_max_buffers": 2, "template_buffer_timeout_s": 60}, logger)
+    import_records(collector, [orc_record(START, 0, thread=f"exec-{i}") for i in range(3)])
+    assert collector.get_mon_data()["template_buffers_overflow"] == 1
+    import_records(collector, [orc_record(START, 1, thread="exec-2")])
+    assert collector.get_mon_data()["template_buffers_restarted"] == 1
+    # A line two minutes later drops the buffers not updated since
+    import_records(collector, [orc_record("Some other log line", 0, thread="exec-9").replace("10:00:00.000", "10:02:00.000")])
+    mon = collector.get_mon_data()
+    assert mon["template_buffers_timeout"] == 2
+    assert mon["template_buffers_open"] == 0
+
+def test_duplicate_skipped_before_parsing(collector):
+    collector.is_duplicate = lambda uuid: uuid == "uuid-a"
+    records = [orc_record(START, 0)] + [continuation_record(line, 0) for line in template_lines("a")] + \
+              [orc_record(user_parameters("uuid-a"), 1)]
+    assert import_records(collector, records) == []
+    mon = collector.get_mon_data()
+    assert mon["templates_duplicate_skipped"] == 1
+    assert mon["template_cache_misses"] == 0
+
+def test_state_round_trip(collector, logger):
+    import_records(collector, [orc_record(START, 0)] + [continuation_record(line, 0) for line in template_lines("a")])
+    restored = LogOrchestratorCollector({}, logger)
+    restored.set_state(collector.get_state())
+    [(uuid, template)] = import_records(restored, [continuation_record("    c: {type: t}", 0),
+                                                   orc_record(user_parameters("uuid-a"), 1)])
+    assert list(template["topology_template"]["node_templates"]) == ["a", "c"]
@@ -0,0 +1,76 @@
+import json
+from types import SimpleNamespace
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from modules.datasetcollector import parquetsink
+from modules.datasetcollector.parquetsink import ParquetSink
+
+def make_settings(directory) -> SimpleNamespace:
+    return SimpleNamespace(PARQUET_SINK_DIR=str(directory),
+                           PARQUET_SINK_ROW_GROUP_SIZE=2,
+                           PARQUET_SINK_FLUSH_PERIOD=3600)
+
+def row(day: str, n_failures, status_reason: str = None) -> dict:
+    return {"submission_time": f"2025-03-{day} 10:00:00", "n_failures": n_failures,
+            "tot_failure_time_s": 1, "completion_time_s": 2.5, "uuid": f"uuid-{day}-{n_failures}",
+            "status_reason": status_reason}
+
+def parquet_files(directory, day: str) -> list:
+    return sorted((directory / f"date=2025-03-{day}").glob("part-*.parquet"))
+
+def test_rows_written_by_day(tmp_path, logger):
+    sink = ParquetSink(make_settings(tmp_path), logger)
+    sink.append(row("30", 0))
+    sink.append(row("31", 1)) # row group size reached: flush
+    sink.append(row("31", 2))
+    sink.close()
+    assert sink.get_mon_data() == {"parquet_rows_buffered": 0, "parquet_rows_written": 3,
+                                   "parquet_files_open": 0, "parquet_write_errors": 0}
+    df = pd.read_parquet(tmp_path / "date=2025-03-31")
+    assert sorted(df["n_failures"]) == [1, 2]
+    assert df["n_failures"].dtype == "int64"
+    assert df["tot_failure_time_s"].dtype == "float64"
+    # No journal nor hidden file left
+    assert [path.name for path in (tmp_path / "date=2025-03-31").iterdir()] == [parquet_files(tmp_path, "31")[0].name]
+
+def test_one_file_per_day_with_a_row_group_per_flush(tmp_path, logger):
+    sink = ParquetSink(make_settings(tmp_path), logger)
+    for n_failures in range(4):
+        sink.append(row("30", n_failures))
+    assert sink.get_mon_data()["parquet_files_open"] == 1
+    assert parquet_files(tmp_path, "30") == []  # hidden while open
+    # Day rollover: the file of the previous day is closed
+    sink.append(row("31", 0, "Quota exceeded"))
+    sink.append(row("31", 1))
+    assert len(parquet_files(tmp_path, "30")) == 1
+    assert pq.ParquetFile(parquet_files(tmp_path, "30")[0]).metadata.num_row_groups == 2
+    sink.close()
+    # Typed string column, null in the first file
+    for day in ("30", "31"):
+        assert str(pq.read_schema(parquet_files(tmp_path, day)[0]).field("status_reason").type) == "string"
+
+def test_failed_rows_stay_buffered(tmp_path, logger):
+    sink = ParquetSink(make_settings(tmp_path), logger)
+    sink.append(row("30", 0))
+    sink.append(row("30", "not a number"))
+    assert sink.get_mon_data()["parquet_rows_buffered"] == 2
+    assert sink.flush() is False
+    assert sink.write_errors == 2
+
+def test_open_files_recovered_from_their_journal(tmp_path, logger):
+    sink = ParquetSink(make_settings(tmp_path), logger)
+    sink.append(row("30", 0))
+    sink.append(row("30", 1))
+    # Crash: the file is never closed, its truncated last line is skipped
+    journal = next((tmp_path / "date=2025-03-30").glob(".*.jsonl"))
+    with open(journal, 'a') as fout:
+        fout.write(json.dumps(row("30", 2))[:10])
+    ParquetSink(make_settings(tmp_path), logger)
+    assert sorted(pd.read_parquet(parquet_files(tmp_path, "30")[0])["n_failures"]) == [0, 1]
+    assert not journal.exists()
+
+def test_missing_engine_fails_at_startup(tmp_path, logger, monkeypatch):
+    monkeypatch.setattr(parquetsink, "pa", None)
+    with pytest.raises(ImportError):
+        ParquetSink(make_settings(tmp_path), logger)
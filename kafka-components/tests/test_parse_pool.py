@@ -0,0 +1,49 @@
+from time import sleep
+import pytest
+from modules.templateparser.parse_pool import TemplateParsePool
+from modules.templateparser.settings import TemplateParserConfig
+
+def template_lines(name: str, n_nodes: int) -> list[str]:
+    lines = ["topology_template:", "  inputs: {}", "  node_templates:"]
+    lines += [f"    {name}_{i}: {{type: tosca.nodes.Compute}}" for i in range(n_nodes)]
+    return lines
+
+@pytest.fixture
+def pool(logger):
+    settings = TemplateParserConfig(TEMPLATE_PARSE_WORKERS=2, TEMPLATE_PARSE_MAX_INFLIGHT=3)
+    pool = TemplateParsePool(settings, logger)
+    yield pool
+    pool.close()
+
+def test_results_in_submission_order(pool):
+    results = []
+    # Large templates first: they complete after the following small ones
+    for i in range(8):
+        n_nodes = 400 if i % 2 == 0 else 1
+        results += pool.submit(template_lines(f"t{i}", n_nodes), {"uuid": f"uuid-{i}", "user_parameters": {}})
+        assert len(pool.inflight) <= pool.max_inflight
+    results += pool.drain()
+    assert [result["uuid"] for result in results] == [f"uuid-{i}" for i in range(8)]
+    assert results[1]["topology_template"]["node_templates"] == {"t1_0": {"type": "tosca.nodes.Compute"}}
+    assert pool.get_mon_data() == {"template_parse_inflight": 0,
+                                   "template_parse_submitted": 8,
+                                   "template_parse_errors": 0}
+
+def test_invalid_templates_skipped(pool):
+    pool.submit(["topology_template: ["], {"uuid": "uuid-0", "user_parameters": {}})
+    pool.submit(template_lines("t", 1), {"uuid": "uuid-1", "user_parameters": {}})
+    results = pool.drain()
+    assert [result["uuid"] for result in results] == ["uuid-1"]
+    assert pool.get_mon_data()["template_parse_errors"] == 1
+
+def test_ready_does_not_wait(pool):
+    pool.submit(template_lines("t", 1), {"uuid": "uuid-0", "user_parameters": {}})
+    for _ in range(100):
+        if pool.inflight[0].done():
+            break
+        sleep(0.05)
+    assert [result["uuid"] for result in pool.ready()] == ["uuid-0"]
+    assert pool.ready() == []
+
+def test_workers_not_forked(pool):
+    assert pool.executor._mp_context.get_start_method() == "forkserver"
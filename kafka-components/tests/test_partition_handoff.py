@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+from kafka import TopicPartition # type: ignore
+from kafka.partitioner.default import DefaultPartitioner # type: ignore
+from conftest import FakeKafkaClient, completed_message, orc_record, providers_message, record_ts, submission_message
+from modules.datasetcollector.processor import DatasetCollectorProcessor
+from modules.datasetcollector.settings import DatasetCollectorConfig
+from modules.utilities.kafka_client import KafkaClient
+
+N_PARTITIONS = 4
+
+class PartitionedKafkaClient(FakeKafkaClient):
+    """Client of a scale-out replica, with the partitioner of KafkaClient"""
+
+    def __init__(self, logger):
+        super().__init__()
+        self.partitioner = KafkaClient(logger, group_id_base="tests")
+        self.partitioner.partitions = {}
+        self.rebalance_handler = None
+        self.seeks_to_beginning = []
+
+    def partition_for_key(self, topic: str, key: str) -> int:
+        self.partitioner.partitions.setdefault(topic, list(range(N_PARTITIONS)))
+        return self.partitioner.partition_for_key(topic, key)
+
+    def set_rebalance_handler(self, handler) -> None:
+        self.rebalance_handler = handler
+
+    def seek_to_beginning(self, partitions) -> None:
+        self.seeks_to_beginning += [tp.partition for tp in partitions]
+
+def make_replica(tmp_path, logger) -> DatasetCollectorProcessor:
+    settings = DatasetCollectorConfig(JOIN_WINDOW_S=30, JOIN_ALLOWED_LATENESS_S=0, KAFKA_SCALE_OUT=True,
+                                      ORC_EVENTS_ENABLED=False, SNAPSHOT_DIR=str(tmp_path))
+    return DatasetCollectorProcessor(settings, logger, kafka_client=PartitionedKafkaClient(logger))
+
+def uuids_by_partition(replica, n: int) -> dict[int, str]:
+    # A deployment uuid in each of the first n partitions
+    uuids = {}
+    i = 0
+    while len(uuids) < n:
+        uuid = f"11ee-{i:04d}"
+        uuids.setdefault(replica.kafka_client.partition_for_key(replica.orc_topic, uuid), uuid)
+        i += 1
+    return dict(sorted(uuids.items()))
+
+def test_partition_for_key_matches_the_producer_partitioner(logger):
+    client = KafkaClient(logger, group_id_base="tests")
+    client.partitions = {"topic": list(range(6))}
+    cluster = SimpleNamespace(topics=lambda: {"topic"},
+                              partitions_for_topic=lambda topic: set(range(6)),
+                              available_partitions_for_topic=lambda topic: set(range(6)))
+    partitioner = DefaultPartitioner()
+    for i in range(200):
+        key = f"11ee-{i:04d}"
+        assert client.partition_for_key("topic", key) == \
+               partitioner.partition("topic", key, key.encode('utf-8'), None, None, cluster)
+
+def test_state_follows_the_revoked_partition(tmp_path, logger):
+    replica_a, replica_b = make_replica(tmp_path, logger), make_replica(tmp_path, logger)
+    assert replica_a.kafka_client.rebalance_handler is replica_a
+    orc_topic, providers_topic = replica_a.orc_topic, replica_a.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC
+    (moved_partition, moved_uuid), (kept_partition, kept_uuid) = uuids_by_partition(replica_a, 2).items()
+    records = []
+    for uuid in (moved_uuid, kept_uuid):
+        # Already sent, then in flight with another provider
+        records += [(providers_topic, providers_message(uuid), record_ts(0)),
+                    (orc_topic, orc_record(submission_message(uuid), 1), record_ts(1)),
+                    (orc_topic, orc_record(completed_message(uuid), 2), record_ts(2)),
+                    (providers_topic, providers_message(uuid, providers=(("P1", "R1"),)), record_ts(3)),
+                    (orc_topic, orc_record(submission_message(uuid, "P1", "R1"), 4), record_ts(4))]
+    replica_a.kafka_client.add_batch(records)
+    replica_a.process_new_messages()
+    assert len(replica_a.kafka_client.sent) == 2
+    replica_a.kafka_client.positions = {(orc_topic, moved_partition): 10, (orc_topic, kept_partition): 20}
+
+    replica_a.on_partitions_revoked([TopicPartition(orc_topic, moved_partition)])
+    assert replica_a.kafka_client.committed == [{(orc_topic, moved_partition): 10}]
+    assert replica_a.providers.get(f"p1_r1_{moved_uuid}") is None
+    assert replica_a.log_analyzer.get(f"p1_r1_{moved_uuid}") is None
+    assert list(replica_a.keys_sent) == [f"p0_r0_{kept_uuid}"]
+    assert replica_a.providers.get(f"p1_r1_{kept_uuid}") is not None
+
+    replica_b.on_partitions_assigned([TopicPartition(orc_topic, moved_partition),
+                                      TopicPartition(providers_topic, moved_partition)])
+    assert replica_b.kafka_client.seeks_to_beginning == []
+    assert list(replica_b.keys_sent) == [f"p0_r0_{moved_uuid}"]
+    # The join in flight completes on the new owner, the key already sent is not sent again
+    replica_b.kafka_client.add_batch([(orc_topic, orc_record(completed_message(moved_uuid), 5), record_ts(5)),
+                                      (providers_topic, providers_message(moved_uuid), record_ts(6))])
+    replica_b.process_new_messages()
+    assert [key for key, _ in replica_b.kafka_client.sent] == [f"p1_r1_{moved_uuid}"]
+
+def test_partition_without_handoff_replayed(tmp_path, logger):
+    replica = make_replica(tmp_path, logger)
+    replica.on_partitions_assigned([TopicPartition(replica.orc_topic, 1)])
+    assert replica.kafka_client.seeks_to_beginning == [1]
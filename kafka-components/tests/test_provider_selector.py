@@ -0,0 +1,29 @@
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from conftest import FakeKafkaClient
+from modules.providerselector.processor import ProviderSelectorProcessor
+from modules.providerselector.settings import ProviderSelectorConfig
+
+def rally_message(provider: str, timestamp: str = None) -> dict:
+    return {"msg_version": "1.0.0",
+            "provider": provider,
+            "status": "finished",
+            "test_result": "True",
+            "timestamp": timestamp or datetime.now().isoformat()}
+
+@pytest.fixture
+def processor(logger):
+    return ProviderSelectorProcessor(ProviderSelectorConfig(), logger, kafka_client=FakeKafkaClient())
+
+def test_bad_rally_message_does_not_drop_the_batch(processor):
+    messages = [rally_message("P0"), rally_message("P1", timestamp="not a date"), rally_message("P2")]
+    processor.import_rally_messages(messages)
+    assert sorted(processor.rally_data.df["provider"]) == ["P0", "P2"]
+    assert processor.rally_data.received_messages == 3
+
+def test_bad_rally_message_does_not_drop_the_restored_batch(processor):
+    messages = [SimpleNamespace(value=value) for value in
+                (rally_message("P0"), {"provider": "P1"}, rally_message("P2"))]
+    processor.restore_messages(processor.settings.KAFKA_INPUT_RALLY_TOPIC, messages)
+    assert sorted(processor.rally_data.df["provider"]) == ["P0", "P2"]
@@ -0,0 +1,86 @@
+import pickle
+from types import SimpleNamespace
+import pytest
+from conftest import FakeKafkaClient, completed_message, orc_record, providers_message, record_ts, submission_message
+from modules.datasetcollector.processor import DatasetCollectorProcessor
+from modules.datasetcollector.settings import DatasetCollectorConfig
+from modules.templateparser.processor import TemplateParserProcessor
+from modules.templateparser.settings import TemplateParserConfig
+from modules.utilities.snapshot import Snapshot
+
+UUID = "11ee-0001"
+KEY = f"p0_r0_{UUID}"
+
+@pytest.fixture
+def snapshot(tmp_path, logger):
+    settings = SimpleNamespace(SNAPSHOT_ENABLED=True, SNAPSHOT_PERIOD=60, SNAPSHOT_DIR=str(tmp_path),
+                               APP_NAME="tests")
+    return Snapshot(settings, logger)
+
+def test_save_load_round_trip(snapshot):
+    assert snapshot.load() == (None, None)
+    snapshot.save({"keys": {"a", "b"}}, {("input", 0): 42})
+    assert snapshot.load() == ({"keys": {"a", "b"}}, {("input", 0): 42})
+    assert snapshot.get_mon_data()["snapshots_saved"] == 1
+
+def test_other_version_ignored(snapshot):
+    snapshot.save({"keys": set()}, {("input", 0): 42})
+    with open(snapshot.filename, 'rb') as fin:
+        data = pickle.load(fin)
+    data[Snapshot.KEY_VERSION] = Snapshot.SNAPSHOT_VERSION - 1
+    with open(snapshot.filename, 'wb') as fout:
+        pickle.dump(data, fout)
+    assert snapshot.load() == (None, None)
+
+def test_corrupt_snapshot_ignored(snapshot):
+    with open(snapshot.filename, 'wb') as fout:
+        fout.write(b"not a pickle")
+    assert snapshot.load() == (None, None)
+
+def collector_settings(tmp_path) -> DatasetCollectorConfig:
+    return DatasetCollectorConfig(JOIN_WINDOW_S=30, JOIN_ALLOWED_LATENESS_S=0, SNAPSHOT_ENABLED=True,
+                                  SNAPSHOT_DIR=str(tmp_path))
+
+def test_collector_restarts_from_its_snapshot(tmp_path, logger):
+    processor = DatasetCollectorProcessor(collector_settings(tmp_path), logger, kafka_client=FakeKafkaClient())
+    orc_topic = processor.orc_topic
+    providers_topic = processor.settings.KAFKA_INPUT_PROVIDERS_TO_RANK_TOPIC
+    # Joined before the snapshot
+    processor.kafka_client.add_batch([(providers_topic, providers_message("11ee-0000"), record_ts(0)),
+                                      (orc_topic, orc_record(submission_message("11ee-0000"), 1), record_ts(1)),
+                                      (orc_topic, orc_record(completed_message("11ee-0000"), 2), record_ts(2))])
+    # In flight at the snapshot
+    processor.kafka_client.add_batch([(providers_topic, providers_message(UUID), record_ts(3)),
+                                      (orc_topic, orc_record(submission_message(UUID), 4), record_ts(4))])
+    processor.process_new_messages()
+    processor.save_snapshot()
+    assert processor.kafka_client.committed == [{("input", 0): 5}]
+
+    restarted = DatasetCollectorProcessor(collector_settings(tmp_path), logger, kafka_client=FakeKafkaClient())
+    restarted.restore_history()
+    assert restarted.kafka_client.start_offsets == {("input", 0): 5}
+    assert restarted.kafka_client.start_from_beginning is False
+    assert restarted.get_state().keys() == processor.get_state().keys()
+    assert restarted.join_window.watermark() == processor.join_window.watermark()
+    assert list(restarted.keys_sent) == ["p0_r0_11ee-0000"]
+    # The join in flight completes after the restart
+    restarted.kafka_client.add_batch([(orc_topic, orc_record(completed_message(UUID), 5), record_ts(5))])
+    restarted.process_new_messages()
+    assert [key for key, _ in restarted.kafka_client.sent] == [KEY]
+
+def test_collector_without_snapshot_replays_its_input(tmp_path, logger):
+    processor = DatasetCollectorProcessor(collector_settings(tmp_path), logger, kafka_client=FakeKafkaClient())
+    processor.restore_history()
+    assert processor.kafka_client.start_offsets == {}
+    assert processor.kafka_client.start_from_beginning is True
+
+def test_template_parser_state_round_trip(tmp_path, logger):
+    settings = TemplateParserConfig(SNAPSHOT_ENABLED=True, SNAPSHOT_DIR=str(tmp_path))
+    processor = TemplateParserProcessor(settings, logger, kafka_client=FakeKafkaClient())
+    processor.validated_templates_uuids = {"uuid-a", "uuid-b"}
+    processor.save_snapshot()
+    restarted = TemplateParserProcessor(settings, logger, kafka_client=FakeKafkaClient())
+    restarted.restore_history()
+    assert restarted.validated_templates_uuids == {"uuid-a", "uuid-b"}
+    assert restarted.is_duplicate("uuid-a")
+    assert restarted.kafka_client.start_from_beginning is False
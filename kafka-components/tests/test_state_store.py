@@ -0,0 +1,83 @@
+import pytest
+from modules.utilities.state_store import InMemoryStateStore, SQLiteStateStore, StoreBackup
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"), "data", cache_size=2,
+                             backup_prefix=str(tmp_path / "snapshot.data"))
+    store.ts_of = lambda value: value["ts"]
+    yield store
+    store.close()
+
+def fill(store, n: int) -> None:
+    for i in range(n):
+        store[f"k{i}"] = {"ts": float(i)}
+
+def test_least_recently_used_spilled(store):
+    fill(store, 3)
+    assert list(store.cache) == ["k1", "k2"]
+    assert store.n_stored == 1
+    assert len(store) == 3
+    # Access moves the stored entry back to the cache, spilling the oldest one
+    assert store["k0"] == {"ts": 0.0}
+    assert list(store.cache) == ["k2", "k0"]
+    assert store.n_stored == 1 and "k1" in store
+
+def test_cached_values_modified_in_place(store):
+    fill(store, 3)
+    store["k0"]["ts"] = 10.0
+    store["k3"] = {"ts": 3.0}
+    store["k4"] = {"ts": 4.0} # k0 spilled with its new value
+    assert sorted(store.evict(5.0)) == ["k1", "k2", "k3", "k4"]
+    assert store["k0"] == {"ts": 10.0}
+
+def test_delete(store):
+    fill(store, 3)
+    del store["k0"] # stored
+    del store["k2"] # cached
+    assert "k0" not in store and "k2" not in store
+    assert len(store) == 1
+    with pytest.raises(KeyError):
+        del store["k0"]
+    assert dict(store.items()) == {"k1": {"ts": 1.0}}
+
+def test_overwrite_stored_key(store):
+    fill(store, 3)
+    store["k0"] = {"ts": 5.0}
+    assert len(store) == 3
+    assert store["k0"] == {"ts": 5.0}
+
+def test_evict_cached_and_stored(store):
+    fill(store, 5)
+    assert sorted(store.evict(2.5)) == ["k0", "k1", "k2"]
+    assert sorted(store) == ["k3", "k4"]
+    assert store.n_stored == 0
+    assert store.evict(2.5) == []
+
+def test_snapshot_backup(store, tmp_path):
+    fill(store, 3)
+    backups = [store.get_state() for _ in range(3)]
+    assert all(isinstance(backup, StoreBackup) for backup in backups)
+    # The backup referenced by the previous snapshot is kept
+    assert sorted(tmp_path.glob("snapshot.data.*.db")) == sorted(tmp_path / backup.filename
+                                                                for backup in backups[-2:])
+    restored = SQLiteStateStore(str(tmp_path / "restored.db"), "data", cache_size=2)
+    restored.ts_of = store.ts_of
+    restored.set_state(backups[-1])
+    assert dict(restored.items()) == dict(store.items())
+    assert restored.n_stored == 3
+    # The restored entries are in the table, with their timestamp
+    assert sorted(restored.evict(1.5)) == ["k0", "k1"]
+    restored.close()
+
+def test_backup_restored_in_memory(store):
+    fill(store, 3)
+    memory_store = InMemoryStateStore()
+    memory_store.set_state(store.get_state())
+    assert memory_store == {f"k{i}": {"ts": float(i)} for i in range(3)}
+
+def test_memory_store_evict():
+    store = InMemoryStateStore({"a": 1.0, "b": 3.0})
+    store.ts_of = lambda ts: ts
+    assert store.evict(2.0) == ["a"]
+    assert store == {"b": 3.0}